@@ -5,25 +5,82 @@ Function used:
     - find_url_by_name:
         input: author, title
             *need also api_key(provided from YouTube API) - Included in r"static_file\ setup.json" with key = "api_key"
-        output: youtube_url (of provided inputs)
+        output: youtube_url (of provided inputs - searches are cached, see get_search_client().stats() for the
+                quota units spent)
+    - find_urls_by_names:
+        input: list of (author, title), workers
+        output: list of youtube_url or None (same order - repeated pairs are searched once)
     - download_youtube_video:
-        input: youtube_url, download_path, file_type, quality, start_time, end_time
+        input: youtube_url, download_path, file_type, quality, start_time, end_time, trim_mode, encoder_profile
+               (name from setup.json "encoder_profiles" - preset, CRF, audio bitrate and thread share of whatever is
+               re-encoded), connections (parallel ranged connections per stream - default "download_connections")
         output: path (of downloaded file)
     - download_youtube_audio:
-        input: youtube_url, download_path, file_type, start_time, end_time
+        input: youtube_url, download_path, file_type, start_time, end_time, encoder_profile, connections
         output: path (of downloaded file)
     - download_playlist:
-        input: youtube_url, download_path, file_type, quality, start_time, end_time
-        output: path (of downloaded files)
-    - merge_video_and_audio_file(video_file_path, audio_file_path):
-        input: video_file_path, audio_file_path
-        output: video_file_path (merged - video + audio)
+        input: youtube_url, download_path, file_type, quality, start_time, end_time, workers, trim_mode,
+               encoder_profile, connections
+        output: list of {url, file, error} (in playlist order, failed items have file = None - items are downloaded
+                `workers` at a time while the downloaded ones are converted in worker processes, see MediaPipeline)
+    - summarize_playlist_results:
+        input: results of download_playlist
+        output: {total, succeeded, failed, failures}
+    - merge_video_and_audio_file(video_file_path, audio_file_path, output_file_path):
+        input: video_file_path, audio_file_path, output_file_path (optional - container is taken from its extension)
+        output: video_file_path (merged - video + audio, streams are copied when the container supports the codecs)
+    - convert_video_file:
+        input: input_file, output_file
+        output: output_file (rewrapped into the container of output_file, re-encoded only when needed)
     - trim_video:
-        input: file_path, start_time(in sec), end_time(in sec)
+        input: file_path, start_time(in sec), end_time(in sec), mode ("fast" - keyframe cut by stream copy,
+               "accurate" - re-encodes only the boundary GOPs, "reencode" - full re-encode)
         output: path (of trimmed file)
     - trim_audio:
         input: file_path, start_time(in sec), end_time(in sec)
         output: path (of trimmed file)
+    - render_video / render_audio:
+        input: source file(s), output_file, start_time(in sec), end_time(in sec) (+ trim mode for video)
+        output: output_file (converted, merged and trimmed in a single pass)
+    - download_ranges:
+        input: url, output_file, total_bytes, connections, part_file
+        output: output_file (byte ranges fetched in parallel into a preallocated .part file, resumed from its
+                manifest of completed ranges, promoted atomically once complete)
+    - read_batch_manifest / run_batch:
+        input: CSV/JSONL manifest of jobs (url or author + title, type, format, quality, start, end, encoder_profile),
+               download_path, report_file, workers, trim_mode, encoder_profile
+        output: JSONL result line per job (output files, bytes, queued/run seconds, error) as each job finishes
+    - get_encoder_profile:
+        input: name (None = "encoder_profile" from setup.json)
+        output: EncoderProfile (preset, crf, audio_bitrate, threads - scaled to the number of CPU cores)
+    - JobServer((host, port), download_path, workers, max_queued) (console: serve):
+        resident worker pool taking jobs over a localhost JSON API - POST/GET /jobs, GET/DELETE /jobs/<id> and an
+        NDJSON stream of the job events on GET /events. A job's download_path must lie inside download_path
+    - MediaPipeline(fetch_workers, convert_workers, max_pending):
+        submit(prepare_youtube_video/audio, *args) -> future of the output file - streams are fetched in threads and
+        handed over a bounded queue (setup.json "pipeline") to the shared conversion process pool (spawned once,
+        see get_convert_executor) for conversion/merge/trim
+    - download_youtube_video_async / download_youtube_audio_async / download_playlist_async / find_url_by_name_async /
+      resolve_video_metadata_async:
+        awaitable versions (same inputs/outputs) - the blocking work runs in worker threads (video and audio streams
+        are fetched concurrently), cancelling the task stops the download/conversion. They wrap the same
+        prepare/fetch/finish steps as the blocking download functions, which work inside a running event loop too
+    - get_cached_audio_file:
+        input: youtube_url, file_type, start_time, end_time
+        output: path (of the converted audio inside the media cache - e.g. for previews)
+    - ProgressReporter(on_update) / ConsoleProgress:
+        progress callback that reports the rate (bytes/s, frames/s) and ETA of each stage, rate limited
+    - JobManager:
+        submit(name, function, *args) -> Job (runs in a worker thread, function gets a progress callback),
+        cancel(job_id), poll_events() -> [(event, job)] - used by the GUI to keep the Tk main thread free
+    - get_media_cache:
+        output: MediaCache (content-addressed store of streams and converted files, with stats() hit/miss counters)
+    - resolve_video_metadata:
+        input: youtube_url
+        output: VideoMetadata (title, author, length, thumbnail_url, streams - fetched once per video id and cached)
+    - AudioPreview.from_url(youtube_url).start(position):
+        progressive preview - read(position) returns PCM while the lowest bitrate audio stream is still streaming,
+        seek(position) fetches only the needed part of the stream
     - get_video_name()
         input: youtube_url
         output: name (string)
@@ -35,11 +92,17 @@ Function used:
         output: list ( with all existing resolutions of the video)
     - extract_thumbnail_from_url:
         input: url
-        output: image data
+        output: image data (resized to fit 450x250 - served from the thumbnail disk cache after the first load)
+    - add_span_sink(sink) / span(name):
+        timing spans of the job stages (metadata, stream_download, transcode/merge/trim, copy) with duration, bytes
+        and the chosen stream/codecs -> every sink (a callable, JsonLinesSink(path) or SpanCollector)
+    - get_settings():
+        output: Settings (immutable, validated snapshot of setup.json + YTD_<NAME> environment overrides -
+                reloaded only when the file changes; backend functions take it as `settings`)
     - get_value_from_json(key):
         {key: value}
         input: data key from the setup.json
-        output: value linked to this key
+        output: value linked to this key (raw value from the settings snapshot)
     - str_time_to_seconds(time_str):
         input: time in format - min:sec (00:00)
         output: sum of minutes
@@ -51,6 +114,9 @@ Work as console app:
             - audio
             - vide
             - play list
+            - batch (url_or_author is a CSV/JSONL manifest of jobs, media_type is the default format)
+            - serve (python backend.py serve <download_path> --port 8765 --workers 4 - job server, see Section - Job
+              server for the API)
         quality, start_time, end_time have default_values = ""
 
     Examples:
@@ -58,40 +124,1643 @@ Work as console app:
             python backend.py audio "The Cranberries" "Zombie" "C:\Users\name\Downloads" "mp3"
         - Download vide(mp4) by url
             python backend.py video "https://www.youtube.com/watch?v=6Ejga4kJUts" "C:\Users\name\Downloads" "mp4"
+        - Download every job of a manifest, 3 at a time, with a JSONL result line per job:
+            python backend.py batch "jobs.csv" "C:\Users\name\Downloads" "mp3" --workers 3 --report "results.jsonl"
+          manifest columns/keys: url or author + title, type (video/audio/playlist), format, quality, start, end,
+          encoder_profile
+        - Keep a job server running and submit jobs to it:
+            python backend.py serve "C:\Users\name\Downloads" --workers 4
+            curl -X POST localhost:8765/jobs -d "{\"url\": \"https://www.youtube.com/watch?v=6Ejga4kJUts\", \"format\": \"mp3\"}"
+            curl localhost:8765/events
+        - Re-encode a trimmed video quickly (bulk jobs):
+            python backend.py video "https://www.youtube.com/watch?v=6Ejga4kJUts" "C:\Users\name\Downloads" "mp4" --start_time 0:30 --end_time 1:30 --trim_mode reencode --encoder_profile fast
 """
+import asyncio
+import atexit
+import csv
+import ipaddress
 import json
+import multiprocessing
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
 import requests
+import requests.adapters
+import urllib.error
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib3.util.retry import Retry
 from PIL import Image
+from moviepy.config import get_setting
 from moviepy.editor import VideoFileClip, AudioFileClip
-# from proglog import ProgressBarLogger
-from pytube import YouTube, Playlist
-from pydub import AudioSegment
+from proglog import ProgressBarLogger
+from pytube import YouTube, Playlist, extract, request
 from googleapiclient.discovery import build
 import os, re
+import hashlib
+import shutil
+import subprocess
+import uuid
+from contextlib import ExitStack, contextmanager
+from functools import partial
+import tempfile
 import argparse # Work with console
+import sys
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+
+
+# Section - Settings
+# static_files/setup.json is parsed and validated once into an immutable Settings snapshot. get_settings() re-reads
+# the file only when its modification time changes, so a lookup costs one stat. Every field can be overridden from
+# the environment (YTD_<FIELD NAME>, e.g. YTD_DOWNLOAD_CONNECTIONS=8) or by the caller (console: --set name=value).
+def frozen_mapping(value):
+    if not isinstance(value, dict):
+        raise TypeError(f"expected an object, got {type(value).__name__}")
+    return MappingProxyType({str(key): item for key, item in value.items()})
+
+
+def codec_mapping(value):
+    return MappingProxyType({key: string_tuple(codecs) for key, codecs in frozen_mapping(value).items()})
+
+
+def string_tuple(value):
+    if not isinstance(value, (list, tuple)):
+        raise TypeError(f"expected a list, got {type(value).__name__}")
+    return tuple(str(item) for item in value)
+
+
+def positive_int(value):
+    if isinstance(value, bool) or int(value) != value or value < 1:
+        raise ValueError(f"expected a positive integer, got {value!r}")
+    return int(value)
+
+
+def non_negative_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"expected a number >= 0, got {value!r}")
+    return value
+
+
+def non_negative_int(value):
+    if isinstance(value, bool) or int(value) != value or value < 0:
+        raise ValueError(f"expected an integer >= 0, got {value!r}")
+    return int(value)
+
+
+def boolean(value):
+    if not isinstance(value, bool):
+        raise TypeError(f"expected true or false, got {value!r}")
+    return value
+
+
+def optional_string(value):
+    if value is not None and not isinstance(value, str):
+        raise TypeError(f"expected a string or null, got {value!r}")
+    return value or None
+
+
+# Named encoder settings for everything that gets re-encoded. threads is a share of the CPU cores, so the same profile
+# scales from a laptop to a build machine.
+@dataclass(frozen=True)
+class EncoderProfile:
+    name: str
+    preset: str = "medium"
+    crf: int = 23
+    audio_bitrate: str = None
+    thread_share: float = 1.0
+
+    @property
+    def threads(self):
+        return max(1, int((os.cpu_count() or 1) * self.thread_share))
+
+    # What makes two encodes differ - part of the media cache key
+    def cache_key(self):
+        return [self.preset, self.crf, self.audio_bitrate]
+
+
+default_encoder_profiles = MappingProxyType({"balanced": EncoderProfile("balanced", "medium", 23, "192k")})
+
+
+def encoder_profile_mapping(value):
+    profiles = {}
+    for name, profile in frozen_mapping(value).items():
+        if not isinstance(profile, dict):
+            raise TypeError(f"profile {name}: expected an object, got {type(profile).__name__}")
+        unknown = set(profile) - {"preset", "crf", "audio_bitrate", "thread_share"}
+        if unknown:
+            raise ValueError(f"profile {name}: unknown keys {', '.join(sorted(unknown))}")
+        thread_share = non_negative_number(profile.get("thread_share", 1.0))
+        if not 0 < thread_share <= 1:
+            raise ValueError(f"profile {name}: thread_share must be in (0, 1], got {thread_share!r}")
+        profiles[name] = EncoderProfile(name, str(profile.get("preset", "medium")),
+                                        non_negative_int(profile.get("crf", 23)),
+                                        optional_string(profile.get("audio_bitrate")), thread_share)
+    if not profiles:
+        raise ValueError("expected at least one profile")
+    return MappingProxyType(profiles)
+
+
+# "json" is the key path in setup.json, "convert" validates the value and makes it immutable
+def setting(json_path, convert, default=None, default_factory=None):
+    metadata = {"json": json_path, "convert": convert}
+    if default_factory is not None:
+        return field(default_factory=default_factory, metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+@dataclass(frozen=True)
+class Settings:
+    api_key: str = setting(("api_key",), str, "")
+    supported_audio_file_types: MappingProxyType = setting(("supported_audio_file_types",), frozen_mapping,
+                                                           default_factory=lambda: MappingProxyType({}))
+    audio_stream_copy_codecs: MappingProxyType = setting(("audio_stream_copy_codecs",), codec_mapping,
+                                                         default_factory=lambda: MappingProxyType({}))
+    preferred_stream_codecs: MappingProxyType = setting(("preferred_stream_codecs",), codec_mapping,
+                                                        default_factory=lambda: MappingProxyType({}))
+    supported_video_file_types: tuple = setting(("supported_video_file_types",), string_tuple, ())
+    playlist_workers: int = setting(("playlist_workers",), positive_int, 1)
+    download_connections: int = setting(("download_connections",), positive_int, 1)
+    media_cache_max_bytes: int = setting(("media_cache", "max_bytes"), positive_int, 2 * 1024 ** 3)
+    metadata_cache_max_entries: int = setting(("metadata_cache", "max_entries"), positive_int, 64)
+    metadata_cache_ttl: float = setting(("metadata_cache", "ttl_seconds"), non_negative_number, 3600)
+    metadata_cache_persist: bool = setting(("metadata_cache", "persist"), boolean, False)
+    search_ttl: float = setting(("youtube_search", "ttl_seconds"), non_negative_number, 7 * 24 * 3600)
+    search_persist: bool = setting(("youtube_search", "persist"), boolean, True)
+    search_workers: int = setting(("youtube_search", "workers"), positive_int, 4)
+    search_api_endpoint: str = setting(("youtube_search", "api_endpoint"), optional_string, None)
+    http_pool_maxsize: int = setting(("http", "pool_maxsize"), positive_int, 8)
+    http_connect_timeout: float = setting(("http", "connect_timeout"), non_negative_number, 10)
+    http_read_timeout: float = setting(("http", "read_timeout"), non_negative_number, 30)
+    http_retries: int = setting(("http", "retries"), non_negative_int, 3)
+    http_backoff_factor: float = setting(("http", "backoff_factor"), non_negative_number, 0.5)
+    http_host_overrides: MappingProxyType = setting(("http", "host_overrides"), frozen_mapping,
+                                                    default_factory=lambda: MappingProxyType({}))
+    convert_workers: int = setting(("pipeline", "convert_workers"), positive_int, 2)
+    pipeline_max_pending: int = setting(("pipeline", "max_pending"), positive_int, 2)
+    encoder_profile: str = setting(("encoder_profile",), str, "balanced")
+    encoder_profiles: MappingProxyType = setting(("encoder_profiles",), encoder_profile_mapping,
+                                                 default_factory=lambda: default_encoder_profiles)
+    # The whole file as it was read - for get_value_from_json
+    raw: MappingProxyType = field(default_factory=lambda: MappingProxyType({}), compare=False, repr=False)
+
+    @property
+    def audio_file_types(self):
+        return list(self.supported_audio_file_types.keys())
+
+    # Pickled with plain dicts in place of the MappingProxyTypes (they can't be pickled), so a snapshot can be passed
+    # to the conversion processes
+    def __reduce__(self):
+        values = {settings_field.name: getattr(self, settings_field.name) for settings_field in fields(self)}
+        return restore_settings, ({name: dict(value) if isinstance(value, MappingProxyType) else value
+                                   for name, value in values.items()},)
+
+
+def restore_settings(values):
+    return Settings(**{name: MappingProxyType(value) if isinstance(value, dict) else value
+                       for name, value in values.items()})
+
+
+def settings_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory of the current script
+    return os.path.join(script_dir, 'static_files', 'setup.json')
+
+
+# An override from the environment or the command line is a string - JSON values ("8", "true", "[...]") are decoded
+def parse_setting_override(value):
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+
+# Read and validate setup.json -> Settings. Raises ValueError (naming the setting) instead of returning None.
+def load_settings(file_path=None, overrides=None, environ=None):
+    file_path = file_path or settings_path()
+    overrides = overrides or {}
+    environ = os.environ if environ is None else environ
+
+    with open(file_path, 'r') as json_file:
+        data = json.load(json_file)
+    if isinstance(data, list) and len(data) > 0:
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError('Invalid JSON format or empty data')
+
+    unknown = set(overrides) - {settings_field.name for settings_field in fields(Settings)}
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+
+    values = {}
+    for settings_field in fields(Settings):
+        if "json" not in settings_field.metadata:
+            continue
+        value = data
+        for key in settings_field.metadata["json"]:
+            value = value.get(key, None) if isinstance(value, dict) else None
+        env_name = f"YTD_{settings_field.name.upper()}"
+        if env_name in environ:
+            value = parse_setting_override(environ[env_name])
+        if settings_field.name in overrides:
+            value = parse_setting_override(overrides[settings_field.name])
+        if value is None:
+            continue
+        try:
+            values[settings_field.name] = settings_field.metadata["convert"](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid setting "{settings_field.name}": {e}')
+    loaded_settings = Settings(raw=MappingProxyType(data), **values)
+    if loaded_settings.encoder_profile not in loaded_settings.encoder_profiles:
+        raise ValueError(f'Invalid setting "encoder_profile": no profile named {loaded_settings.encoder_profile!r}')
+    return loaded_settings
+
+
+current_settings = None
+_settings_mtime = None
+_settings_overrides = {}
+_settings_lock = threading.Lock()
+
+
+# The current snapshot - reloaded only when setup.json changed. A broken edit keeps the last good snapshot.
+def get_settings():
+    global current_settings, _settings_mtime
+    try:
+        mtime = os.stat(settings_path()).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _settings_lock:
+        if current_settings is None or mtime != _settings_mtime:
+            try:
+                current_settings = load_settings(overrides=_settings_overrides)
+            except (OSError, ValueError) as e:
+                if current_settings is None:
+                    raise
+                print(f"Error reloading settings, keeping the previous ones: {e}")
+            _settings_mtime = mtime
+        return current_settings
+
+
+# Encoder profile by name (None = "encoder_profile" from setup.json). An EncoderProfile is returned as it is.
+def get_encoder_profile(name=None, settings=None):
+    if isinstance(name, EncoderProfile):
+        return name
+    settings = settings or get_settings()
+    name = name or settings.encoder_profile
+    if name not in settings.encoder_profiles:
+        raise ValueError(f"Unknown encoder profile: {name}. "
+                         f"Available profiles are {', '.join(settings.encoder_profiles)}.")
+    return settings.encoder_profiles[name]
+
+
+# Overrides applied on top of setup.json (and the environment) from now on, e.g. {"download_connections": 8}
+def set_settings_overrides(overrides):
+    global current_settings, _settings_overrides
+    with _settings_lock:
+        new_settings = load_settings(overrides=overrides)
+        _settings_overrides = dict(overrides)
+        current_settings = new_settings
+    return new_settings
+
+
+# Section - Instrumentation
+# The stages of a job (metadata, stream download, transcode/merge/trim, copy) are recorded as spans: a dict with the
+# stage name, its duration, bytes and details like the chosen stream and codecs. Spans go to every registered sink -
+# any callable taking the span dict, e.g. JsonLinesSink(path) or a SpanCollector (console: --profile).
+# Without sinks a span costs next to nothing.
+span_sinks = []
+_span_sinks_lock = threading.Lock()
+_span_stack = threading.local()
+
+
+def add_span_sink(sink):
+    with _span_sinks_lock:
+        span_sinks.append(sink)
+    return sink
+
+
+def remove_span_sink(sink):
+    with _span_sinks_lock:
+        if sink in span_sinks:
+            span_sinks.remove(sink)
+
+
+# Time the with-block as a span. The yielded dict is the span's details - the block can add to it (e.g. "bytes").
+@contextmanager
+def span(name, **details):
+    if not span_sinks:
+        yield details
+        return
+    stack = _span_stack.__dict__.setdefault("names", [])
+    record = {"name": name, "parent": stack[-1] if stack else None, "thread": threading.current_thread().name,
+              "started_at": time.time()}
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield details
+        record["error"] = None
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - start
+        stack.pop()
+        record.update(details)
+        emit_span(record)
+
+
+def emit_span(record):
+    with _span_sinks_lock:
+        sinks = list(span_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as e:
+            print(f"Error in span sink: {e}")
+
+
+# Sink appending every span as a JSON line to a file
+class JsonLinesSink:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            with open(self.file_path, 'a') as json_file:
+                json_file.write(line + "\n")
+
+
+# Sink keeping the spans in memory - breakdown() sums them per stage
+class SpanCollector:
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+    def breakdown(self):
+        stages = OrderedDict()
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            stage = stages.setdefault(record["name"], {"count": 0, "seconds": 0.0, "bytes": 0, "errors": 0})
+            stage["count"] += 1
+            stage["seconds"] += record["duration"]
+            stage["bytes"] += record.get("bytes") or 0
+            stage["errors"] += 1 if record["error"] else 0
+        return stages
+
+    def format_breakdown(self):
+        lines = [f"{'stage':<16}{'count':>7}{'seconds':>11}{'MB':>10}{'MB/s':>9}"]
+        for name, stage in self.breakdown().items():
+            megabytes = stage["bytes"] / 1024 ** 2
+            rate = f"{megabytes / stage['seconds']:.1f}" if stage["bytes"] and stage["seconds"] else "-"
+            errors = f"  ({stage['errors']} failed)" if stage["errors"] else ""
+            lines.append(f"{name:<16}{stage['count']:>7}{stage['seconds']:>11.3f}{megabytes:>10.1f}{rate:>9}"
+                         f"{errors}")
+        return "\n".join(lines)
+
+
+# Section - HTTP transport
+# Every backend request goes through one HttpTransport: a requests session with keep-alive pools (pool_maxsize
+# connections per host, callers wait for a free one), shared timeouts and retries with exponential backoff.
+# pytube's requests and the YouTube Data API client are routed through it too. host_overrides sends the requests of
+# a host to another base URL ({"*.googlevideo.com": "http://127.0.0.1:8000"}), and set_transport() swaps the whole
+# transport - e.g. to run the download flow against a local stand-in server.
+class HttpTransport:
+    def __init__(self, pool_maxsize=8, timeout=(10, 30), retries=3, backoff_factor=0.5, host_overrides=None):
+        self.timeout = timeout
+        self.host_overrides = dict(host_overrides or {})
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None, raise_on_status=False)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize,
+                                                pool_block=True, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # URL with the host override applied
+    def resolve(self, url):
+        parts = urllib.parse.urlsplit(url)
+        host = parts.hostname or ""
+        for pattern, base_url in self.host_overrides.items():
+            if host == pattern or (pattern.startswith("*.") and host.endswith(pattern[1:])):
+                base = urllib.parse.urlsplit(base_url)
+                return urllib.parse.urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+        return url
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        return self.session.request(method, self.resolve(url), headers=headers, data=data, stream=stream,
+                                    timeout=timeout or self.timeout)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def create_transport(settings=None):
+    settings = settings or get_settings()
+    return HttpTransport(pool_maxsize=settings.http_pool_maxsize,
+                         timeout=(settings.http_connect_timeout, settings.http_read_timeout),
+                         retries=settings.http_retries,
+                         backoff_factor=settings.http_backoff_factor,
+                         host_overrides=settings.http_host_overrides)
+
+
+transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    global transport
+    with _transport_lock:
+        if transport is None:
+            transport = create_transport()
+        return transport
+
+
+# Swap the transport of every backend request -> the previous one (the caller closes it if it's done with it)
+def set_transport(new_transport):
+    global transport
+    with _transport_lock:
+        previous_transport, transport = transport, new_transport
+    return previous_transport
+
+
+# pytube reads its responses like urlopen() ones - read() and info()
+class PytubeResponse:
+    def __init__(self, response):
+        self._content = BytesIO(response.content)
+        self._headers = response.headers
+
+    def read(self, *args):
+        return self._content.read(*args)
+
+    def info(self):
+        return self._headers
+
+
+# Drop-in for pytube.request._execute_request (watch pages, innertube, stream sizes and ranges)
+def pytube_execute_request(url, method=None, headers=None, data=None, timeout=None):
+    base_headers = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+    if headers:
+        base_headers.update(headers)
+    if data and not isinstance(data, bytes):
+        data = bytes(json.dumps(data), encoding="utf-8")
+    if not url.lower().startswith("http"):
+        raise ValueError("Invalid URL")
+    timeout = timeout if isinstance(timeout, (int, float)) else None
+    response = get_transport().request(method or ("POST" if data else "GET"), url, headers=base_headers, data=data,
+                                       timeout=timeout)
+    if response.status_code >= 400:
+        # pytube handles urllib's errors (e.g. a 404 for the size of a segmented stream)
+        raise urllib.error.HTTPError(url, response.status_code, response.reason, response.headers, None)
+    return PytubeResponse(response)
+
+
+request._execute_request = pytube_execute_request
+
+
+# httplib2 style response for googleapiclient - a dict of lower case headers with status and reason
+class ApiClientResponse(dict):
+    def __init__(self, response):
+        super().__init__((key.lower(), value) for key, value in response.headers.items())
+        self.status = response.status_code
+        self.reason = response.reason
+        self["status"] = str(response.status_code)
+
+
+# The http object for googleapiclient.discovery.build - its requests go through the transport
+class ApiClientHttp:
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        response = get_transport().request(method, uri, headers=headers, data=body)
+        return ApiClientResponse(response), response.content
+
+
+# Section - Video metadata
+# Everything we need from a watch page (title, author, length, thumbnail and the stream manifest) is fetched once per
+# video id and kept in an in-memory LRU cache with TTL, so the GUI and the download helpers don't pay the
+# watch-page/innertube round trip again for every attribute they read.
+class VideoMetadata:
+    def __init__(self, video_id, title, author, length, thumbnail_url, youtube=None, fetched_at=None):
+        self.video_id = video_id
+        self.title = title
+        self.author = author
+        self.length = length
+        self.thumbnail_url = thumbnail_url
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        self._youtube = youtube
+        self._streams = None
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+    @property
+    def youtube(self):
+        # Entries restored from disk have no YouTube object yet - creating one is free, the network is hit lazily
+        with self._lock:
+            if self._youtube is None:
+                self._youtube = YouTube(self.url)
+            return self._youtube
+
+    @property
+    def streams(self):
+        # The stream manifest is resolved on first use and shared by every caller afterwards
+        youtube = self.youtube
+        with self._lock:
+            if self._streams is None:
+                self._streams = youtube.streams
+            return self._streams
+
+    def to_dict(self):
+        return {
+            "video_id": self.video_id,
+            "title": self.title,
+            "author": self.author,
+            "length": self.length,
+            "thumbnail_url": self.thumbnail_url,
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["video_id"], data["title"], data["author"], data["length"], data["thumbnail_url"],
+                   fetched_at=data["fetched_at"])
+
+
+class MetadataCache:
+    def __init__(self, max_entries=64, ttl=3600, persist_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if persist_path:
+            self._load()
+
+    def get(self, video_id):
+        with self._lock:
+            metadata = self._entries.get(video_id)
+            if metadata is None:
+                return None
+            if time.time() - metadata.fetched_at > self.ttl:
+                del self._entries[video_id]
+                return None
+            self._entries.move_to_end(video_id)
+            return metadata
+
+    def put(self, metadata):
+        with self._lock:
+            self._entries[metadata.video_id] = metadata
+            self._entries.move_to_end(metadata.video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.persist_path:
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persist_path:
+            self._save()
+
+    def _load(self):
+        # Only the scalar fields are persisted - stream URLs expire, so the manifest is always fetched fresh
+        try:
+            with open(self.persist_path, 'r') as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading metadata cache: {e}")
+            return
+        now = time.time()
+        for entry in data:
+            try:
+                metadata = VideoMetadata.from_dict(entry)
+            except (KeyError, TypeError):
+                continue
+            if now - metadata.fetched_at <= self.ttl:
+                self._entries[metadata.video_id] = metadata
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        with self._lock:
+            data = [metadata.to_dict() for metadata in self._entries.values()]
+        try:
+            with self._save_lock:
+                os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+                temp_path = f"{self.persist_path}.tmp"
+                with open(temp_path, 'w') as json_file:
+                    json.dump(data, json_file)
+                os.replace(temp_path, self.persist_path)
+        except OSError as e:
+            print(f"Error saving metadata cache: {e}")
+
+
+def create_metadata_cache(settings=None):
+    settings = settings or get_settings()
+    persist_path = None
+    if settings.metadata_cache_persist:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        persist_path = os.path.join(script_dir, "cache", "metadata.json")
+    return MetadataCache(max_entries=settings.metadata_cache_max_entries,
+                         ttl=settings.metadata_cache_ttl,
+                         persist_path=persist_path)
+
+
+# Shared by every helper below - created on first use
+metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    global metadata_cache
+    with _metadata_cache_lock:
+        if metadata_cache is None:
+            metadata_cache = create_metadata_cache()
+        return metadata_cache
+
+
+# Resolve the video metadata for a URL -> fetched from YouTube only when it's not cached already
+def resolve_video_metadata(youtube_url):
+    video_id = extract.video_id(youtube_url)
+    cache = get_metadata_cache()
+    metadata = cache.get(video_id)
+    if metadata is None:
+        yt = YouTube(youtube_url)
+        metadata = VideoMetadata(video_id, yt.title, yt.author, yt.length, yt.thumbnail_url, youtube=yt)
+        cache.put(metadata)
+    return metadata
+
+
+# Section - Thumbnails
+# The preview thumbnail, resized to fit 450x250, is stored on disk per video id - a repeated load costs no request
+# and only a small JPEG decode. On a miss the image is fetched over the HTTP transport and decoded in JPEG draft mode,
+# i.e. already scaled down by the decoder instead of decoding the full size image and shrinking it.
+class ThumbnailService:
+    def __init__(self, cache_dir, max_size=(450, 250)):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, video_id):
+        return os.path.join(self.cache_dir, f"{video_id}.jpg")
+
+    def get(self, youtube_url):
+        path = self.path_for(extract.video_id(youtube_url))
+        if os.path.isfile(path):
+            try:
+                image = Image.open(path)
+                image.load()
+                return image
+            except OSError as e:
+                print(f"Error reading cached thumbnail {path}: {e}")
+
+        yt = resolve_video_metadata(youtube_url)
+        # Split the URL at the '?' character
+        thumbnail_jpg_url = yt.thumbnail_url.split('?')[0]
+        response = get_transport().get(thumbnail_jpg_url)
+        response.raise_for_status()
+
+        image = Image.open(BytesIO(response.content))
+        # JPEG only: the decoder scales by 1/2, 1/4 or 1/8 while keeping at least max_size
+        image.draft("RGB", self.max_size)
+        image.thumbnail(self.max_size)
+        self._store(path, image)
+        return image
+
+    def _store(self, path, image):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            image.convert("RGB").save(temp_path, "JPEG", quality=90)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error caching thumbnail {path}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self):
+        for file_name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, file_name))
+            except OSError as e:
+                print(f"Error removing {file_name}: {e}")
+
+
+def create_thumbnail_service():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return ThumbnailService(os.path.join(script_dir, "cache", "thumbnails"))
+
+
+thumbnail_service = None
+_thumbnail_service_lock = threading.Lock()
+
+
+def get_thumbnail_service():
+    global thumbnail_service
+    with _thumbnail_service_lock:
+        if thumbnail_service is None:
+            thumbnail_service = create_thumbnail_service()
+        return thumbnail_service
+
+
+# Section - Media cache
+# Downloaded streams and converted files are stored under a content key (video id + itag + transform parameters),
+# so the GUI preview, repeated downloads and playlist re-runs reuse them instead of fetching again. The cache keeps
+# to a byte budget by evicting the least recently used entries; inserts are atomic (temp file + rename).
+class MediaCache:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Creation lock per key, and the number of callers holding or waiting for it - it is dropped with the last one
+        self._key_locks = {}
+        self._key_lock_users = {}
+        self._pins = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(video_id, itag, **params):
+        payload = json.dumps({"video_id": video_id, "itag": itag, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, key, extension):
+        return os.path.join(self.cache_dir, f"{key}.{extension}")
+
+    def get(self, key, extension):
+        path = self.path_for(key, extension)
+        if os.path.isfile(path):
+            # The modification time is the LRU clock
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return path
+        with self._lock:
+            self.misses += 1
+        return None
+
+    # Yield the path of the entry, creating it with create(temp_path) on a miss. The entry is pinned (never evicted)
+    # while the with-block runs, and concurrent callers of the same key wait for one creation instead of racing.
+    @contextmanager
+    def entry(self, key, extension, create):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            self._key_lock_users[key] = self._key_lock_users.get(key, 0) + 1
+        try:
+            with key_lock:
+                self._pin(key, 1)
+                try:
+                    path = self.get(key, extension)
+                    if path is None:
+                        path = self._insert(key, extension, create)
+                except BaseException:
+                    self._pin(key, -1)
+                    raise
+        finally:
+            with self._lock:
+                self._key_lock_users[key] -= 1
+                if not self._key_lock_users[key]:
+                    del self._key_lock_users[key]
+                    del self._key_locks[key]
+        try:
+            yield path
+        finally:
+            self._pin(key, -1)
+        self.evict()
+
+    def _insert(self, key, extension, create):
+        path = self.path_for(key, extension)
+        # The temp name keeps the real extension last, ffmpeg picks the container from it
+        temp_path = os.path.join(self.cache_dir, f"{key}.{uuid.uuid4().hex}.tmp.{extension}")
+        try:
+            create(temp_path)
+            if not os.path.isfile(temp_path):
+                raise RuntimeError("No file was created for the cache entry.")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def _pin(self, key, delta):
+        with self._lock:
+            count = self._pins.get(key, 0) + delta
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def _entries(self):
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if ".tmp." in file_name:
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_name.split(".")[0], path))
+        return entries
+
+    # Remove the least recently used entries until the cache fits its byte budget
+    def evict(self):
+        entries = sorted(self._entries())
+        total_bytes = sum(size for _, size, _, _ in entries)
+        for _, size, key, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            with self._lock:
+                if key in self._pins:
+                    continue
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError as e:
+                # e.g. the file is still open in the audio player on Windows
+                print(f"Error evicting {path}: {e}")
+
+    def clear(self):
+        max_bytes = self.max_bytes
+        self.max_bytes = 0
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def create_media_cache(settings=None):
+    settings = settings or get_settings()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return MediaCache(os.path.join(script_dir, "cache", "media"), settings.media_cache_max_bytes)
+
+
+media_cache = None
+_media_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    global media_cache
+    with _media_cache_lock:
+        if media_cache is None:
+            media_cache = create_media_cache()
+        return media_cache
+
+
+# Section - Background jobs
+# A small worker pool for callers that must not block (the GUI). Every job function is called with a progress
+# callback; progress and state changes go to a thread-safe event queue the caller drains from its own thread.
+# Cancellation is cooperative: once a job is cancelled its progress callback raises JobCancelled.
+class JobCancelled(Exception):
+    pass
+
+
+# Progress callbacks are called with (stage, done, total) - "download" in bytes, "convert" in seconds of media,
+# "encode" in frames and "playlist" in items. A ProgressReporter turns them into updates with the rate and the ETA
+# of the stage, passed to on_update at most every `interval` seconds (and on every stage change and at the end),
+# so a caller that redraws on each update doesn't slow down the download/encode loop.
+progress_units = {"download": "B", "convert": "s", "encode": "frames", "playlist": "items"}
+
+
+# Share of a download item per stage -> (start, size): the streams are downloaded first, then converted/encoded.
+# "playlist" marks the item as done.
+item_stage_shares = {"download": (0.0, 0.7), "convert": (0.7, 0.3), "encode": (0.7, 0.3), "playlist": (0.0, 1.0)}
+
+
+# Overall progress of many items ("playlist" stage, in items) = finished items + the fraction done of the running
+# ones. Every stage of an item starts again at 0, so an item is reported as the start of its stage plus the done part
+# of the stage's share - and never lower than before, so the overall progress doesn't go backwards between stages.
+class PlaylistProgress:
+    def __init__(self, progress, items):
+        self.progress = progress
+        self.items = items
+        self.item_fractions = [0.0] * items
+        self._lock = threading.Lock()
+
+    # Progress callback of item `index` (None without a progress callback)
+    def item(self, index):
+        def report(stage, done, total):
+            if stage not in item_stage_shares:
+                return
+            start, size = item_stage_shares[stage]
+            fraction = start + size * (min(done / total, 1.0) if total else 0.0)
+            with self._lock:
+                self.item_fractions[index] = max(self.item_fractions[index], fraction)
+                completed = sum(self.item_fractions)
+            self.progress("playlist", completed, self.items)
+        return report if self.progress else None
+
+
+class ProgressReporter:
+    def __init__(self, on_update, interval=0.5, smoothing=0.3):
+        self.on_update = on_update
+        self.interval = interval
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._stage = None
+        self._last_emit = 0.0
+        self._sample_time = 0.0
+        self._sample_done = 0
+        self._rate = None
+
+    def __call__(self, stage, done, total):
+        now = time.monotonic()
+        with self._lock:
+            if stage != self._stage or done < self._sample_done:
+                # New stage (or a restarted one) - the rate starts over
+                stage_changed = stage != self._stage
+                self._stage = stage
+                self._sample_time, self._sample_done, self._rate = now, done, None
+            else:
+                stage_changed = False
+                elapsed = now - self._sample_time
+                if elapsed >= 0.2:
+                    rate = (done - self._sample_done) / elapsed
+                    self._rate = rate if self._rate is None else \
+                        self.smoothing * rate + (1 - self.smoothing) * self._rate
+                    self._sample_time, self._sample_done = now, done
+            finished = bool(total) and done >= total
+            if not (stage_changed or finished or now - self._last_emit >= self.interval):
+                return
+            self._last_emit = now
+            rate = self._rate
+        eta = (total - done) / rate if rate and total and done < total else (0.0 if finished else None)
+        self.on_update({
+            "stage": stage,
+            "done": done,
+            "total": total,
+            "fraction": min(done / total, 1.0) if total else 0.0,
+            "unit": progress_units.get(stage, ""),
+            "rate": rate,
+            "eta": eta,
+        })
+
+
+# Progress update -> one line of text, e.g. "download 45% 12.3 MB/s ETA 00:12"
+def format_progress(update):
+    text = f"{update['stage']} {update['fraction'] * 100:.0f}%"
+    rate = update.get("rate")
+    if rate:
+        unit = update.get("unit", "")
+        if unit == "B":
+            text += f" {rate / 1024 ** 2:.1f} MB/s"
+        elif unit == "s":
+            text += f" {rate:.1f}x"
+        else:
+            text += f" {rate:.1f} {unit}/s"
+    if update.get("eta") is not None:
+        minutes, seconds = divmod(int(update["eta"]), 60)
+        text += f" ETA {minutes:02}:{seconds:02}"
+    return text
+
+
+# Progress line on the console (stderr, rewritten in place)
+class ConsoleProgress(ProgressReporter):
+    def __init__(self, interval=0.5):
+        super().__init__(self.print_update, interval)
+        self._line_length = 0
+
+    def print_update(self, update):
+        line = format_progress(update)
+        sys.stderr.write("\r" + line.ljust(self._line_length))
+        sys.stderr.flush()
+        self._line_length = len(line)
+
+    def finish(self):
+        if self._line_length:
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+            self._line_length = 0
+
+
+class Job:
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.status = "queued"
+        self.stage = ""
+        self.progress = 0.0
+        self.rate = None
+        self.unit = ""
+        self.eta = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "rate": self.rate,
+            "unit": self.unit,
+            "eta": self.eta,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers=2, progress_interval=0.25):
+        self.progress_interval = progress_interval
+        self.events = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def submit(self, name, function, *args, **kwargs):
+        with self._lock:
+            job = Job(self._next_id, name)
+            self._next_id += 1
+            self._jobs[job.id] = job
+
+        def update_progress(update):
+            job.stage = update["stage"]
+            job.progress = update["fraction"]
+            job.rate = update["rate"]
+            job.unit = update["unit"]
+            job.eta = update["eta"]
+            self._emit("progress", job)
+
+        # Progress events are rate limited, the cancellation check runs on every call
+        reporter = ProgressReporter(update_progress, self.progress_interval)
+
+        def report(stage, done, total):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            reporter(stage, done, total)
+
+        def run():
+            if job.cancel_event.is_set():
+                # Cancelled after this worker picked the job up, before cancel() could drop the future
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                self._emit("cancelled", job)
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            self._emit("started", job)
+            try:
+                job.result = function(*args, progress=report, **kwargs)
+                job.status = "done"
+                job.progress = 1.0
+                job.eta = 0.0
+            except JobCancelled:
+                job.status = "cancelled"
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            job.finished_at = time.time()
+            self._emit(job.status, job)
+
+        self._emit("queued", job)
+        job.future = self._executor.submit(run)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.status in ("done", "failed", "cancelled"):
+            return False
+        job.cancel_event.set()
+        if job.future.cancel():
+            # It never started - nothing else will report it
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._emit("cancelled", job)
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    # Forget the oldest finished jobs beyond `keep` (a long running manager would keep every job otherwise)
+    def prune(self, keep):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed", "cancelled")]
+            for job_id in finished[:max(0, len(finished) - keep)]:
+                del self._jobs[job_id]
+
+    # All events queued since the last call -> [(event, job snapshot)]
+    def poll_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def shutdown(self, cancel_jobs=True):
+        if cancel_jobs:
+            for job in self.list_jobs():
+                job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=cancel_jobs)
+
+    def _emit(self, event, job):
+        self.events.put((event, job.to_dict()))
+
+
+# Section - Pipeline
+# A download is done in two stages: fetch (metadata + source streams into the media cache - network bound) and
+# finish (convert/merge/trim the streams into the output file - CPU bound). download_youtube_video/audio run both in
+# the calling thread. Playlists and batches run them in a MediaPipeline: a thread pool fetches, and every fetched item
+# waits in a bounded queue for a converter, which renders it in a worker process. While one item is being encoded
+# the next ones are downloading. The queue bound is the back-pressure - when the converters fall behind, the fetchers
+# wait instead of filling the disk with downloaded streams.
+class MediaTask:
+    # key/extension: the converted media cache entry, render(source_files, output_file, convert) creates it from the
+    # streams. Without render the (first) stream itself is the result.
+    def __init__(self, video_id, streams, key=None, extension=None, render=None, output_file=None, connections=None,
+                 progress=None):
+        self.video_id = video_id
+        self.streams = streams
+        self.key = key
+        self.extension = extension
+        self.render = render
+        self.output_file = output_file
+        self.connections = connections
+        self.progress = progress
+        self.source_files = None
+        self._sources = ExitStack()
+        self._sources_lock = threading.Lock()
+        # Bytes done/total of each stream - the concurrent downloads report as one counter
+        self._stream_bytes = [(0, 0)] * len(streams)
+
+    # Stage 1: download the streams into the media cache - they stay pinned there until the task is closed.
+    # Nothing is downloaded when the converted file is cached already. The video and audio streams of a merge are
+    # downloaded at the same time.
+    def fetch(self):
+        if self.source_files is not None or self.is_cached():
+            return self
+        try:
+            if len(self.streams) == 1:
+                self.source_files = [self._open_source(self.streams[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(self.streams), thread_name_prefix="stream") as executor:
+                    futures = [executor.submit(self._open_source, stream, self._stream_progress(index))
+                               for index, stream in enumerate(self.streams)]
+                self.source_files = [future.result() for future in futures]
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def _open_source(self, stream, progress=None):
+        source = open_stream_file(stream, self.video_id, self.connections, progress or self.progress)
+        source_file = source.__enter__()
+        with self._sources_lock:
+            self._sources.push(source)
+        return source_file
+
+    # Progress callback of one of the concurrently downloaded streams -> the summed bytes of all of them
+    def _stream_progress(self, index):
+        def report(stage, done, total):
+            if stage != "download":
+                self.progress(stage, done, total)
+                return
+            with self._sources_lock:
+                self._stream_bytes[index] = (done, total)
+                done = sum(stream_done for stream_done, _ in self._stream_bytes)
+                total = sum(stream_total for _, stream_total in self._stream_bytes)
+            self.progress(stage, done, total)
+        return report if self.progress else None
+
+    def is_cached(self):
+        return self.render is not None and os.path.isfile(get_media_cache().path_for(self.key, self.extension))
+
+    # Stage 2: the converted file as a media cache entry, rendered on a miss (the streams are fetched now if they
+    # weren't). convert(function, *args, **kwargs) runs the render function - see convert_inline.
+    @contextmanager
+    def open(self, convert=None):
+        convert = convert or convert_inline
+        try:
+            if self.render is None:
+                with open_stream_file(self.streams[0], self.video_id, self.connections, self.progress) as cached_file:
+                    yield cached_file
+                return
+            with get_media_cache().entry(self.key, self.extension,
+                                         lambda output_file: self.render(self.fetch().source_files, output_file,
+                                                                         convert)) as cached_file:
+                yield cached_file
+        finally:
+            self.close()
+
+    # Stage 2 + copy to output_file -> output_file
+    def finish(self, convert=None):
+        with self.open(convert) as cached_file:
+            with span("copy", file=self.output_file) as details:
+                copy_media_file(cached_file, self.output_file)
+                details["bytes"] = os.path.getsize(self.output_file)
+        return self.output_file
+
+    # Unpin the streams
+    def close(self):
+        self._sources.close()
+
+
+# Both stages of a prepared download in the calling thread -> output file (an error message is passed through)
+def run_media_task(task):
+    if isinstance(task, str):
+        return task
+    return task.fetch().finish()
+
+
+# Run a render function in this thread
+def convert_inline(function, *args, **kwargs):
+    return function(*args, **kwargs)
+
+
+# Run a render function in a worker process (executor: see get_convert_executor). Keyword arguments such as the
+# settings snapshot are pickled along. The progress updates are sent back over a queue and reported here - if
+# progress raises (e.g. JobCancelled), the worker is told to stop at its next update and the exception propagates.
+def convert_in_process(executor, function, *args, progress=None, **kwargs):
+    if progress is None:
+        return executor.submit(function, *args, **kwargs).result()
+    manager = get_convert_manager()
+    progress_queue = manager.Queue()
+    cancel_event = manager.Event()
+    future = executor.submit(run_with_progress_queue, progress_queue, cancel_event, function, args, kwargs)
+    future.add_done_callback(lambda _: progress_queue.put(None))
+    error = None
+    while True:
+        update = progress_queue.get()
+        if update is None:
+            break
+        if error is None:
+            try:
+                progress(*update)
+            except BaseException as e:
+                error = e
+                cancel_event.set()
+    if error is not None:
+        raise error
+    return future.result()
+
+
+# Worker process side of convert_in_process
+def run_with_progress_queue(progress_queue, cancel_event, function, args, kwargs):
+    def report(stage, done, total):
+        if cancel_event.is_set():
+            raise JobCancelled()
+        progress_queue.put((stage, done, total))
+    return function(*args, progress=report, **kwargs)
+
+
+# One pool of conversion processes for the whole program ("pipeline" convert_workers in setup.json), shared by every
+# MediaPipeline - a job server keeps it warm between jobs. The workers are spawned rather than forked (a fork would
+# copy locks held by other threads) and get the settings overrides of this process.
+def create_convert_executor(settings=None):
+    settings = settings or get_settings()
+    return ProcessPoolExecutor(max_workers=settings.convert_workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=set_settings_overrides, initargs=(dict(_settings_overrides),))
+
+
+convert_executor = None
+convert_manager = None
+_convert_executor_lock = threading.Lock()
+
+
+def get_convert_executor():
+    global convert_executor
+    with _convert_executor_lock:
+        if convert_executor is None:
+            convert_executor = create_convert_executor()
+            atexit.register(shutdown_convert_executor)
+        return convert_executor
+
+
+# Server process for the progress queues of convert_in_process
+def get_convert_manager():
+    global convert_manager
+    with _convert_executor_lock:
+        if convert_manager is None:
+            convert_manager = multiprocessing.get_context("spawn").Manager()
+        return convert_manager
+
+
+# Stop the conversion processes (a later get_convert_executor starts new ones)
+def shutdown_convert_executor(cancel=False):
+    global convert_executor, convert_manager
+    with _convert_executor_lock:
+        executor, manager = convert_executor, convert_manager
+        convert_executor = convert_manager = None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=cancel)
+    if manager is not None:
+        manager.shutdown()
+
+
+# Future of a pipeline item, with the times it was submitted, started fetching and finished
+class PipelineFuture(Future):
+    def __init__(self):
+        super().__init__()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+
+class MediaPipeline:
+    # fetch_workers items download at a time, convert_workers are converted at a time (each in a process of the
+    # shared pool, see get_convert_executor - unless another executor is given) and up to max_pending fetched items
+    # wait for a converter
+    def __init__(self, fetch_workers, convert_workers, max_pending=None, executor=None):
+        self._fetchers = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+        self._processes = executor or get_convert_executor()
+        self._pending = queue.Queue(maxsize=max_pending or convert_workers)
+        self._futures = []
+        self._closing = False
+        self._converters = [threading.Thread(target=self._convert_loop, name=f"convert_{index}", daemon=True)
+                            for index in range(convert_workers)]
+        for converter in self._converters:
+            converter.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(cancel=exc_type is not None)
+
+    # fetch(*args) runs in a fetcher thread and returns a MediaTask (already fetched, or it is fetched there) - the
+    # future gets the result of task.finish(). Anything else fetch returns is the result as it is.
+    def submit(self, fetch, *args, **kwargs):
+        future = PipelineFuture()
+        self._futures.append(future)
+        self._fetchers.submit(self._fetch, future, fetch, args, kwargs)
+        return future
+
+    def _fetch(self, future, fetch, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        future.started_at = time.time()
+        try:
+            task = fetch(*args, **kwargs)
+            if isinstance(task, MediaTask):
+                task.fetch()
+        except BaseException as e:
+            self._set_exception(future, e)
+            return
+        if not isinstance(task, MediaTask):
+            self._set_result(future, task)
+            return
+        # Blocks while max_pending items wait for a converter
+        while True:
+            if self._closing:
+                task.close()
+                self._set_exception(future, JobCancelled())
+                return
+            try:
+                self._pending.put((future, task), timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _convert_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            future, task = item
+            if self._closing:
+                task.close()
+                self._set_exception(future, JobCancelled())
+                continue
+            try:
+                result = task.finish(self.convert)
+            except BaseException as e:
+                self._set_exception(future, e)
+            else:
+                self._set_result(future, result)
+
+    def convert(self, function, *args, **kwargs):
+        return convert_in_process(self._processes, function, *args, **kwargs)
+
+    @staticmethod
+    def _set_result(future, result):
+        future.finished_at = time.time()
+        future.set_result(result)
+
+    @staticmethod
+    def _set_exception(future, exception):
+        future.finished_at = time.time()
+        future.set_exception(exception)
+
+    # Wait for every item (cancel=True: drop the ones not started yet, fetched items are not converted).
+    # A conversion already running in a worker process is finished. The process pool is shared and stays up.
+    def shutdown(self, cancel=False):
+        if cancel:
+            self._closing = True
+            for future in self._futures:
+                future.cancel()
+        self._fetchers.shutdown(wait=True, cancel_futures=cancel)
+        if cancel:
+            # Fetched items waiting for a converter are unpinned right away, not once a converter is free
+            while True:
+                try:
+                    future, task = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                task.close()
+                self._set_exception(future, JobCancelled())
+        for _ in self._converters:
+            self._pending.put(None)
+        for converter in self._converters:
+            converter.join()
+
+
+# Section - YouTube search
+# Name -> URL resolution through the YouTube Data API. The service is built once per thread (the discovery document
+# is parsed on build and the http object isn't thread safe), every query is cached with a TTL - "not found" too -
+# and persisted to cache/search.json, and the quota units spent are counted (search.list costs 100 units).
+search_quota_costs = {"search.list": 100}
+
+
+class SearchClient:
+    def __init__(self, api_key, ttl=7 * 24 * 3600, persist_path=None, api_endpoint=None):
+        self.api_key = api_key
+        self.ttl = ttl
+        self.persist_path = persist_path
+        # A local stand-in for the Data API can be used instead of googleapis.com
+        self.api_endpoint = api_endpoint
+        self.quota_used = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._local = threading.local()
+        if persist_path:
+            self._load()
+
+    @staticmethod
+    def make_query(author, title):
+        return " ".join(f"{title} {author}".split()).casefold()
+
+    # (author, title) -> video id, or None when nothing was found
+    def search(self, author, title):
+        query = self.make_query(author, title)
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        self._spend("search.list")
+        response = self._service().search().list(part="snippet", q=f"{title} {author}", type="video",
+                                                 maxResults=1).execute()
+        items = response.get('items') or []
+        video_id = items[0]['id']['videoId'] if items else None
+
+        with self._lock:
+            self._entries[query] = (video_id, time.time())
+        if self.persist_path:
+            self._save()
+        return video_id
+
+    # Many (author, title) pairs -> video ids in the same order. Repeated queries are searched once and the
+    # searches run on a bounded thread pool; a failed search gives None for its pairs.
+    def search_many(self, pairs, workers=4):
+        queries = {}
+        for author, title in pairs:
+            queries.setdefault(self.make_query(author, title), (author, title))
+
+        def search_pair(pair):
+            try:
+                return self.search(*pair)
+            except Exception as e:
+                print(f"Error searching for {pair[0]} - {pair[1]}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries) or 1))) as executor:
+            video_ids = dict(zip(queries, executor.map(search_pair, queries.values())))
+        return [video_ids[self.make_query(author, title)] for author, title in pairs]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "quota_used": self.quota_used}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persist_path:
+            self._save()
+
+    def _spend(self, method):
+        # Quota is charged for every request sent, also for the ones that fail
+        with self._lock:
+            self.quota_used += search_quota_costs[method]
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            client_options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+            service = build('youtube', 'v3', developerKey=self.api_key, client_options=client_options,
+                            http=ApiClientHttp())
+            self._local.service = service
+        return service
+
+    def _load(self):
+        try:
+            with open(self.persist_path, 'r') as json_file:
+                data = json.load(json_file)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading search cache: {e}")
+            return
+        now = time.time()
+        for query, entry in data.items():
+            try:
+                video_id, fetched_at = entry
+            except (TypeError, ValueError):
+                continue
+            if now - fetched_at <= self.ttl:
+                self._entries[query] = (video_id, fetched_at)
+
+    def _save(self):
+        now = time.time()
+        with self._lock:
+            data = {query: entry for query, entry in self._entries.items() if now - entry[1] <= self.ttl}
+        try:
+            with self._save_lock:
+                os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+                temp_path = f"{self.persist_path}.tmp"
+                with open(temp_path, 'w') as json_file:
+                    json.dump(data, json_file)
+                os.replace(temp_path, self.persist_path)
+        except OSError as e:
+            print(f"Error saving search cache: {e}")
+
+
+def create_search_client(settings=None):
+    settings = settings or get_settings()
+    persist_path = None
+    if settings.search_persist:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        persist_path = os.path.join(script_dir, "cache", "search.json")
+    return SearchClient(settings.api_key,
+                        ttl=settings.search_ttl,
+                        persist_path=persist_path,
+                        api_endpoint=settings.search_api_endpoint)
+
+
+search_client = None
+_search_client_lock = threading.Lock()
+
+
+def get_search_client():
+    global search_client
+    with _search_client_lock:
+        if search_client is None:
+            search_client = create_search_client()
+        return search_client
 
 
 # Find song in YouTube by Author and Title -> return video URL
 def find_url_by_name(author, title):
-    api_key = get_value_from_json("api_key")
     try:
-        # Build the YouTube service
-        youtube = build('youtube', 'v3', developerKey=api_key)
-
-        # Search for the video
-        query = f"{title} {author}"
-        request = youtube.search().list(
-            part="snippet",
-            q=query,
-            type="video",
-            maxResults=1
-        )
-        response = request.execute()
-
-        # Extract the video URL from the response
-        if 'items' in response and len(response['items']) > 0:
-            video_id = response['items'][0]['id']['videoId']
+        video_id = get_search_client().search(author, title)
+        if video_id:
             video_url = f"https://www.youtube.com/watch?v={video_id}"
             return video_url
         else:
@@ -102,234 +1771,1193 @@ def find_url_by_name(author, title):
         return None
 
 
+# Find many songs at once: [(author, title)] -> [video URL or None], in the same order
+def find_urls_by_names(pairs, workers=None, settings=None):
+    if workers is None:
+        workers = (settings or get_settings()).search_workers
+    video_ids = get_search_client().search_many(pairs, workers)
+    return [f"https://www.youtube.com/watch?v={video_id}" if video_id else None for video_id in video_ids]
+
+
 # Download Video from url, in selected type with selected quality.
-def download_youtube_video(youtube_url, download_path, media_type, quality, start_time='', end_time=''):
-    # Define the supported file types
-    supported_video_file_types = get_value_from_json("supported_video_file_types")
+def download_youtube_video(youtube_url, download_path, media_type, quality, start_time='', end_time='',
+                           trim_mode="accurate", encoder_profile=None, connections=None, progress=None,
+                           settings=None):
+    return run_media_task(prepare_youtube_video(youtube_url, download_path, media_type, quality, start_time,
+                                                end_time, trim_mode, encoder_profile, connections, progress,
+                                                settings))
+
+
+# The first half of download_youtube_video: metadata and stream selection -> MediaTask writing the output file
+# (or an error message for an invalid URL)
+def prepare_youtube_video(youtube_url, download_path, media_type, quality, start_time='', end_time='',
+                          trim_mode="accurate", encoder_profile=None, connections=None, progress=None,
+                          settings=None):
+    settings = settings or get_settings()
 
     # Check if the provided file type is supported
-    if media_type not in supported_video_file_types:
+    if media_type not in settings.supported_video_file_types:
         raise ValueError("Unsupported file type for video.")
+    if connections is None:
+        connections = settings.download_connections
 
-    # Create YouTube object
+    # Resolve the video metadata (cached per video id)
     try:
-        yt = YouTube(youtube_url)
+        with span("metadata", url=youtube_url):
+            yt = resolve_video_metadata(youtube_url)
     except Exception as e:
         return f"Invalid YouTube URL: {str(e)}"
 
+    # The trim window is applied while converting/merging, so nothing is encoded twice
+    trim_window = parse_trim_window(start_time, end_time, yt.length)
+
     # Select the video stream based on the set quality
     if quality == "":
         video_stream = yt.streams.get_highest_resolution()
         quality = video_stream.resolution
     else:
-        video_stream = yt.streams.filter(type="video", res=quality).order_by("resolution").first()
+        video_stream = select_video_stream(yt.streams, quality, media_type, settings)
 
     if not video_stream:
         raise ValueError(f"No streams available for quality: {quality}")
 
-    # Download the video stream
-    downloaded_file_path = video_stream.download(output_path=download_path)
-
     # Determine the base and new file path
-    new_file = os.path.join(download_path, f"{yt.author} - {yt.title}({quality}).{media_type}")
-
-    if media_type in supported_video_file_types:
-        # Convert video to the desired format if needed
-        if media_type != 'mp4':  # If not already in mp4 format, convert it
-            video_clip = VideoFileClip(downloaded_file_path)
-            video_clip.write_videofile(new_file, codec="libx264")  # Specify codec for non-mp4 formats
-            video_clip.close()
-        else:
-            # If already mp4, just rename the file
-            os.rename(downloaded_file_path, new_file)
-    else:
-        raise ValueError(
-            f"Unsupported file type for video. Supported types are {', '.join(supported_video_file_types)}.")
+    author = sanitize_filename(yt.author)
+    title = sanitize_filename(yt.title)
+    trimmed_suffix = "_trimmed" if trim_window else ""
+    new_file = os.path.join(download_path, f"{author} - {title}({quality}){trimmed_suffix}.{media_type}")
 
-    if not video_stream.includes_audio_track:
-        # Download the audio stream
-        audio_file = download_youtube_audio(youtube_url, download_path, "mp3")
-        new_file = merge_video_and_audio_file(new_file, audio_file)
-
-    # Remove the original downloaded file if it was converted or renamed
-    if downloaded_file_path != new_file and os.path.exists(downloaded_file_path):
-        os.remove(downloaded_file_path)
-
-    if start_time != "" or end_time != "":
-        if start_time == "":
-            start_time = "00:00"
-        if end_time == "":
-            end_time = yt.length
-
-        start_time_seconds = str_time_to_seconds(start_time)
-        end_time_seconds = yt.length if end_time == yt.length else str_time_to_seconds(end_time)
-
-        trimed_file = trim_video(new_file, start_time_seconds, end_time_seconds)
-        os.remove(new_file)
-        return trimed_file
-    else:
-        return new_file
+    # Streams and the converted file come from the media cache - only what's missing is downloaded/rendered
+    task = plan_video_file(yt, video_stream, media_type, trim_window, trim_mode, encoder_profile, connections,
+                           progress, settings)
+    task.output_file = new_file
+    return task
 
 
-def download_youtube_audio(youtube_url, download_path, media_type, start_time='', end_time=''):
-    # Define the supported file types and their corresponding codecs
-    supported_audio_file_types_dict = get_value_from_json("supported_audio_file_types")
-    supported_audio_file_types = list(supported_audio_file_types_dict.keys())
+def download_youtube_audio(youtube_url, download_path, media_type, start_time='', end_time='', encoder_profile=None,
+                           connections=None, progress=None, settings=None):
+    return run_media_task(prepare_youtube_audio(youtube_url, download_path, media_type, start_time, end_time,
+                                                encoder_profile, connections, progress, settings))
+
+
+# The first half of download_youtube_audio -> MediaTask writing the output file (or an error message)
+def prepare_youtube_audio(youtube_url, download_path, media_type, start_time='', end_time='', encoder_profile=None,
+                          connections=None, progress=None, settings=None):
+    settings = settings or get_settings()
 
     # Check if the provided file type is supported
-    if media_type not in supported_audio_file_types:
+    if media_type not in settings.supported_audio_file_types:
         raise ValueError(
-            f"Unsupported file type for audio. Supported types are {', '.join(supported_audio_file_types)}.")
-
-    codec = supported_audio_file_types_dict[media_type]
+            f"Unsupported file type for audio. Supported types are {', '.join(settings.audio_file_types)}.")
+    if connections is None:
+        connections = settings.download_connections
 
-    # Create YouTube object
+    # Resolve the video metadata (cached per video id)
     try:
-        yt = YouTube(youtube_url)
+        with span("metadata", url=youtube_url):
+            yt = resolve_video_metadata(youtube_url)
     except Exception as e:
         return f"Invalid YouTube URL: {str(e)}"
 
-    # Download the best quality audio stream
-    audio_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
-    downloaded_file_path = audio_stream.download(output_path=download_path)
+    # The trim window is applied while converting, so the audio is encoded only once
+    trim_window = parse_trim_window(start_time, end_time, yt.length)
 
     # Determine the base and new file path
     title = yt.title.split(" (")[0] if "(" in yt.title else yt.title
     title = sanitize_filename(title)
     author = sanitize_filename(yt.author)
 
-    new_file = os.path.join(download_path, f"{author} - {title}.{media_type}")
-    #TODO: Check if the file exist in temp files and use it
+    trimmed_suffix = "_trimmed" if trim_window else ""
+    new_file = os.path.join(download_path, f"{author} - {title}{trimmed_suffix}.{media_type}")
+
+    # The stream and the converted file come from the media cache (e.g. the GUI preview of the same video)
+    task = plan_audio_file(yt, media_type, trim_window, encoder_profile, connections, progress, settings)
+    task.output_file = new_file
+    return task
+
+
+# Converted audio file in the media cache -> path (the GUI uses it as the preview, a later download reuses it)
+def get_cached_audio_file(youtube_url, media_type, start_time='', end_time='', encoder_profile=None, progress=None,
+                          settings=None):
+    yt = resolve_video_metadata(youtube_url)
+    trim_window = parse_trim_window(start_time, end_time, yt.length)
+    with open_audio_file(yt, media_type, trim_window, encoder_profile, progress=progress,
+                         settings=settings) as cached_file:
+        return cached_file
+
+
+# Audio of a video converted to media_type (and trimmed) as a media cache entry - the cache path is yielded and the
+# entry is kept while the with-block runs
+@contextmanager
+def open_audio_file(yt, media_type, trim_window=None, encoder_profile=None, connections=None, progress=None,
+                    settings=None):
+    task = plan_audio_file(yt, media_type, trim_window, encoder_profile, connections, progress, settings)
+    with task.fetch().open() as cached_file:
+        yield cached_file
+
+
+def plan_audio_file(yt, media_type, trim_window=None, encoder_profile=None, connections=None, progress=None,
+                    settings=None):
+    trim_start, trim_end = trim_window if trim_window else (None, None)
+    profile = get_encoder_profile(encoder_profile, settings)
+
+    # The best quality audio stream - one already in the requested codec wins, it needs no re-encoding
+    audio_stream, stream_copy = select_audio_stream(yt.streams, media_type, settings)
+    if not audio_stream:
+        raise ValueError("No audio stream available for this video.")
+
+    def render(source_files, output_file, convert):
+        # Convert to the audio format (and trim) in a single pass
+        with span("trim" if trim_window else "transcode", media_type=media_type,
+                  audio_codec=pytube_codec_name(audio_stream.audio_codec), stream_copy=stream_copy) as details:
+            convert(render_audio, source_files[0], output_file, trim_start, trim_end, stream_copy, progress=progress,
+                    settings=settings, encoder_profile=profile)
+            details["bytes"] = os.path.getsize(output_file)
+        if stream_copy:
+            print(f"Audio stream ({pytube_codec_name(audio_stream.audio_codec)}) rewrapped to {media_type} "
+                  f"without re-encoding")
+
+    key = get_media_cache().make_key(yt.video_id, audio_stream.itag, media_type=media_type, start_time=trim_start,
+                                     end_time=trim_end, stream_copy=stream_copy,
+                                     encoder_profile=None if stream_copy else profile.cache_key())
+    return MediaTask(yt.video_id, [audio_stream], key, media_type, render, connections=connections,
+                     progress=progress)
+
+
+# Video converted to media_type (merged with the adaptive audio and trimmed as needed) as a media cache entry
+@contextmanager
+def open_video_file(yt, video_stream, media_type, trim_window=None, trim_mode="accurate", encoder_profile=None,
+                    connections=None, progress=None, settings=None):
+    task = plan_video_file(yt, video_stream, media_type, trim_window, trim_mode, encoder_profile, connections,
+                           progress, settings)
+    with task.fetch().open() as cached_file:
+        yield cached_file
+
+
+def plan_video_file(yt, video_stream, media_type, trim_window=None, trim_mode="accurate", encoder_profile=None,
+                    connections=None, progress=None, settings=None):
+    trim_start, trim_end = trim_window if trim_window else (None, None)
+    profile = get_encoder_profile(encoder_profile, settings)
+
+    if video_stream.includes_audio_track and video_stream.subtype == media_type and not trim_window:
+        # Already in the requested container - the stream itself is the result
+        return MediaTask(yt.video_id, [video_stream], connections=connections, progress=progress)
+
+    audio_stream = None
+    if not video_stream.includes_audio_track:
+        # The adaptive audio stream is muxed as it is into the target container
+        audio_stream = select_merge_audio_stream(yt.streams, media_type, settings)
+        if not audio_stream:
+            raise ValueError("No audio stream available for this video.")
+
+    def render(source_files, output_file, convert):
+        # Rewrap into the requested container (merged with the audio stream) - streams are re-encoded only if the
+        # container can't hold them
+        stage = "merge" if audio_stream else ("trim" if trim_window else "transcode")
+        details = {"media_type": media_type, "video_codec": pytube_codec_name(video_stream.video_codec),
+                   "audio_codec": pytube_codec_name(audio_stream.audio_codec) if audio_stream else None,
+                   "trim_mode": trim_mode if trim_window else None, "encoder_profile": profile.name}
+        audio_file = source_files[1] if audio_stream else None
+        with span(stage, **details) as details:
+            convert(render_video, source_files[0], audio_file, output_file, trim_start, trim_end, trim_mode,
+                    progress=progress, encoder_profile=profile)
+            details["bytes"] = os.path.getsize(output_file)
+
+    key = get_media_cache().make_key(yt.video_id, video_stream.itag,
+                                     audio_itag=audio_stream.itag if audio_stream else None,
+                                     media_type=media_type, start_time=trim_start, end_time=trim_end,
+                                     trim_mode=trim_mode if trim_window else None,
+                                     encoder_profile=profile.cache_key())
+    streams = [video_stream, audio_stream] if audio_stream else [video_stream]
+    return MediaTask(yt.video_id, streams, key, media_type, render, connections=connections, progress=progress)
+
+
+# Raw stream as a media cache entry, downloaded on a miss. The partial download is kept next to the entry
+# ({key}.part.{ext} + manifest), so a download interrupted in an earlier run continues where it stopped.
+@contextmanager
+def open_stream_file(stream, video_id, connections=None, progress=None):
+    cache = get_media_cache()
+    key = cache.make_key(video_id, stream.itag)
+    part_file = cache.path_for(key, f"part.{stream.subtype}")
+    with cache.entry(key, stream.subtype,
+                     lambda output_file: download_stream(stream, output_file, progress, connections,
+                                                         part_file)) as cached_file:
+        yield cached_file
+
+
+# Download every video of a playlist. With workers > 1 the items are downloaded concurrently by a bounded thread pool.
+# One failing item doesn't abort the run - each result is {"url", "file", "error"} and results keep the playlist order.
+def download_playlist(playlist_url, download_path, media_type, quality='', start_time='', end_time='', workers=None,
+                      trim_mode="accurate", encoder_profile=None, connections=None, progress=None, settings=None):
+    # One snapshot for the whole run - every item sees the same settings
+    settings = settings or get_settings()
+
+    if media_type not in settings.supported_audio_file_types and media_type not in settings.supported_video_file_types:
+        raise ValueError(f"Unsupported file type: {media_type}")
+
+    if workers is None:
+        workers = settings.playlist_workers
+    # An unknown profile fails the whole run here rather than every item
+    encoder_profile = get_encoder_profile(encoder_profile, settings)
+
+    with span("playlist_metadata", url=playlist_url) as details:
+        pl = Playlist(playlist_url)
+        video_urls = list(pl.video_urls)
+        details["items"] = len(video_urls)
+
+    playlist_progress = PlaylistProgress(progress, len(video_urls))
+
+    def prepare_item(index, video_url):
+        if media_type in settings.supported_audio_file_types:
+            # Download audio if file_type is audio
+            return prepare_youtube_audio(video_url, download_path, media_type, start_time, end_time,
+                                         encoder_profile, connections, playlist_progress.item(index), settings)
+        # Download video if file_type is video
+        return prepare_youtube_video(video_url, download_path, media_type, quality, start_time, end_time,
+                                     trim_mode, encoder_profile, connections, playlist_progress.item(index), settings)
+
+    def item_result(index, video_url, download):
+        try:
+            file = download()
+            # The download functions return an error message instead of raising for an invalid URL
+            if not file or not os.path.isfile(file):
+                raise RuntimeError(file or "No file was downloaded")
+            result = {"url": video_url, "file": file, "error": None}
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Error downloading {video_url}: {e}")
+            result = {"url": video_url, "file": None, "error": str(e)}
+        if progress:
+            playlist_progress.item(index)("playlist", 1, 1)
+        return result
+
+    if workers <= 1 or len(video_urls) <= 1:
+        return [item_result(index, video_url, lambda: run_media_task(prepare_item(index, video_url)))
+                for index, video_url in enumerate(video_urls)]
+
+    # Items are fetched `workers` at a time while the fetched ones are converted in worker processes
+    with MediaPipeline(min(workers, len(video_urls)), settings.convert_workers,
+                       settings.pipeline_max_pending) as pipeline:
+        futures = [pipeline.submit(prepare_item, index, video_url) for index, video_url in enumerate(video_urls)]
+        # Results in the playlist order
+        return [item_result(index, video_url, future.result)
+                for index, (video_url, future) in enumerate(zip(video_urls, futures))]
+
+
+def summarize_playlist_results(results):
+    failures = [result for result in results if result["error"]]
+    return {
+        "total": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "failures": [{"url": result["url"], "error": result["error"]} for result in failures],
+    }
+
+
+# Mux the video and audio streams into one file. Streams are copied as they are when the output container can hold
+# their codecs, only the ones that don't fit are transcoded.
+def merge_video_and_audio_file(video_file_path, audio_file_path, output_file_path=None, encoder_profile=None):
+    try:
+        if output_file_path is None:
+            base, extension = os.path.splitext(video_file_path)
+            output_file_path = f"{base}_m{extension}"
+
+        render_video(video_file_path, audio_file_path, output_file_path, encoder_profile=encoder_profile)
+
+        os.remove(video_file_path)
+        os.remove(audio_file_path)
+        return output_file_path
+
+    except Exception as e:
+        print(f"Error merging video and audio: {e}")
+        return None
+
+
+# Rewrap a video file into the container of output_file - remux when possible, transcode only what doesn't fit
+def convert_video_file(input_file, output_file, encoder_profile=None):
+    return render_video(input_file, None, output_file, encoder_profile=encoder_profile)
+
+
+# Trim a video file. Modes:
+#   - "fast": stream copy from the keyframe at or before start_time - no decoding, may start slightly early
+#   - "accurate": frame exact - only the partial GOPs at the boundaries are re-encoded, the rest is stream copied
+#   - "reencode": decode and re-encode the whole clip with moviepy
+def trim_video(input_file, start_time, end_time, mode="accurate", encoder_profile=None):
+    # Determine the output file path
+    input_filename, input_extension = os.path.splitext(input_file)
+    output_file = f"{input_filename}_trimmed{input_extension}"
+
+    return render_video(input_file, None, output_file, start_time, end_time, mode, encoder_profile=encoder_profile)
 
-    # Convert to audio format if needed
-    if media_type == "m4r":
-        audio = AudioSegment.from_file(downloaded_file_path)
-        audio.export(new_file, format="mp4", codec="aac")
-    else:
-        audio = AudioFileClip(downloaded_file_path)
-        audio.write_audiofile(new_file, codec=codec)
-        audio.close()
 
-    # Remove the original downloaded file
-    os.remove(downloaded_file_path)
+# Trim an audio file. ffmpeg seeks to start_time and decodes/encodes only the selected range in small chunks,
+# so memory use stays flat whatever the track length.
+def trim_audio(input_file, start_time, end_time, encoder_profile=None):
+    # Determine the output file path
+    input_filename, input_extension = os.path.splitext(input_file)
+    output_file = f"{input_filename}_trimmed{input_extension}"
 
-    if start_time != "" or end_time != "":
-        if start_time == "":
-            start_time = "00:00"
-        if end_time == "":
-            end_time = yt.length
+    return render_audio(input_file, output_file, start_time, end_time, encoder_profile=encoder_profile)
 
-        start_time_seconds = str_time_to_seconds(start_time)
-        end_time_seconds = yt.length if end_time == yt.length else str_time_to_seconds(end_time)
 
-        trimed_file = trim_audio(new_file, start_time_seconds, end_time_seconds)
-        os.remove(new_file)
-        return trimed_file
+# Write video_file (plus the audio of audio_file, when given) into output_file in a single pass. The container is
+# taken from the output extension. With start_time/end_time only that window is read and written, cut as the trim
+# mode says (see trim_video).
+# Whatever has to be re-encoded is encoded with the encoder profile (name, EncoderProfile or None for the default).
+def render_video(video_file, audio_file, output_file, start_time=None, end_time=None, mode="accurate", progress=None,
+                 encoder_profile=None):
+    if mode not in trim_modes:
+        raise ValueError(f"Unsupported trim mode: {mode}. Supported modes are {', '.join(trim_modes)}.")
+    profile = get_encoder_profile(encoder_profile)
+
+    video_info = probe_media(video_file)
+    video_codec = video_info["video_codec"]
+    if video_codec is None:
+        raise ValueError(f"Failed to load video from {video_file}")
+
+    if audio_file is not None:
+        audio_codec = probe_media(audio_file)["audio_codec"]
+        if audio_codec is None:
+            raise ValueError(f"Failed to load audio from {audio_file}")
     else:
-        return new_file
+        audio_codec = video_info["audio_codec"]
 
+    container = os.path.splitext(output_file)[1][1:].lower()
+    trimmed = start_time is not None
 
-def download_playlist(playlist_url, download_path, media_type, quality, start_time, end_time):
-    pl = Playlist(playlist_url)
-    downloaded_files = []
-    supported_audio_file_types_dict = get_value_from_json("supported_audio_file_types")
-    supported_audio_file_types = list(supported_audio_file_types_dict.keys())
-    supported_video_file_types = get_value_from_json("supported_video_file_types")
+    if trimmed and mode == "reencode":
+        render_video_moviepy(video_file, audio_file, output_file, start_time, end_time, progress, profile)
+    elif trimmed and mode == "accurate" and container_supports_codec(container, video_codec, "video"):
+        render_video_accurate(video_file, audio_file, output_file, start_time, end_time, video_codec, audio_codec,
+                              progress, profile, video_info["frame_rate"])
+    else:
+        # Plain remux (fast trims are cut on keyframes by the stream copy). When a stream has to be transcoded
+        # anyway, the input seek makes the cut frame exact.
+        arguments = media_input_arguments(video_file, audio_file, start_time)
+        if trimmed:
+            arguments += ["-t", str(end_time - start_time), "-avoid_negative_ts", "make_zero"]
+        arguments += media_map_arguments(audio_file)
+        arguments += stream_codec_arguments(container, video_codec, audio_codec, profile)
+        duration = end_time - start_time if trimmed else video_info["duration"]
+        run_ffmpeg([*arguments, output_file], progress, duration, video_info["frame_rate"])
 
-    for video_url in pl.video_urls:
-        if media_type in supported_video_file_types:
-            # Download audio if file_type is audio
-            file = download_youtube_audio(video_url, download_path, media_type, start_time, end_time)
-        elif media_type in supported_video_file_types:
-            # Download video if file_type is video
-            file = download_youtube_video(video_url, download_path, media_type, quality, start_time, end_time)
+    return output_file
+
+
+# Frame exact cut. The video is built from segments: [start, first keyframe) and [last keyframe, end) are re-encoded
+# with the source codec, the GOPs in between are stream copied, and the segments are concatenated without
+# re-encoding. The audio is cut once over the exact [start, end) window (re-encoded - a stream copy could only cut on
+# packet boundaries) and muxed onto the joined video, so it can't drift from it.
+def render_video_accurate(video_file, audio_file, output_file, start_time, end_time, video_codec, audio_codec,
+                          progress=None, profile=None, frame_rate=None):
+    profile = profile or get_encoder_profile()
+    container = os.path.splitext(output_file)[1][1:].lower()
+    duration = end_time - start_time
+    keyframes = [keyframe for keyframe in find_keyframes(video_file, start_time, end_time)
+                 if start_time <= keyframe <= end_time]
+    video_arguments = video_encoder_arguments(trim_video_encoders.get(video_codec, "libx264"), profile)
+
+    audio_arguments = []
+    if audio_codec is not None:
+        if container_supports_codec(container, audio_codec, "audio") and audio_codec in trim_audio_encoders:
+            audio_encoder = trim_audio_encoders[audio_codec]
         else:
-            raise ValueError(f"Unsupported file type: {media_type}")
+            audio_encoder = container_fallback_encoders.get(container, default_fallback_encoders)[1]
+        audio_arguments = audio_encoder_arguments(audio_encoder, profile)
+
+    if len(keyframes) < 2:
+        # The clip lies within about one GOP - re-encoding it (input seek = frame/sample exact) is as cheap as
+        # anything else
+        run_ffmpeg([*media_input_arguments(video_file, audio_file, start_time),
+                    "-t", str(duration), *media_map_arguments(audio_file),
+                    *video_arguments, *audio_arguments, output_file], progress, duration, frame_rate)
+        return output_file
+
+    # MPEG-TS keeps the codec parameters in-band, so h264/hevc segments encoded separately still join cleanly
+    segment_extension = ".ts" if video_codec in ("h264", "hevc") else ".mkv"
+
+    first_keyframe, last_keyframe = keyframes[0], keyframes[-1]
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as temp_dir:
+        segment_files = []
+
+        # Head: re-encoded up to (not including) the first keyframe
+        if first_keyframe - start_time > keyframe_tolerance:
+            head_file = os.path.join(temp_dir, f"head{segment_extension}")
+            run_ffmpeg(["-ss", str(start_time), "-i", video_file, "-t", str(first_keyframe - start_time
+                                                                             - keyframe_tolerance / 2),
+                        "-map", "0:v:0", "-an", *video_arguments, head_file],
+                       progress, duration, frame_rate)
+            segment_files.append(head_file)
+
+        # Body: stream copied GOPs. The segment muxer splits exactly at the packet of the last keyframe (in decoding
+        # order), so the copy ends right before it - a plain -t would cut on decoding timestamps and let the frames
+        # reordered around the keyframe leak into the copy. Seeking a hair past the first keyframe makes the
+        # demuxer land exactly on it, not on the previous one.
+        seek_time = first_keyframe + keyframe_tolerance / 2
+        run_ffmpeg(["-ss", str(seek_time), "-i", video_file,
+                    "-t", str(last_keyframe - seek_time + keyframe_tolerance),
+                    "-map", "0:v:0", "-an", "-c:v", "copy", "-avoid_negative_ts", "make_zero",
+                    "-f", "segment", "-segment_times", str(last_keyframe - seek_time - keyframe_tolerance / 2),
+                    "-reset_timestamps", "1", os.path.join(temp_dir, f"body_%d{segment_extension}")],
+                   offset_progress(progress, first_keyframe - start_time, frame_rate), duration, frame_rate)
+        segment_files.append(os.path.join(temp_dir, f"body_0{segment_extension}"))
+
+        # Tail: re-encoded from the last keyframe on
+        if end_time - last_keyframe > keyframe_tolerance:
+            tail_file = os.path.join(temp_dir, f"tail{segment_extension}")
+            tail_start = last_keyframe - keyframe_tolerance / 2
+            run_ffmpeg(["-ss", str(tail_start), "-i", video_file, "-t", str(end_time - tail_start),
+                        "-map", "0:v:0", "-an", *video_arguments, tail_file],
+                       offset_progress(progress, last_keyframe - start_time, frame_rate), duration, frame_rate)
+            segment_files.append(tail_file)
+
+        concat_list = os.path.join(temp_dir, "segments.txt")
+        with open(concat_list, 'w') as list_file:
+            for segment_file in segment_files:
+                list_file.write(concat_list_entry(segment_file))
+
+        arguments = ["-f", "concat", "-safe", "0", "-i", concat_list]
+        if audio_codec is None:
+            arguments += ["-map", "0:v:0", "-c", "copy"]
+        else:
+            arguments += ["-ss", str(start_time), "-i", audio_file or video_file, "-t", str(duration),
+                          "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", *audio_arguments]
+        if container in ("mp4", "mov"):
+            arguments += ["-movflags", "+faststart"]
+        run_ffmpeg([*arguments, output_file])
 
-        downloaded_files.append(file)
+    return output_file
 
-    return downloaded_files
 
+# A line of an ffmpeg concat list - quotes in the path are escaped the way the concat demuxer expects
+def concat_list_entry(file_path):
+    escaped_path = file_path.replace("'", "'\\''")
+    return f"file '{escaped_path}'\n"
 
-def merge_video_and_audio_file(video_file_path, audio_file_path):
-    try:
-        video = VideoFileClip(video_file_path)
-        if video is None:
-            raise ValueError(f"Failed to load video from {video_file_path}")
 
-        audio = AudioFileClip(audio_file_path)
-        if audio is None:
-            raise ValueError(f"Failed to load audio from {audio_file_path}")
+# Decode and re-encode the [start_time, end_time) window with moviepy - one pass, audio taken from audio_file if given
+def render_video_moviepy(video_file, audio_file, output_file, start_time, end_time, progress=None, profile=None):
+    profile = profile or get_encoder_profile()
+    container = os.path.splitext(output_file)[1][1:].lower()
+    video_encoder, audio_encoder = container_fallback_encoders.get(container, default_fallback_encoders)
 
-        # Set the audio of the video clip
-        final_video = video.set_audio(audio)
+    video_clip = VideoFileClip(video_file)
+    trimmed_clip = video_clip.subclip(start_time, end_time)
+    audio_clip = None
+    if audio_file is not None:
+        audio_clip = AudioFileClip(audio_file)
+        trimmed_clip = trimmed_clip.set_audio(audio_clip.subclip(start_time, end_time))
 
-        # Write the merged file to the original video file path
-        merged_file_path = video_file_path.replace(".mp4", "_m.mp4")
-        final_video.write_videofile(merged_file_path, codec="libx264", audio_codec="aac")
+    logger = MoviepyProgressLogger(progress) if progress else "bar"
+    trimmed_clip.write_videofile(output_file, codec=video_encoder, audio_codec=audio_encoder, logger=logger,
+                                 preset=profile.preset, threads=profile.threads,
+                                 audio_bitrate=audio_bitrate_argument(audio_encoder, profile),
+                                 ffmpeg_params=video_quality_arguments(video_encoder, profile))
 
-        audio.close()
-        video.close()
-        os.remove(video_file_path)
-        os.remove(audio_file_path)
-        return merged_file_path
+    # Close the clip objects
+    trimmed_clip.close()
+    video_clip.close()
+    if audio_clip is not None:
+        audio_clip.close()
+    return output_file
 
-    except Exception as e:
-        print(f"Error merging video and audio: {e}")
+
+# Convert input_file to the audio format of output_file in a single pass, keeping only [start_time, end_time) if given.
+# ffmpeg streams the data in small chunks, so memory use stays flat whatever the track length.
+# With stream_copy the audio is only rewrapped into the new container (the source must already be in a fitting codec),
+# otherwise it's encoded with the bitrate of the encoder profile.
+def render_audio(input_file, output_file, start_time=None, end_time=None, stream_copy=False, progress=None,
+                 settings=None, encoder_profile=None):
+    media_type = os.path.splitext(output_file)[1][1:].lower()
+    arguments = media_input_arguments(input_file, None, start_time)
+    if start_time is not None:
+        arguments += ["-t", str(end_time - start_time)]
+        duration = end_time - start_time
+    else:
+        duration = probe_media(input_file)["duration"] if progress else None
+    run_ffmpeg([*arguments, "-map", "0:a:0",
+                *audio_output_arguments(media_type, stream_copy, settings, encoder_profile), output_file],
+               progress, duration)
+    return output_file
+
+
+# Progress callback shifted by offset seconds - for a job made of consecutive ffmpeg runs. With a frame rate the
+# runs report frames, and the offset is counted in frames too.
+def offset_progress(progress, offset, frame_rate=None):
+    if progress is None:
         return None
+    if frame_rate:
+        offset = round(offset * frame_rate)
+    return lambda stage, done, total: progress(stage, offset + done, total)
+
+
+# moviepy reports encoding through proglog - forward the frame counter to a progress callback
+class MoviepyProgressLogger(ProgressBarLogger):
+    def __init__(self, progress):
+        super().__init__()
+        self.progress = progress
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if attr == "index":
+            self.progress("encode", value, self.bars[bar].get("total"))
+
+
+def media_input_arguments(video_file, audio_file, start_time=None):
+    arguments = []
+    for file_path in (video_file, audio_file):
+        if file_path is None:
+            continue
+        if start_time is not None:
+            arguments += ["-ss", str(start_time)]
+        arguments += ["-i", file_path]
+    return arguments
+
+
+def media_map_arguments(audio_file):
+    if audio_file is None:
+        return ["-map", "0:v:0", "-map", "0:a:0?"]
+    return ["-map", "0:v:0", "-map", "1:a:0"]
+
+
+# Keyframe timestamps between start_time and end_time. Only keyframes are decoded (-skip_frame nokey),
+# and the input is seeked to start_time first, so the cost follows the clip length, not the source length.
+def find_keyframes(input_file, start_time, end_time):
+    command = [get_ffmpeg_binary(), "-hide_banner", "-skip_frame", "nokey", "-ss", str(start_time), "-copyts",
+               "-i", input_file, "-to", str(end_time), "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode(errors="replace")
+    return sorted(float(match) for match in re.findall(r"pts_time:\s*(-?\d+(?:\.\d+)?)", info))
+
+
+# Section - ffmpeg
+# Codecs (ffmpeg names) each output container can hold without re-encoding - None means anything goes
+container_codecs = {
+    "mp4": ({"h264", "hevc", "av1", "vp9", "mpeg4"}, {"aac", "mp3", "opus", "flac", "alac", "ac3"}),
+    "mov": ({"h264", "hevc", "mpeg4", "prores", "mjpeg"}, {"aac", "mp3", "alac", "pcm_s16le"}),
+    "mkv": (None, None),
+    "avi": ({"mpeg4", "h264", "mjpeg", "msmpeg4v2"}, {"mp3", "pcm_s16le", "ac3"}),
+    "flv": ({"h264", "flv1"}, {"aac", "mp3"}),
+    "wmv": ({"wmv1", "wmv2", "msmpeg4v3"}, {"wmav1", "wmav2"}),
+}
+
+# Encoders used when a stream has to be transcoded to fit the container
+container_fallback_encoders = {
+    "avi": ("libx264", "libmp3lame"),
+    "wmv": ("wmv2", "wmav2"),
+}
+default_fallback_encoders = ("libx264", "aac")
+
+# pytube reports codecs by their RFC 6381 names (avc1.4d401f, mp4a.40.2, ...) -> ffmpeg names
+pytube_codec_names = {
+    "avc1": "h264",
+    "hev1": "hevc",
+    "hvc1": "hevc",
+    "av01": "av1",
+    "vp9": "vp9",
+    "vp09": "vp9",
+    "vp8": "vp8",
+    "mp4a": "aac",
+    "opus": "opus",
+    "vorbis": "vorbis",
+}
+
+# Ranged downloads: size of one Range request (YouTube throttles bigger ones - pytube uses the same size) and
+# chunk size of the writes. Timeouts, retries and the connection limit per host come from the HTTP transport.
+download_range_size = 9 * 1024 * 1024
+download_chunk_size = 256 * 1024
+
+trim_modes = ("fast", "accurate", "reencode")
+keyframe_tolerance = 0.01  # seconds
+
+# Encoders matching the source codecs, used for the re-encoded boundary segments of an accurate trim
+trim_video_encoders = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "vp9": "libvpx-vp9",
+    "vp8": "libvpx",
+    "av1": "libaom-av1",
+    "mpeg4": "mpeg4",
+}
+trim_audio_encoders = {
+    "aac": "aac",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+    "mp3": "libmp3lame",
+    "flac": "flac",
+}
+
+# Encoders taking the x264 style -preset/-crf, and the libvpx/libaom speed (-cpu-used) closest to each preset
+x264_style_encoders = {"libx264", "libx265"}
+cpu_used_encoders = {"libvpx", "libvpx-vp9", "libaom-av1"}
+preset_cpu_used = {
+    "ultrafast": 5,
+    "superfast": 5,
+    "veryfast": 4,
+    "faster": 4,
+    "fast": 3,
+    "medium": 2,
+    "slow": 1,
+    "slower": 1,
+    "veryslow": 0,
+}
+# Lossless audio encoders - a bitrate means nothing to them
+lossless_audio_encoders = {"flac", "alac", "pcm_s16le", "pcm_s24le"}
+
+
+# Containers ffmpeg can't guess from the file extension
+audio_output_formats = {
+    "m4r": "mp4",
+}
+
+
+# ffmpeg output options for an audio file type from setup.json
+def audio_output_arguments(media_type, stream_copy=False, settings=None, encoder_profile=None):
+    settings = settings or get_settings()
+    supported_audio_file_types_dict = settings.supported_audio_file_types
+    if media_type not in supported_audio_file_types_dict:
+        raise ValueError(f"Unsupported file type for audio: {media_type}")
+    if stream_copy:
+        arguments = ["-vn", "-c:a", "copy"]
+    else:
+        arguments = ["-vn", *audio_encoder_arguments(supported_audio_file_types_dict[media_type],
+                                                     get_encoder_profile(encoder_profile, settings))]
+    if media_type in audio_output_formats:
+        arguments += ["-f", audio_output_formats[media_type]]
+    return arguments
 
 
-def trim_video(input_file, start_time, end_time):
-    # Create a VideoFileClip object
-    video_clip = VideoFileClip(input_file)
+# ffmpeg options selecting a video encoder with the speed/quality and threads of an encoder profile
+def video_encoder_arguments(encoder, profile):
+    arguments = ["-c:v", encoder]
+    if encoder in x264_style_encoders:
+        arguments += ["-preset", profile.preset]
+    return arguments + video_quality_arguments(encoder, profile) + ["-threads", str(profile.threads)]
 
-    # Define start and end times in seconds
-    start_time_sec = start_time
-    end_time_sec = end_time
 
-    # Trim the video clip
-    trimmed_clip = video_clip.subclip(start_time_sec, end_time_sec)
+# The quality/speed options beside the preset (moviepy takes the preset and threads as arguments of their own)
+def video_quality_arguments(encoder, profile):
+    if encoder in x264_style_encoders:
+        return ["-crf", str(profile.crf)]
+    if encoder in cpu_used_encoders:
+        return ["-cpu-used", str(preset_cpu_used.get(profile.preset, 2))]
+    return []
 
-    # Determine the output file path
-    input_filename, input_extension = os.path.splitext(input_file)
-    output_file = f"{input_filename}_trimmed{input_extension}"
 
-    # Export the trimmed video clip to a new file
-    trimmed_clip.write_videofile(output_file, codec="libx264", audio_codec="aac")
+def audio_bitrate_argument(encoder, profile):
+    if encoder in lossless_audio_encoders:
+        return None
+    return profile.audio_bitrate
 
-    # Close the video clip objects
-    video_clip.close()
-    trimmed_clip.close()
 
+def audio_encoder_arguments(encoder, profile):
+    bitrate = audio_bitrate_argument(encoder, profile)
+    return ["-c:a", encoder] + (["-b:a", bitrate] if bitrate else [])
+
+
+def get_ffmpeg_binary():
+    # moviepy ships (or is configured with) an ffmpeg binary - reuse it for the stream copy paths
+    return get_setting("FFMPEG_BINARY")
+
+
+# Run ffmpeg. With a progress callback, the position in the output (in seconds, out of duration) is reported while
+# it runs - if the callback raises (e.g. JobCancelled), ffmpeg is killed and the exception propagates.
+# With progress, ffmpeg reports through -progress: a video output (frame_rate given) as the "encode" stage in frames,
+# anything else as "convert" in seconds of media
+def run_ffmpeg(arguments, progress=None, duration=None, frame_rate=None):
+    command = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error", *arguments]
+    if progress is None:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+        return
+
+    command[1:1] = ["-nostats", "-progress", "pipe:1"]
+    total_frames = round(duration * frame_rate) if duration and frame_rate else None
+    frame_counter = False
+    # stderr goes to a file, so a chatty ffmpeg can't block on a full pipe while we read the progress
+    with tempfile.TemporaryFile() as error_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file)
+        try:
+            for line in process.stdout:
+                key, _, value = line.decode(errors="replace").strip().partition("=")
+                if frame_rate and key == "frame" and value.isdigit():
+                    frame_counter = True
+                    progress("encode", int(value), total_frames)
+                # out_time_ms is in microseconds as well (a long-standing ffmpeg quirk)
+                elif key in ("out_time_us", "out_time_ms") and value.isdigit():
+                    seconds = int(value) / 1000000
+                    if not frame_rate:
+                        progress("convert", seconds, duration)
+                    elif not frame_counter:
+                        # A stream copy has no frame counter - its frames are counted from the output time
+                        progress("encode", round(seconds * frame_rate), total_frames)
+            process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        if process.returncode != 0:
+            error_file.seek(0)
+            raise RuntimeError(f"ffmpeg failed: {error_file.read().decode(errors='replace').strip()}")
+
+
+# Read codecs, duration and video frame rate of a media file from the stream summary ffmpeg prints for its input
+def probe_media(file_path):
+    command = [get_ffmpeg_binary(), "-hide_banner", "-i", file_path]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode(errors="replace")
+
+    video_match = re.search(r"Stream #\d+:\d+.*?: Video: (\w+)", info)
+    audio_match = re.search(r"Stream #\d+:\d+.*?: Audio: (\w+)", info)
+    duration_match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", info)
+    frame_rate_match = re.search(r"Stream #\d+:\d+.*?: Video: [^\n]*?(\d+(?:\.\d+)?) fps", info)
+    duration = None
+    if duration_match:
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    return {
+        "video_codec": video_match.group(1) if video_match else None,
+        "audio_codec": audio_match.group(1) if audio_match else None,
+        "duration": duration,
+        "frame_rate": float(frame_rate_match.group(1)) if frame_rate_match else None,
+    }
+
+
+def container_supports_codec(container, codec, kind):
+    video_codecs, audio_codecs = container_codecs.get(container, (set(), set()))
+    supported = video_codecs if kind == "video" else audio_codecs
+    return supported is None or codec in supported
+
+
+# ffmpeg codec options for writing the given streams into container: "copy" for everything that fits
+# (the ones that don't fit are encoded with the encoder profile)
+def stream_codec_arguments(container, video_codec, audio_codec, profile=None):
+    video_encoder, audio_encoder = container_fallback_encoders.get(container, default_fallback_encoders)
+    arguments = []
+    if video_codec is not None:
+        if container_supports_codec(container, video_codec, "video"):
+            arguments += ["-c:v", "copy"]
+        else:
+            arguments += video_encoder_arguments(video_encoder, profile or get_encoder_profile())
+    if audio_codec is not None:
+        if container_supports_codec(container, audio_codec, "audio"):
+            arguments += ["-c:a", "copy"]
+        else:
+            arguments += audio_encoder_arguments(audio_encoder, profile or get_encoder_profile())
+    if container in ("mp4", "mov"):
+        # Move the index to the front so the file can start playing before it's fully read
+        arguments += ["-movflags", "+faststart"]
+    return arguments
+
+
+def pytube_codec_name(codec):
+    if not codec:
+        return None
+    return pytube_codec_names.get(codec.split(".")[0].lower(), codec.split(".")[0].lower())
+
+
+# Rank of a stream codec for a container: 0 - a codec every player takes in this container ("preferred_stream_codecs"
+# in setup.json), 1 - the container holds it without re-encoding, 2 - it has to be re-encoded. Streams of other codecs
+# are only used when no preferred one is offered (or when setup.json lists them).
+def stream_codec_rank(container, codec, kind, settings=None):
+    preferred_codecs = (settings or get_settings()).preferred_stream_codecs.get(container)
+    if preferred_codecs is not None and codec in preferred_codecs:
+        return 0
+    if not container_supports_codec(container, codec, kind):
+        return 2
+    return 1 if preferred_codecs is not None else 0
+
+
+# Pick the video stream for a quality: by codec rank for the target container, then progressive streams (they already
+# carry the audio), then the highest bitrate
+def select_video_stream(streams, quality, media_type, settings=None):
+    candidates = list(streams.filter(type="video", res=quality))
+    if not candidates:
+        return None
+    candidates.sort(key=lambda stream: (
+        stream_codec_rank(media_type, pytube_codec_name(stream.video_codec), "video", settings),
+        not stream.includes_audio_track,
+        -(stream.bitrate or 0),
+    ))
+    return candidates[0]
+
+
+# Pick the best audio stream for an audio file type -> (stream, stream_copy). Streams whose codec the file type can
+# hold as it is ("audio_stream_copy_codecs" in setup.json) are preferred, so they are rewrapped instead of re-encoded.
+def select_audio_stream(streams, media_type, settings=None):
+    audio_streams = streams.filter(only_audio=True).order_by('abr').desc()
+    copy_codecs = (settings or get_settings()).audio_stream_copy_codecs.get(media_type, ())
+    for stream in audio_streams:
+        if pytube_codec_name(stream.audio_codec) in copy_codecs:
+            return stream, True
+    return audio_streams.first(), False
+
+
+# Pick the audio stream to mux into a video container - by codec rank for the container, then the highest bitrate
+def select_merge_audio_stream(streams, media_type, settings=None):
+    audio_streams = list(streams.filter(only_audio=True))
+    if not audio_streams:
+        return None
+    audio_streams.sort(key=lambda stream: (
+        stream_codec_rank(media_type, pytube_codec_name(stream.audio_codec), "audio", settings),
+        -(stream.bitrate or 0),
+    ))
+    return audio_streams[0]
+
+
+# Download a stream into output_file over `connections` parallel ranged connections (default from setup
+# "download_connections"), so a large stream isn't limited by the per-connection throttling. The download is
+# resumable: it goes to part_file (default output_file + ".part") and a rerun continues where a failed one stopped.
+def download_stream(stream, output_file, progress=None, connections=None, part_file=None):
+    if connections is None:
+        connections = get_settings().download_connections
+    details = {"itag": stream.itag, "mime_type": stream.mime_type, "connections": connections,
+               "video_codec": pytube_codec_name(stream.video_codec),
+               "audio_codec": pytube_codec_name(stream.audio_codec)}
+    with span("stream_download", **details) as details:
+        total_bytes = stream.filesize
+        if total_bytes:
+            download_ranges(stream.url, output_file, total_bytes, max(connections, 1), progress,
+                            part_file=part_file)
+        else:
+            download_stream_sequential(stream, output_file, progress)
+        details["bytes"] = os.path.getsize(output_file)
     return output_file
 
 
-def trim_audio(input_file, start_time, end_time):
-    # Load the audio file
-    audio_segment = AudioSegment.from_file(input_file)
+# Unknown size - a plain single connection download
+def download_stream_sequential(stream, output_file, progress=None):
+    total_bytes = stream.filesize
+    downloaded_bytes = 0
+    with open(output_file, 'wb') as file_handle:
+        for chunk in request.stream(stream.url):
+            file_handle.write(chunk)
+            downloaded_bytes += len(chunk)
+            if progress:
+                progress("download", downloaded_bytes, total_bytes)
+    return output_file
 
-    # Define start and end times in milliseconds
-    start_time_ms = start_time * 1000
-    end_time_ms = end_time * 1000
 
-    # Trim the audio segment
-    trimmed_segment = audio_segment[start_time_ms:end_time_ms]
+# The file on the server isn't the one a .part file was started with (other ETag or size)
+class DownloadChanged(IOError):
+    pass
 
-    # Determine the output file path
-    input_filename, input_extension = os.path.splitext(input_file)
-    output_file = f"{input_filename}_trimmed{input_extension}"
 
-    # Export the trimmed audio segment to a new file
-    if input_extension == ".m4r":
-        trimmed_segment.export(output_file, format="mp4", codec="aac")
-    else:
-        trimmed_segment.export(output_file, format=input_extension[1:])
+# Response headers that identify the version of a file -> manifest key. A resumed download whose server reports
+# other values is started over.
+download_validators = {"ETag": "etag", "Last-Modified": "last_modified"}
+
 
+# Resumable download of url into output_file as byte ranges over `connections` parallel HTTP connections.
+# The data is written at its offsets into a preallocated part_file; the sidecar manifest (part_file + ".json")
+# records the completed ranges, the size and the validators (ETag, Last-Modified). output_file is replaced atomically
+# once all bytes are there.
+def download_ranges(url, output_file, total_bytes, connections=4, progress=None, range_size=download_range_size,
+                    part_file=None):
+    part_file = part_file or f"{output_file}.part"
+    try:
+        fetch_ranges(url, part_file, total_bytes, connections, progress, range_size)
+    except DownloadChanged as e:
+        # The partial data belongs to another file - start over
+        print(f"Restarting download of {part_file}: {e}")
+        discard_partial_download(part_file)
+        fetch_ranges(url, part_file, total_bytes, connections, progress, range_size)
+    os.replace(part_file, output_file)
+    discard_partial_download(part_file)
     return output_file
 
 
+def fetch_ranges(url, part_file, total_bytes, connections, progress=None, range_size=download_range_size):
+    manifest_file = f"{part_file}.json"
+    manifest = load_download_manifest(part_file, total_bytes)
+    if manifest is None:
+        manifest = {"size": total_bytes, "etag": None, "last_modified": None, "ranges": []}
+        with open(part_file, 'wb') as file_handle:
+            file_handle.truncate(total_bytes)
+        save_download_manifest(manifest_file, manifest)
+    ranges = missing_ranges(manifest["ranges"], total_bytes, range_size)
+
+    # Bytes from an earlier run count as downloaded
+    downloaded_bytes = [total_bytes - sum(end - start + 1 for start, end in ranges)]
+    if progress and downloaded_bytes[0]:
+        progress("download", downloaded_bytes[0], total_bytes)
+    progress_lock = threading.Lock()
+    manifest_lock = threading.Lock()
+    failed = threading.Event()
+    http = get_transport()
+
+    def complete_range(start, end):
+        with manifest_lock:
+            manifest["ranges"] = merge_ranges(manifest["ranges"] + [[start, end]])
+            save_download_manifest(manifest_file, manifest)
+
+    def check_response(response):
+        content_range = response.headers.get("Content-Range", "")
+        if content_range and content_range.rsplit("/", 1)[-1] not in ("*", str(total_bytes)):
+            raise DownloadChanged(f"Size changed ({content_range}, expected {total_bytes} bytes)")
+        with manifest_lock:
+            recorded = False
+            for header, key in download_validators.items():
+                value = response.headers.get(header)
+                if value is None:
+                    continue
+                if manifest.get(key) is None:
+                    manifest[key] = value
+                    recorded = True
+                elif value != manifest[key]:
+                    raise DownloadChanged(f"{header} changed ({value}, expected {manifest[key]})")
+            if recorded:
+                # Saved before any data is written - a run interrupted in its first range still resumes against it
+                save_download_manifest(manifest_file, manifest)
+
+    def fetch_range(byte_range):
+        start, end = byte_range
+        if failed.is_set():
+            return 0
+        written = 0
+        try:
+            with http.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError(f"Server ignored the Range request (HTTP {response.status_code})")
+                check_response(response)
+                with open(part_file, 'r+b') as file_handle:
+                    file_handle.seek(start)
+                    try:
+                        for chunk in response.iter_content(download_chunk_size):
+                            if failed.is_set():
+                                break
+                            data = chunk[:end - start + 1 - written]
+                            file_handle.write(data)
+                            written += len(data)
+                            with progress_lock:
+                                downloaded_bytes[0] += len(data)
+                                if progress:
+                                    progress("download", downloaded_bytes[0], total_bytes)
+                            if len(data) < len(chunk):
+                                raise IOError(f"Server sent more than the range {start}-{end}")
+                    finally:
+                        # Keep what was written, a rerun continues after it
+                        file_handle.flush()
+                        if written:
+                            complete_range(start, start + written - 1)
+            if written != end - start + 1 and not failed.is_set():
+                raise IOError(f"Incomplete range {start}-{end}: {written} of {end - start + 1} bytes")
+        except BaseException:
+            # Stop the other connections - the download failed or was cancelled
+            failed.set()
+            raise
+        return written
+
+    with ThreadPoolExecutor(max_workers=max(1, min(connections, len(ranges)))) as executor:
+        futures = [executor.submit(fetch_range, byte_range) for byte_range in ranges]
+    for future in futures:
+        future.result()
+
+    # Validate before the caller promotes the file
+    if manifest["ranges"] != [[0, total_bytes - 1]] or os.path.getsize(part_file) != total_bytes:
+        raise IOError(f"Download of {part_file} is incomplete: {manifest['ranges']} of {total_bytes} bytes")
+    return part_file
+
+
+# Manifest of a .part file, None when there is nothing to resume (no or stale data)
+def load_download_manifest(part_file, total_bytes):
+    try:
+        with open(f"{part_file}.json", 'r') as manifest_handle:
+            manifest = json.load(manifest_handle)
+        if manifest["size"] == total_bytes and os.path.getsize(part_file) == total_bytes:
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    discard_partial_download(part_file)
+    return None
+
+
+def save_download_manifest(manifest_file, manifest):
+    temp_file = f"{manifest_file}.tmp"
+    with open(temp_file, 'w') as manifest_handle:
+        json.dump(manifest, manifest_handle)
+    os.replace(temp_file, manifest_file)
+
+
+def discard_partial_download(part_file):
+    for path in (part_file, f"{part_file}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Sorted, non-overlapping [start, end] byte ranges (adjacent ones are joined)
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+# The byte ranges still to download, split into requests of at most range_size bytes
+def missing_ranges(completed_ranges, total_bytes, range_size=download_range_size):
+    ranges = []
+    position = 0
+    for start, end in merge_ranges(completed_ranges) + [[total_bytes, total_bytes]]:
+        for range_start in range(position, start, range_size):
+            ranges.append((range_start, min(range_start + range_size, start) - 1))
+        position = max(position, end + 1)
+    return ranges
+
+
+# Copy a media cache entry to its destination (a copy, not a link - the user may edit the file in place)
+def copy_media_file(source_file, destination_file):
+    temp_file = f"{destination_file}.tmp"
+    shutil.copyfile(source_file, temp_file)
+    os.replace(temp_file, destination_file)
+    return destination_file
+
+
+# Section - Audio preview
+# Progressive preview for the player: the lowest bitrate audio stream is decoded by ffmpeg straight from its URL into
+# a PCM buffer while it downloads, so playback can start after the first chunk. The buffer is a window around the
+# play position (read_ahead seconds in front, keep_behind seconds behind), so memory stays bounded for long videos.
+# A seek outside the window restarts the decoder at the new position - ffmpeg seeks the HTTP input with a Range
+# request, so only the needed part of the stream is fetched.
+class AudioPreview:
+    chunk_seconds = 0.25
+
+    def __init__(self, stream_url, duration, sample_rate=44100, channels=2, read_ahead=60, keep_behind=30):
+        self.stream_url = stream_url
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.read_ahead = read_ahead
+        self.keep_behind = keep_behind
+        self.frame_size = channels * 2  # s16le
+        self.bytes_per_second = sample_rate * self.frame_size
+        self._buffer = bytearray()
+        self._buffer_start = 0.0
+        self._position = 0.0
+        self._finished = False
+        self._process = None
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_url(cls, youtube_url, sample_rate=44100, channels=2):
+        yt = resolve_video_metadata(youtube_url)
+        audio_stream = yt.streams.filter(only_audio=True).order_by('abr').asc().first()
+        if not audio_stream:
+            raise ValueError("No audio stream available for this video.")
+        # ffmpeg fetches the stream itself - only the host override of the transport applies
+        return cls(get_transport().resolve(audio_stream.url), yt.length, sample_rate, channels)
+
+    def start(self, position=0.0):
+        self._restart(position)
+        return self
+
+    # PCM data from position on (at most max_seconds of it) -> None while it isn't decoded yet, b"" at the end
+    def read(self, position, max_seconds=0.5):
+        with self._condition:
+            self._position = position
+            self._drop_behind(position)
+            offset = self._byte_offset(position - self._buffer_start)
+            if offset < 0:
+                return None
+            data = bytes(self._buffer[offset:offset + self._byte_offset(max_seconds)])
+            # Reading frees read-ahead room for the decoder
+            self._condition.notify_all()
+            if data:
+                return data
+            return b"" if self._finished else None
+
+    def seek(self, position):
+        with self._condition:
+            buffered_start, buffered_end = self._buffered_range()
+            # Just past the buffered end the running decoder gets there sooner than a new request would
+            if buffered_start <= position <= buffered_end + 10:
+                self._position = position
+                self._condition.notify_all()
+                return
+        self._restart(position)
+
+    def buffered_range(self):
+        with self._condition:
+            return self._buffered_range()
+
+    def close(self):
+        with self._condition:
+            self._generation += 1
+            self._stop_process()
+            self._buffer = bytearray()
+            self._condition.notify_all()
+
+    def _restart(self, position):
+        with self._condition:
+            self._generation += 1
+            self._stop_process()
+            self._buffer = bytearray()
+            self._buffer_start = position
+            self._position = position
+            self._finished = False
+            command = [get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error",
+                       "-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5",
+                       "-ss", str(position), "-i", self.stream_url, "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+                       "-ac", str(self.channels), "-ar", str(self.sample_rate), "pipe:1"]
+            self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            self._condition.notify_all()
+            threading.Thread(target=self._decode, args=(self._process, self._generation), daemon=True).start()
+
+    def _decode(self, process, generation):
+        chunk_size = self._byte_offset(self.chunk_seconds)
+        while True:
+            with self._condition:
+                # Wait while far enough ahead of the play position - ffmpeg blocks on the full pipe meanwhile
+                while (generation == self._generation
+                       and self._buffered_range()[1] - self._position > self.read_ahead):
+                    self._condition.wait()
+                if generation != self._generation:
+                    return
+            try:
+                chunk = process.stdout.read(chunk_size)
+            except (OSError, ValueError):
+                # The pipe was closed by a seek/close restarting the decoder
+                return
+            with self._condition:
+                if generation != self._generation:
+                    return
+                if not chunk:
+                    self._finished = True
+                    self._condition.notify_all()
+                    return
+                self._buffer.extend(chunk)
+                self._condition.notify_all()
+
+    def _stop_process(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.stdout.close()
+            self._process = None
+
+    def _drop_behind(self, position):
+        drop = self._byte_offset(position - self.keep_behind - self._buffer_start)
+        if drop > 0:
+            drop = min(drop, len(self._buffer) - len(self._buffer) % self.frame_size)
+            del self._buffer[:drop]
+            self._buffer_start += drop / self.bytes_per_second
+
+    def _buffered_range(self):
+        return self._buffer_start, self._buffer_start + len(self._buffer) / self.bytes_per_second
+
+    def _byte_offset(self, seconds):
+        # Whole frames only, so left and right samples never swap
+        frames = int(seconds * self.sample_rate)
+        return frames * self.frame_size
+
+
 def get_video_name(youtube_url):
-    yt = YouTube(youtube_url)
+    yt = resolve_video_metadata(youtube_url)
     author = yt.author
     title = yt.title
     name = f"{author} - {title}"
@@ -340,7 +2968,7 @@ def get_video_name(youtube_url):
 
 def get_video_time(youtube_url):
     try:
-        yt = YouTube(youtube_url)
+        yt = resolve_video_metadata(youtube_url)
         length_seconds = yt.length
         minutes = length_seconds // 60
         seconds = length_seconds % 60
@@ -351,7 +2979,7 @@ def get_video_time(youtube_url):
 
 
 def get_video_quality_options(youtube_url):
-    yt = YouTube(youtube_url)
+    yt = resolve_video_metadata(youtube_url)
 
     # Get all streams
     streams = yt.streams.filter(type="video").order_by('resolution').asc()
@@ -366,41 +2994,30 @@ def get_video_quality_options(youtube_url):
 
 
 def extract_thumbnail_from_url(img_url):
-    max_width = 450
-    max_height = 250
-
-    yt = YouTube(img_url)
-    thumbnail_url = yt.thumbnail_url
-    # Split the URL at the '?' character
-    thumbnail_jpg_url = thumbnail_url.split('?')[0]
-
-    response = requests.get(thumbnail_jpg_url)
-    img_data = response.content
-    image = Image.open(BytesIO(img_data))
-    image.thumbnail((max_width, max_height))
-    return image
+    return get_thumbnail_service().get(img_url)
 
 
 def get_value_from_json(key_name):
-    script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory of the current script
-    file_path = os.path.join(script_dir, 'static_files', 'setup.json')  # Corrected file path with proper path separator
-
+    # Raw value from the settings snapshot - prefer the typed fields of get_settings()
     try:
-        with open(file_path, 'r') as json_file:
-            data = json.load(json_file)
-            if isinstance(data, list) and len(data) > 0:
-                first_entry = data[0]
-                if key_name in first_entry:
-                    return first_entry[key_name]
-                else:
-                    raise KeyError(f'Key "{key_name}" not found in JSON data')
-            else:
-                raise ValueError('Invalid JSON format or empty data')
-    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError) as e:
+        raw = get_settings().raw
+        if key_name not in raw:
+            raise KeyError(f'Key "{key_name}" not found in JSON data')
+        return raw[key_name]
+    except (OSError, KeyError, ValueError) as e:
         print(f'Error: {e}')
         return None
 
 
+# Trim window in seconds from the "min:sec" start/end inputs -> None when no trimming was requested
+def parse_trim_window(start_time, end_time, length):
+    if start_time == "" and end_time == "":
+        return None
+    start_time_seconds = str_time_to_seconds(start_time) if start_time != "" else 0
+    end_time_seconds = str_time_to_seconds(end_time) if end_time != "" else length
+    return start_time_seconds, end_time_seconds
+
+
 def str_time_to_seconds(time_str):
     try:
         minutes, seconds = map(int, time_str.split(':'))
@@ -410,39 +3027,598 @@ def str_time_to_seconds(time_str):
         raise ValueError("Invalid time format. Please use 'min:sec' format.")
 
 
-# Check if the file exist in temp files:
-def search_file_in_temp_mp3_folder(mp3_file_name):
-    # Ensure the provided file name has an .mp3 extension
-    if not mp3_file_name.lower().endswith('.mp3'):
-        return None
+def sanitize_filename(filename):
+    return re.sub(r'[\\/*?:"<>|]', "", filename)
+
+
+# Section - asyncio API
+# Awaitable versions of the download and search functions for asyncio applications. The blocking work (HTTP,
+# ffmpeg) runs in worker threads - ffmpeg itself runs in a process of its own, and a ProcessPoolExecutor can be given
+# as convert_executor for the moviepy re-encodes. Cancelling the awaiting task stops the job: the worker threads
+# raise JobCancelled at their next progress report (every downloaded chunk or ffmpeg progress line, the ffmpeg
+# process is killed), and the coroutine waits for them to stop before CancelledError propagates.
+
+# Progress callback that raises JobCancelled once cancel_event is set (and reports to progress, if given)
+def cancellable_progress(progress, cancel_event):
+    def report(stage, done, total):
+        if cancel_event.is_set():
+            raise JobCancelled()
+        if progress:
+            progress(stage, done, total)
+    return report
+
+
+# Run a blocking function in a worker thread - on cancellation cancel_event is set and the thread waited for
+async def run_cancellable(function, *args, cancel_event=None, **kwargs):
+    future = asyncio.ensure_future(asyncio.to_thread(function, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if cancel_event is not None:
+            cancel_event.set()
+        try:
+            await future
+        except BaseException:
+            pass
+        raise
+
+
+async def resolve_video_metadata_async(youtube_url):
+    return await asyncio.to_thread(resolve_video_metadata, youtube_url)
+
+
+async def find_url_by_name_async(author, title):
+    return await asyncio.to_thread(find_url_by_name, author, title)
+
+
+async def find_urls_by_names_async(pairs, workers=None, settings=None):
+    return await asyncio.to_thread(find_urls_by_names, pairs, workers, settings)
 
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    temp_mp3_folder = os.path.join(script_dir, "temp_mp3")
-    temp_mp3_file = os.path.join(temp_mp3_folder, mp3_file_name)
 
-    if os.path.isfile(temp_mp3_file):
-        return temp_mp3_file
+# Both stages of a prepared download - the streams are fetched concurrently, then converted
+async def run_media_task_async(task, cancel_event, convert_executor=None):
+    if isinstance(task, str):
+        return task
+    convert = partial(convert_in_process, convert_executor) if convert_executor is not None else None
+    try:
+        await run_cancellable(task.fetch, cancel_event=cancel_event)
+        return await run_cancellable(task.finish, convert, cancel_event=cancel_event)
+    finally:
+        task.close()
+
+
+async def download_youtube_video_async(youtube_url, download_path, media_type, quality, start_time='', end_time='',
+                                       trim_mode="accurate", encoder_profile=None, connections=None, progress=None,
+                                       settings=None, convert_executor=None):
+    cancel_event = threading.Event()
+    progress = cancellable_progress(progress, cancel_event)
+    task = await run_cancellable(prepare_youtube_video, youtube_url, download_path, media_type, quality, start_time,
+                                 end_time, trim_mode, encoder_profile, connections, progress, settings,
+                                 cancel_event=cancel_event)
+    return await run_media_task_async(task, cancel_event, convert_executor)
+
+
+async def download_youtube_audio_async(youtube_url, download_path, media_type, start_time='', end_time='',
+                                       encoder_profile=None, connections=None, progress=None, settings=None,
+                                       convert_executor=None):
+    cancel_event = threading.Event()
+    progress = cancellable_progress(progress, cancel_event)
+    task = await run_cancellable(prepare_youtube_audio, youtube_url, download_path, media_type, start_time, end_time,
+                                 encoder_profile, connections, progress, settings, cancel_event=cancel_event)
+    return await run_media_task_async(task, cancel_event, convert_executor)
+
+
+# The playlist items already run in a MediaPipeline (fetch threads + conversion processes) - this awaits it
+async def download_playlist_async(playlist_url, download_path, media_type, quality='', start_time='', end_time='',
+                                  workers=None, trim_mode="accurate", encoder_profile=None, connections=None,
+                                  progress=None, settings=None):
+    cancel_event = threading.Event()
+    return await run_cancellable(download_playlist, playlist_url, download_path, media_type, quality, start_time,
+                                 end_time, workers, trim_mode, encoder_profile, connections,
+                                 cancellable_progress(progress, cancel_event), settings, cancel_event=cancel_event)
+
+
+# Section - Batch
+# Many jobs in one process: a CSV or JSONL manifest is read into job entries, the author/title searches are resolved
+# in bulk, and the downloads run on a JobManager. One JSONL result line is written per job as soon as it finishes.
+batch_job_types = ("video", "audio", "playlist")
+
+
+# Manifest file -> list of job entries (dicts). Rows that can't be used get an "error" instead of failing the batch.
+def read_batch_manifest(manifest_path, media_type='mp3', settings=None):
+    settings = settings or get_settings()
+    with open(manifest_path, 'r', newline='', encoding='utf-8-sig') as manifest_file:
+        if manifest_path.lower().endswith((".jsonl", ".json")):
+            rows = []
+            for line in manifest_file:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    rows.append({"error": f"Invalid JSON line: {e}"})
+        else:
+            rows = list(csv.DictReader(manifest_file))
+
+    return [batch_entry(row, line_number, media_type, settings) for line_number, row in enumerate(rows, start=1)]
+
+
+# One manifest row (a dict - also the body of a job server request) -> job entry, with an "error" if it can't be used
+def batch_entry(row, line_number, media_type='mp3', settings=None):
+    settings = settings or get_settings()
+    if not isinstance(row, dict):
+        return {"line": line_number, "url": "", "author": "", "title": "", "type": "", "format": media_type,
+                "quality": "", "start_time": "", "end_time": "", "encoder_profile": None,
+                "error": "A job must be an object"}
+    row = {key.strip().lower(): (value.strip() if isinstance(value, str) else value)
+           for key, value in row.items() if key}
+    media_format = row.get("format") or media_type
+    entry = {
+        "line": line_number,
+        "url": row.get("url") or "",
+        "author": row.get("author") or "",
+        "title": row.get("title") or "",
+        "type": row.get("type") or ("audio" if media_format in settings.supported_audio_file_types else "video"),
+        "format": media_format,
+        "quality": row.get("quality") or "",
+        "start_time": row.get("start_time") or row.get("start") or "",
+        "end_time": row.get("end_time") or row.get("end") or "",
+        "encoder_profile": row.get("encoder_profile") or None,
+        "error": row.get("error"),
+    }
+    if not entry["error"]:
+        if entry["type"] not in batch_job_types:
+            entry["error"] = f"Unknown job type: {entry['type']}"
+        elif not entry["url"] and not (entry["author"] and entry["title"]):
+            entry["error"] = "A job needs a url or an author and a title"
+        elif entry["encoder_profile"] and entry["encoder_profile"] not in settings.encoder_profiles:
+            entry["error"] = f"Unknown encoder profile: {entry['encoder_profile']}"
+    return entry
+
+
+# Run one manifest entry -> list of downloaded files
+def run_batch_job(entry, download_path, trim_mode="accurate", encoder_profile=None, connections=None, progress=None,
+                  settings=None):
+    files = run_media_task(prepare_batch_job(entry, download_path, trim_mode, encoder_profile, connections, progress,
+                                             settings))
+    return batch_job_files(files)
+
+
+# The fetch stage of a manifest entry: MediaTask of a video/audio entry - a playlist entry is run as a whole
+# (its items go through a pipeline of their own) and gives the list of downloaded files.
+# The encoder profile of the entry wins over the one of the batch.
+def prepare_batch_job(entry, download_path, trim_mode="accurate", encoder_profile=None, connections=None,
+                      progress=None, settings=None):
+    encoder_profile = entry.get("encoder_profile") or encoder_profile
+    if entry["type"] == "playlist":
+        results = download_playlist(entry["url"], download_path, entry["format"], entry["quality"],
+                                    entry["start_time"], entry["end_time"], trim_mode=trim_mode,
+                                    encoder_profile=encoder_profile, connections=connections, progress=progress,
+                                    settings=settings)
+        summary = summarize_playlist_results(results)
+        if summary["total"] and not summary["succeeded"]:
+            raise RuntimeError(f"All {summary['total']} playlist items failed: {summary['failures'][0]['error']}")
+        return [result["file"] for result in results if result["file"]]
+
+    if entry["type"] == "audio":
+        task = prepare_youtube_audio(entry["url"], download_path, entry["format"], entry["start_time"],
+                                     entry["end_time"], encoder_profile, connections, progress, settings)
     else:
-        return None
+        task = prepare_youtube_video(entry["url"], download_path, entry["format"], entry["quality"],
+                                     entry["start_time"], entry["end_time"], trim_mode, encoder_profile,
+                                     connections, progress, settings)
+    # The prepare functions return an error message instead of raising for an invalid URL
+    if isinstance(task, str):
+        raise RuntimeError(task)
+    return task
+
+
+# Result of a batch job (a file or the files of a playlist) -> list of downloaded files
+def batch_job_files(result):
+    if isinstance(result, list):
+        return result
+    if not result or not os.path.isfile(result):
+        raise RuntimeError("No file was downloaded")
+    return [result]
+
+
+# Run every entry with `workers` jobs fetching at a time, while the fetched ones are converted in worker processes
+# (see MediaPipeline); report_file gets a JSONL line per job in the order they finish. Returns the result lines.
+def run_batch(entries, download_path, report_file=None, workers=None, trim_mode="accurate", encoder_profile=None,
+              connections=None, settings=None):
+    settings = settings or get_settings()
+    if workers is None:
+        workers = settings.playlist_workers
+    report_file = report_file or sys.stdout
+    results = []
+
+    def write_result(entry, output, error, status="failed", future=None):
+        output = output or []
+        result = {
+            "line": entry["line"],
+            "url": entry["url"],
+            "type": entry["type"],
+            "format": entry["format"],
+            "status": status,
+            "output": output,
+            "bytes": sum(os.path.getsize(file) for file in output if os.path.isfile(file)),
+            "queued_seconds": None,
+            "run_seconds": None,
+            "error": error,
+        }
+        if future and future.started_at:
+            result["queued_seconds"] = round(future.started_at - future.created_at, 3)
+            result["run_seconds"] = round(future.finished_at - future.started_at, 3)
+        report_file.write(json.dumps(result) + "\n")
+        report_file.flush()
+        results.append(result)
+
+    # Author/title searches first - all of them in one bulk call (repeats are searched once)
+    searches = [entry for entry in entries if not entry["error"] and not entry["url"]]
+    if searches:
+        urls = find_urls_by_names([(entry["author"], entry["title"]) for entry in searches], settings=settings)
+        for entry, url in zip(searches, urls):
+            entry["url"] = url or ""
+            if not url:
+                entry["error"] = f"No video found for {entry['author']} - {entry['title']}"
+
+    pipeline = MediaPipeline(max(1, workers), settings.convert_workers, settings.pipeline_max_pending)
+    finished = queue.Queue()
+    pending = 0
+    for entry in entries:
+        if entry["error"]:
+            write_result(entry, None, entry["error"])
+            continue
+        future = pipeline.submit(prepare_batch_job, entry, download_path, trim_mode, encoder_profile, connections,
+                                 settings=settings)
+        future.add_done_callback(lambda future, entry=entry: finished.put((entry, future)))
+        pending += 1
 
-def sanitize_filename(filename):
-    return re.sub(r'[\\/*?:"<>|]', "", filename)
+    try:
+        while pending:
+            entry, future = finished.get()
+            pending -= 1
+            if future.cancelled():
+                write_result(entry, None, None, "cancelled", future)
+                continue
+            try:
+                write_result(entry, batch_job_files(future.result()), None, "done", future)
+            except JobCancelled:
+                write_result(entry, None, None, "cancelled", future)
+            except Exception as e:
+                write_result(entry, None, str(e), "failed", future)
+    finally:
+        pipeline.shutdown(cancel=bool(pending))
+    return results
+
+
+# Section - Job server
+# `python backend.py serve` keeps one process with a resident worker pool (and warm metadata/search/media caches and
+# HTTP connections) and takes jobs over a JSON API on localhost:
+#   POST   /jobs          - a job (or a list of jobs) in the batch manifest format + optional trim_mode and
+#                           download_path -> 202 with the queued job(s), 429 when max_queued jobs are waiting
+#   GET    /jobs          - every job (?status=running to filter), GET /jobs/<id> - one job
+#   DELETE /jobs/<id>     - cancel the job (409 when it has finished already)
+#   GET    /events        - NDJSON stream of job events ({"event", "job"}, progress is rate limited, ?job=<id> to filter)
+# A job's download_path is resolved inside the server's download path - the API can't write anywhere else. The
+# server has no authentication, so it only listens on a loopback address unless --allow_remote is given.
+server_finished_jobs = 1000  # finished jobs kept for GET /jobs
+server_max_body = 1024 * 1024
+server_heartbeat = 15  # seconds
+
+
+class JobServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, download_path, workers=None, max_queued=1000):
+        super().__init__(address, JobRequestHandler)
+        self.download_path = download_path
+        self.max_queued = max_queued
+        self.manager = JobManager(max_workers=workers or get_settings().playlist_workers)
+        self.subscribers = set()
+        self._subscribers_lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch_events, name="events", daemon=True)
+        self._dispatcher.start()
+
+    # Body of POST /jobs -> list of (job or None, error)
+    def submit_jobs(self, rows):
+        settings = get_settings()
+        submitted = []
+        with self._submit_lock:
+            for row in rows:
+                entry = batch_entry(row, None, settings=settings)
+                trim_mode = (row.get("trim_mode") if isinstance(row, dict) else None) or "accurate"
+                if not entry["error"] and trim_mode not in trim_modes:
+                    entry["error"] = f"Unsupported trim mode: {trim_mode}"
+                if not entry["error"] and self.queued_jobs() >= self.max_queued:
+                    entry["error"] = f"Too many jobs waiting (max {self.max_queued})"
+                download_path = self.download_path
+                if not entry["error"]:
+                    download_path, entry["error"] = self.resolve_download_path(row.get("download_path"))
+                if entry["error"]:
+                    submitted.append((None, entry["error"]))
+                    continue
+                name = f"{entry['type']} {entry['format']}: {entry['url'] or entry['author'] + ' - ' + entry['title']}"
+                job = self.manager.submit(name, run_server_job, entry, download_path, trim_mode)
+                submitted.append((job, None))
+        self.manager.prune(server_finished_jobs)
+        return submitted
+
+    # download_path of a job (relative to the server's download path, or an absolute path inside it) -> (path, error).
+    # A missing directory is created, so the job doesn't fail only when its file is copied there.
+    def resolve_download_path(self, download_path):
+        root = os.path.realpath(self.download_path)
+        if not download_path:
+            return root, None
+        if not isinstance(download_path, str):
+            return None, "download_path must be a string"
+        path = os.path.realpath(os.path.join(root, download_path))
+        if os.path.commonpath([root, path]) != root:
+            return None, f"download_path must be inside {root}"
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            return None, f"Invalid download_path: {e}"
+        return path, None
+
+    def queued_jobs(self):
+        return sum(1 for job in self.manager.list_jobs() if job.status in ("queued", "running"))
+
+    # Subscriber queues of the /events streams - a client that can't keep up is dropped
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=1000)
+        with self._subscribers_lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._subscribers_lock:
+            self.subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self._subscribers_lock:
+            return subscriber in self.subscribers
+
+    def _dispatch_events(self):
+        while True:
+            event, job = self.manager.events.get()
+            if event is None:
+                return
+            with self._subscribers_lock:
+                for subscriber in list(self.subscribers):
+                    try:
+                        subscriber.put_nowait((event, job))
+                    except queue.Full:
+                        self.subscribers.discard(subscriber)
+
+    def server_close(self):
+        self.manager.shutdown(cancel_jobs=True)
+        self.manager.events.put((None, None))
+        super().server_close()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = "YouTubeDownloader"
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        path = url.path.rstrip("/")
+        query = urllib.parse.parse_qs(url.query)
+        if path == "/jobs":
+            statuses = query.get("status")
+            self.send_json(200, [job.to_dict() for job in self.server.manager.list_jobs()
+                                 if not statuses or job.status in statuses])
+        elif path.startswith("/jobs/"):
+            job = self.find_job(path)
+            if job:
+                self.send_json(200, job.to_dict())
+        elif path == "/events":
+            self.stream_events(query.get("job", [None])[0])
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self.send_json(411, {"error": "Content-Length required"})
+            return
+        if length > server_max_body:
+            self.send_json(413, {"error": f"Request body larger than {server_max_body} bytes"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(body, (dict, list)):
+            self.send_json(400, {"error": "Expected a job object or a list of jobs"})
+            return
+
+        submitted = self.server.submit_jobs(body if isinstance(body, list) else [body])
+        results = [job.to_dict() if job else {"error": error} for job, error in submitted]
+        if isinstance(body, list):
+            self.send_json(202 if any(job for job, _ in submitted) else 400, results)
+            return
+        job, error = submitted[0]
+        if job:
+            self.send_json(202, results[0], {"Location": f"/jobs/{job.id}"})
+        else:
+            self.send_json(429 if error.startswith("Too many jobs") else 400, results[0])
+
+    def do_DELETE(self):
+        path = urllib.parse.urlparse(self.path).path.rstrip("/")
+        if not path.startswith("/jobs/"):
+            self.send_json(404, {"error": "Not found"})
+            return
+        job = self.find_job(path)
+        if job is None:
+            return
+        if not self.server.manager.cancel(job.id):
+            # Finished already - nothing to cancel
+            self.send_json(409, {"error": f"Job {job.id} is {job.status}", "job": job.to_dict()})
+            return
+        self.send_json(202 if job.status != "cancelled" else 200, job.to_dict())
+
+    # /jobs/<id> -> Job (sends 404 if there's none)
+    def find_job(self, path):
+        job_id = path[len("/jobs/"):]
+        job = self.server.manager.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            self.send_json(404, {"error": f"No job {job_id}"})
+        return job
+
+    def stream_events(self, job_id=None):
+        subscriber = self.server.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            while self.server.is_subscribed(subscriber):
+                try:
+                    event, job = subscriber.get(timeout=server_heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from timing out and notices a client that went away
+                    event, job = "heartbeat", None
+                if job_id and job and str(job["id"]) != job_id:
+                    continue
+                self.wfile.write((json.dumps({"event": event, "job": job}) + "\n").encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.server.unsubscribe(subscriber)
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # One access log line per request would drown the console with thousands of jobs
+    def log_message(self, format, *args):
+        pass
+
+
+# A job of the server: the batch entry, searched first if it has no url -> list of downloaded files
+def run_server_job(entry, download_path, trim_mode="accurate", progress=None, settings=None):
+    if not entry["url"]:
+        entry["url"] = find_url_by_name(entry["author"], entry["title"]) or ""
+        if not entry["url"]:
+            raise RuntimeError(f"No video found for {entry['author']} - {entry['title']}")
+    return run_batch_job(entry, download_path, trim_mode, progress=progress, settings=settings)
+
+
+def is_loopback_host(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve_app(argv):
+    parser = argparse.ArgumentParser(prog='backend.py serve', description='Job server with a JSON API on localhost')
+    parser.add_argument('download_path', help='Default path for the downloaded files')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--allow_remote', action='store_true',
+                        help='Allow a --host other than a loopback address - anyone who can reach it can submit jobs')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of jobs running at the same time (default: playlist_workers from setup.json)')
+    parser.add_argument('--max_queued', type=int, default=1000,
+                        help='Number of queued + running jobs above which new jobs are refused (default: 1000)')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a setting for this run, e.g. --set download_connections=8 (repeatable)')
+    args = parser.parse_args(argv)
+
+    try:
+        set_settings_overrides(dict(item.split('=', 1) for item in args.set))
+    except ValueError as e:
+        print(f"Error in settings: {e}")
+        return
+
+    if not is_loopback_host(args.host):
+        if not args.allow_remote:
+            print(f"Error: refusing to listen on {args.host} - the job server has no authentication. "
+                  f"Use --allow_remote to listen on it anyway.")
+            return
+        print(f"WARNING: listening on {args.host} - anyone who can reach it can submit jobs and write files "
+              f"to {args.download_path}", file=sys.stderr)
+
+    server = JobServer((args.host, args.port), args.download_path, args.workers, args.max_queued)
+    print(f"Serving jobs on http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 # Section - Console App
 def console_app():
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve_app(sys.argv[2:])
+        return
     parser = argparse.ArgumentParser(description='YouTube Downloader and Converter')
-    parser.add_argument('action', choices=['video', 'audio', 'playlist'], help='Action to perform')
-    parser.add_argument('url_or_author', help='YouTube URL, author, or playlist URL')
+    parser.add_argument('action', choices=['video', 'audio', 'playlist', 'batch'], help='Action to perform')
+    parser.add_argument('url_or_author', help='YouTube URL, author, playlist URL or the batch manifest (CSV/JSONL)')
     parser.add_argument('title', nargs='?', default=None, help='Title of the video (optional, if author is provided)')
     parser.add_argument('download_path', help='Path to download the files')
     parser.add_argument('media_type', choices=['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv', 'mp3', 'wav', 'aac', 'ogg', 'flac', 'm4r'], default='mp3', help='Media type (default: mp3)')
     parser.add_argument('--quality', default="", help='Quality of video (e.g., 720p)')
     parser.add_argument('--start_time', default="", help='Start time for trimming (format: min:sec)')
     parser.add_argument('--end_time', default="", help='End time for trimming (format: min:sec)')
+    parser.add_argument('--trim_mode', choices=['fast', 'accurate', 'reencode'], default='accurate',
+                        help='Video trimming: fast (cut on keyframes), accurate (frame exact) or reencode')
+    parser.add_argument('--encoder_profile', default=None,
+                        help='Encoder profile from setup.json for everything re-encoded, e.g. fast, balanced or '
+                             'archival (default: "encoder_profile" from setup.json)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of playlist items / batch jobs downloaded at the same time '
+                             '(default: from setup.json)')
+    parser.add_argument('--report', default=None, help='JSONL file for the batch results (default: stdout)')
+    parser.add_argument('--connections', type=int, default=None,
+                        help='Number of parallel connections per stream download (default: from setup.json)')
+    parser.add_argument('--profile', action='store_true', help='Print the time spent per stage at the end')
+    parser.add_argument('--spans', default=None, help='Append every timing span as a JSON line to this file')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='Override a setting for this run, e.g. --set download_connections=8 (repeatable)')
     args = parser.parse_args()
 
+    try:
+        overrides = dict(item.split('=', 1) for item in args.set)
+        set_settings_overrides(overrides)
+    except ValueError as e:
+        print(f"Error in settings: {e}")
+        return
+
+    collector = add_span_sink(SpanCollector()) if args.profile else None
+    if args.spans:
+        add_span_sink(JsonLinesSink(args.spans))
+    start = time.perf_counter()
+    try:
+        run_console_action(args)
+    finally:
+        if collector:
+            print(f"\nProfile ({time.perf_counter() - start:.3f} s total):", file=sys.stderr)
+            print(collector.format_breakdown(), file=sys.stderr)
+
+
+def run_console_action(args):
     # Debug Print: Print all arguments received
     # print("Received Arguments:")
     # print(f"- Action: {args.action}")
@@ -455,6 +3631,23 @@ def console_app():
     # print(f"- Start Time: {args.start_time}")
     # print(f"- End Time: {args.end_time}")
 
+    if args.action == 'batch':
+        try:
+            entries = read_batch_manifest(args.url_or_author, args.media_type)
+            if args.report:
+                with open(args.report, 'w') as report_file:
+                    results = run_batch(entries, args.download_path, report_file, args.workers, args.trim_mode,
+                                        args.encoder_profile, args.connections)
+            else:
+                results = run_batch(entries, args.download_path, None, args.workers, args.trim_mode,
+                                    args.encoder_profile, args.connections)
+            failed = sum(1 for result in results if result["error"])
+            print(f"Batch finished: {len(results) - failed} of {len(results)} succeeded, {failed} failed",
+                  file=sys.stderr)
+        except Exception as e:
+            print(f"Error running batch: {str(e)}")
+        return
+
     # Determine if the provided url_or_author is a URL or author + title
     if args.title:
         # Assume url_or_author is the author and title is provided
@@ -466,23 +3659,42 @@ def console_app():
         # Assume url_or_author is the actual URL
         youtube_url = args.url_or_author
 
+    # Stage, speed and ETA as a progress line on stderr
+    progress = ConsoleProgress()
     if args.action == 'video':
         try:
-            download_youtube_video(youtube_url, args.download_path, args.media_type, args.quality, args.start_time, args.end_time)
+            download_youtube_video(youtube_url, args.download_path, args.media_type, args.quality, args.start_time,
+                                   args.end_time, trim_mode=args.trim_mode, encoder_profile=args.encoder_profile,
+                                   connections=args.connections, progress=progress)
+            progress.finish()
             print(f"Video downloaded successfully to {args.download_path}")
         except Exception as e:
+            progress.finish()
             print(f"Error downloading video: {str(e)}")
     elif args.action == 'audio':
         try:
-            download_youtube_audio(youtube_url, args.download_path, args.media_type, args.start_time, args.end_time)
+            download_youtube_audio(youtube_url, args.download_path, args.media_type, args.start_time, args.end_time,
+                                   encoder_profile=args.encoder_profile, connections=args.connections,
+                                   progress=progress)
+            progress.finish()
             print(f"Audio downloaded successfully to {args.download_path}")
         except Exception as e:
+            progress.finish()
             print(f"Error downloading audio: {str(e)}")
     elif args.action == 'playlist':
         try:
-            download_playlist(youtube_url, args.download_path, args.media_type, args.quality, args.start_time, args.end_time)
-            print(f"Playlist downloaded successfully to {args.download_path}")
+            results = download_playlist(youtube_url, args.download_path, args.media_type, args.quality,
+                                        args.start_time, args.end_time, workers=args.workers,
+                                        trim_mode=args.trim_mode, encoder_profile=args.encoder_profile,
+                                        connections=args.connections, progress=progress)
+            progress.finish()
+            summary = summarize_playlist_results(results)
+            print(f"Playlist downloaded to {args.download_path}: "
+                  f"{summary['succeeded']} of {summary['total']} succeeded, {summary['failed']} failed")
+            for failure in summary["failures"]:
+                print(f"- {failure['url']}: {failure['error']}")
         except Exception as e:
+            progress.finish()
             print(f"Error downloading playlist: {str(e)}")
 
 
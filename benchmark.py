@@ -0,0 +1,414 @@
+r"""
+Offline benchmark of the media processing in backend.py - trimming, merging and format conversion.
+
+Synthetic fixtures (sine tones and ffmpeg test patterns in different durations, resolutions and codecs) are generated
+locally with ffmpeg, so nothing is downloaded. Every case runs in its own process, so its peak RSS is measured in
+isolation (Unix only - None on Windows), and is repeated --repeat times:
+    - wall_seconds, cpu_seconds: median of the runs (cpu = this process + ffmpeg children)
+    - self_peak_rss_bytes: the highest of the runs for the Python process (includes the imports of backend.py)
+    - children_peak_rss_bytes: peak RSS of the biggest ffmpeg child - the memory of the media work. Linux counts the
+      memory a child had before its exec, i.e. the forking Python process with backend.py imported, so it is measured
+      in one extra run in which ffmpeg is started by a small wrapper process (see wrap_ffmpeg)
+
+Every run is appended to a JSON history. With a saved baseline, a case whose wall or cpu time grew by more than
+--threshold (and by more than --min_delta seconds, to ignore noise on short cases), or whose peak RSS grew by more
+than --rss_threshold (and by more than --min_rss_delta MB) is a regression - the script then exits with code 1.
+
+Work as console app:
+    python benchmark.py [--cases <name,name>] [--repeat 3] [--threshold 0.15] [--save_baseline]
+
+    Examples:
+        - Measure everything and store the result as the baseline:
+            python benchmark.py --save_baseline
+        - Compare the audio cases against the baseline:
+            python benchmark.py --cases trim_audio_mp3,convert_audio_m4a_to_mp3
+"""
+import argparse
+import json
+import os
+import platform
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows - no peak RSS
+    resource = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+benchmark_dir = os.path.join(script_dir, "cache", "benchmark")
+
+# Fixture name -> ffmpeg arguments generating it
+fixtures = {
+    "audio_180s.m4a": ["-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100:duration=180", "-ac", "2",
+                       "-c:a", "aac", "-b:a", "128k"],
+    "audio_180s.webm": ["-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=180", "-ac", "2",
+                        "-c:a", "libopus", "-b:a", "128k"],
+    "audio_600s.mp3": ["-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100:duration=600", "-ac", "2",
+                       "-c:a", "libmp3lame", "-b:a", "192k"],
+    "video_360p_30s.mp4": ["-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=30",
+                           "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", "60"],
+    "video_720p_30s.mp4": ["-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30:duration=30",
+                           "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", "60"],
+    "video_1080p_10s.mp4": ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30:duration=10",
+                            "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", "60"],
+    "video_360p_30s.webm": ["-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration=30",
+                            "-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8", "-b:v", "1M",
+                            "-g", "60"],
+}
+
+
+# Copy a fixture into the work directory - some operations write next to their input or remove it
+def work_copy(fixture_dir, work_dir, name):
+    path = os.path.join(work_dir, name)
+    shutil.copyfile(os.path.join(fixture_dir, name), path)
+    return path
+
+
+# Cases: name -> (fixtures used, setup). setup(fixture_dir, work_dir) prepares the inputs and returns the operation
+# to time - imports and copies are not measured.
+def trim_audio_mp3(fixture_dir, work_dir):
+    from backend import trim_audio
+    input_file = work_copy(fixture_dir, work_dir, "audio_600s.mp3")
+    return lambda: trim_audio(input_file, 120, 420)
+
+
+def convert_audio_m4a_to_mp3(fixture_dir, work_dir):
+    from backend import render_audio
+    input_file = os.path.join(fixture_dir, "audio_180s.m4a")
+    return lambda: render_audio(input_file, os.path.join(work_dir, "out.mp3"))
+
+
+def convert_audio_m4a_to_aac_copy(fixture_dir, work_dir):
+    from backend import render_audio
+    input_file = os.path.join(fixture_dir, "audio_180s.m4a")
+    return lambda: render_audio(input_file, os.path.join(work_dir, "out.aac"), stream_copy=True)
+
+
+def convert_audio_webm_to_ogg_copy(fixture_dir, work_dir):
+    from backend import render_audio
+    input_file = os.path.join(fixture_dir, "audio_180s.webm")
+    return lambda: render_audio(input_file, os.path.join(work_dir, "out.ogg"), stream_copy=True)
+
+
+def trim_video_case(mode):
+    def setup(fixture_dir, work_dir):
+        from backend import trim_video
+        input_file = work_copy(fixture_dir, work_dir, "video_720p_30s.mp4")
+        return lambda: trim_video(input_file, 5, 20, mode)
+    return setup
+
+
+def merge_h264_aac_1080p(fixture_dir, work_dir):
+    from backend import merge_video_and_audio_file
+    video_file = work_copy(fixture_dir, work_dir, "video_1080p_10s.mp4")
+    audio_file = work_copy(fixture_dir, work_dir, "audio_180s.m4a")
+    output_file = os.path.join(work_dir, "merged.mp4")
+
+    def run():
+        if merge_video_and_audio_file(video_file, audio_file, output_file) is None:
+            raise RuntimeError("Merging failed")
+    return run
+
+
+def merge_vp9_opus_to_mkv(fixture_dir, work_dir):
+    from backend import merge_video_and_audio_file
+    video_file = work_copy(fixture_dir, work_dir, "video_360p_30s.webm")
+    audio_file = work_copy(fixture_dir, work_dir, "audio_180s.webm")
+    output_file = os.path.join(work_dir, "merged.mkv")
+
+    def run():
+        if merge_video_and_audio_file(video_file, audio_file, output_file) is None:
+            raise RuntimeError("Merging failed")
+    return run
+
+
+def convert_video_mp4_to_mkv(fixture_dir, work_dir):
+    from backend import convert_video_file
+    input_file = os.path.join(fixture_dir, "video_1080p_10s.mp4")
+    return lambda: convert_video_file(input_file, os.path.join(work_dir, "out.mkv"))
+
+
+def convert_video_mp4_to_avi(fixture_dir, work_dir):
+    from backend import convert_video_file
+    input_file = os.path.join(fixture_dir, "video_360p_30s.mp4")
+    return lambda: convert_video_file(input_file, os.path.join(work_dir, "out.avi"))
+
+
+def render_video_merge_trim_720p(fixture_dir, work_dir):
+    # What download_youtube_video does for a trimmed adaptive stream: merge + trim in one pass
+    from backend import render_video
+    video_file = os.path.join(fixture_dir, "video_720p_30s.mp4")
+    audio_file = os.path.join(fixture_dir, "audio_180s.m4a")
+    return lambda: render_video(video_file, audio_file, os.path.join(work_dir, "out.mp4"), 5, 20)
+
+
+cases = {
+    "trim_audio_mp3": (["audio_600s.mp3"], trim_audio_mp3),
+    "convert_audio_m4a_to_mp3": (["audio_180s.m4a"], convert_audio_m4a_to_mp3),
+    "convert_audio_m4a_to_aac_copy": (["audio_180s.m4a"], convert_audio_m4a_to_aac_copy),
+    "convert_audio_webm_to_ogg_copy": (["audio_180s.webm"], convert_audio_webm_to_ogg_copy),
+    "trim_video_fast_720p": (["video_720p_30s.mp4"], trim_video_case("fast")),
+    "trim_video_accurate_720p": (["video_720p_30s.mp4"], trim_video_case("accurate")),
+    "trim_video_reencode_720p": (["video_720p_30s.mp4"], trim_video_case("reencode")),
+    "merge_h264_aac_1080p": (["video_1080p_10s.mp4", "audio_180s.m4a"], merge_h264_aac_1080p),
+    "merge_vp9_opus_to_mkv": (["video_360p_30s.webm", "audio_180s.webm"], merge_vp9_opus_to_mkv),
+    "convert_video_mp4_to_mkv": (["video_1080p_10s.mp4"], convert_video_mp4_to_mkv),
+    "convert_video_mp4_to_avi": (["video_360p_30s.mp4"], convert_video_mp4_to_avi),
+    "render_video_merge_trim_720p": (["video_720p_30s.mp4", "audio_180s.m4a"], render_video_merge_trim_720p),
+}
+
+
+# Generate the missing fixtures (they are kept between runs)
+def create_fixtures(fixture_dir, names):
+    from backend import get_ffmpeg_binary
+    os.makedirs(fixture_dir, exist_ok=True)
+    for name in names:
+        path = os.path.join(fixture_dir, name)
+        if os.path.isfile(path):
+            continue
+        print(f"Generating fixture {name}")
+        temp_path = os.path.join(fixture_dir, f"tmp.{name}")
+        subprocess.run([get_ffmpeg_binary(), "-y", "-loglevel", "error", *fixtures[name], temp_path], check=True)
+        os.replace(temp_path, path)
+
+
+# Peak RSS of this process (resource.RUSAGE_SELF) or of its largest finished child (resource.RUSAGE_CHILDREN).
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+def peak_rss_bytes(who):
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale
+
+
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+# ffmpeg as started by backend.py during the children RSS run: runs the real binary and appends its peak RSS to
+# rss_file. This process stays small, so the RSS inherited by the fork doesn't hide the one of ffmpeg.
+def wrap_ffmpeg(ffmpeg_binary, rss_file, arguments):
+    return_code = subprocess.call([ffmpeg_binary, *arguments])
+    with open(rss_file, 'a') as rss:
+        rss.write(f"{peak_rss_bytes(resource.RUSAGE_CHILDREN)}\n")
+    return return_code
+
+
+# Point moviepy (and with it backend.py) at a wrapper script calling wrap_ffmpeg
+def install_ffmpeg_wrapper(work_dir, rss_file):
+    from moviepy.config import change_settings, get_setting
+    wrapper = os.path.join(work_dir, "ffmpeg_wrapper.sh")
+    command = [sys.executable, "-S", os.path.abspath(__file__), "--wrap_ffmpeg", get_setting("FFMPEG_BINARY"),
+               rss_file]
+    with open(wrapper, 'w') as script:
+        script.write(f'#!/bin/sh\nexec {shlex.join(command)} "$@"\n')
+    os.chmod(wrapper, 0o755)
+    change_settings({"FFMPEG_BINARY": wrapper})
+
+
+# Runs inside the worker process - one measurement of one case. With children_rss, ffmpeg runs through the wrapper
+# and only its peak RSS is recorded (the wrapper adds a process start to every ffmpeg call - the times are skewed).
+def measure_case(name, fixture_dir, result_file, children_rss=False):
+    with tempfile.TemporaryDirectory() as work_dir:
+        rss_file = os.path.join(work_dir, "ffmpeg_rss.txt")
+        if children_rss:
+            install_ffmpeg_wrapper(work_dir, rss_file)
+        operation = cases[name][1](fixture_dir, work_dir)
+        cpu_start = cpu_seconds()
+        wall_start = time.perf_counter()
+        operation()
+        wall = time.perf_counter() - wall_start
+        cpu = cpu_seconds() - cpu_start
+        if children_rss:
+            # No file when the case ran no ffmpeg
+            values = [int(line) for line in load_lines(rss_file)]
+            measurement = {"children_peak_rss_bytes": max(values) if values else None}
+        else:
+            measurement = {"wall_seconds": wall, "cpu_seconds": cpu,
+                           "self_peak_rss_bytes": peak_rss_bytes(resource.RUSAGE_SELF) if resource else None}
+    with open(result_file, 'w') as json_file:
+        json.dump(measurement, json_file)
+
+
+def run_measurement(name, fixture_dir, children_rss=False):
+    with tempfile.TemporaryDirectory() as result_dir:
+        result_file = os.path.join(result_dir, "result.json")
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", name, "--fixtures", fixture_dir,
+                        "--result_file", result_file, *(["--children_rss"] if children_rss else [])],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(result_file, 'r') as json_file:
+            return json.load(json_file)
+
+
+def run_case(name, fixture_dir, repeat):
+    measurements = [run_measurement(name, fixture_dir) for _ in range(repeat)]
+    rss_values = [m["self_peak_rss_bytes"] for m in measurements if m["self_peak_rss_bytes"] is not None]
+    children_rss = run_measurement(name, fixture_dir, children_rss=True)["children_peak_rss_bytes"] \
+        if resource else None
+    return {
+        "wall_seconds": round(statistics.median(m["wall_seconds"] for m in measurements), 4),
+        "cpu_seconds": round(statistics.median(m["cpu_seconds"] for m in measurements), 4),
+        "self_peak_rss_bytes": max(rss_values) if rss_values else None,
+        "children_peak_rss_bytes": children_rss,
+        "runs": len(measurements),
+    }
+
+
+rss_metrics = ("self_peak_rss_bytes", "children_peak_rss_bytes")
+
+
+# Cases slower or bigger than the baseline -> list of (case, metric, baseline, current). The RSS metrics are
+# compared with their own tolerance (min_rss_delta in bytes) and skipped where either side has no value (Windows, or
+# a baseline saved before they were recorded).
+def find_regressions(results, baseline, threshold, min_delta, rss_threshold, min_rss_delta):
+    regressions = []
+    tolerances = {"wall_seconds": (threshold, min_delta), "cpu_seconds": (threshold, min_delta),
+                  **{metric: (rss_threshold, min_rss_delta) for metric in rss_metrics}}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, (metric_threshold, metric_min_delta) in tolerances.items():
+            previous, current = baseline[name].get(metric), result.get(metric)
+            if previous is None or current is None:
+                continue
+            if current > previous * (1 + metric_threshold) and current - previous > metric_min_delta:
+                regressions.append((name, metric, previous, current))
+    return regressions
+
+
+def format_metric(metric, value):
+    if metric in rss_metrics:
+        return f"{value / 1024 ** 2:.1f} MB"
+    return f"{value:.3f}s"
+
+
+def load_json(path, default):
+    try:
+        with open(path, 'r') as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return default
+
+
+def load_lines(path):
+    try:
+        with open(path, 'r') as text_file:
+            return [line.strip() for line in text_file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+    os.replace(temp_path, path)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=script_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the trim, merge and conversion functions')
+    parser.add_argument('--cases', default="", help='Comma separated case names (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case (default: 3)')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Allowed slowdown against the baseline, 0.15 = 15%% (default: 0.15)')
+    parser.add_argument('--min_delta', type=float, default=0.05,
+                        help='Slowdowns below this many seconds are ignored (default: 0.05)')
+    parser.add_argument('--rss_threshold', type=float, default=0.2,
+                        help='Allowed peak RSS growth against the baseline, 0.2 = 20%% (default: 0.2)')
+    parser.add_argument('--min_rss_delta', type=float, default=16,
+                        help='Peak RSS growth below this many MB is ignored (default: 16)')
+    parser.add_argument('--fixtures', default=os.path.join(benchmark_dir, "fixtures"), help='Fixture directory')
+    parser.add_argument('--history', default=os.path.join(benchmark_dir, "history.json"), help='JSON history file')
+    parser.add_argument('--baseline', default=os.path.join(benchmark_dir, "baseline.json"), help='Baseline file')
+    parser.add_argument('--save_baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--list', action='store_true', help='List the cases and exit')
+    # Internal: one measurement in a fresh process
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--result_file', help=argparse.SUPPRESS)
+    parser.add_argument('--children_rss', action='store_true', help=argparse.SUPPRESS)
+    # Internal: ffmpeg wrapper of the children RSS run - everything after the rss file goes to ffmpeg as it is
+    if len(sys.argv) > 3 and sys.argv[1] == '--wrap_ffmpeg':
+        return wrap_ffmpeg(sys.argv[2], sys.argv[3], sys.argv[4:])
+    args = parser.parse_args()
+
+    if args.measure:
+        measure_case(args.measure, args.fixtures, args.result_file, args.children_rss)
+        return 0
+
+    if args.list:
+        for name in cases:
+            print(name)
+        return 0
+
+    selected = [name.strip() for name in args.cases.split(",") if name.strip()] or list(cases)
+    unknown = [name for name in selected if name not in cases]
+    if unknown:
+        print(f"Unknown cases: {', '.join(unknown)}. Use --list to see them.")
+        return 2
+
+    create_fixtures(args.fixtures, sorted({fixture for name in selected for fixture in cases[name][0]}))
+
+    results = {}
+    for name in selected:
+        print(f"Running {name} ...", end=" ", flush=True)
+        try:
+            results[name] = run_case(name, args.fixtures, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"failed ({e})")
+            continue
+        result = results[name]
+        self_rss, children_rss = (format_metric(metric, result[metric]) if result[metric] is not None else "n/a"
+                                  for metric in rss_metrics)
+        print(f"wall {result['wall_seconds']:.3f}s, cpu {result['cpu_seconds']:.3f}s, "
+              f"peak RSS {self_rss} (python) / {children_rss} (ffmpeg)")
+
+    history = load_json(args.history, [])
+    history.append({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": os.cpu_count()},
+        "results": results,
+    })
+    save_json(args.history, history)
+
+    exit_code = 0 if len(results) == len(selected) else 1
+    baseline = load_json(args.baseline, None)
+    if args.save_baseline:
+        save_json(args.baseline, {**(baseline or {}), **results})
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline at {args.baseline} - run with --save_baseline to create one")
+    else:
+        regressions = find_regressions(results, baseline, args.threshold, args.min_delta, args.rss_threshold,
+                                       args.min_rss_delta * 1024 ** 2)
+        for name, metric, previous, current in regressions:
+            print(f"REGRESSION {name}: {metric} {format_metric(metric, previous)} -> {format_metric(metric, current)} "
+                  f"(+{(current / previous - 1) * 100 if previous else 100:.0f}%)")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regressions against the baseline (threshold {args.threshold:.0%}, "
+                  f"RSS {args.rss_threshold:.0%})")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,22 +7,23 @@ Methods used:
 Create Widgets - GUI Configuration
 •	Sidebar: Contains logo, appearance mode options, and scaling options.
 •	Search Sectionn: Contains TabView with tabs "by Name" and "by URL" for searching videos.
-•	Options Frame: Allows selection of audio/video format and quality, and trimming options.
+•	Options Frame: Allows selection of audio/video format and quality, trimming options and the encoder profile.
 •	Visualisation Frame: Displays video thumbnails and playback controls.
 •	Download Frame: Specifies download path and includes download controls.
 
 Key Attributes
 •	logo_path, youtube_frame_path: Paths to static image files.
 •	default_img_active, youtube_url, url_playlist, video_url_name, video_url_time, current_time: States and information related to YouTube video and URL.
-•	quality_options, audio_format_options_dict, audio_format_options, video_format_options: Format and quality options for download.
-•	audio_file_path, is_paused: Attributes related to audio playback.
+•	quality_options, audio_format_options_dict, audio_format_options, video_format_options, encoder_profile_options: Format and quality options for download.
+•	audio_preview, play_position, is_paused: Attributes related to audio playback (progressive preview of the stream).
 
 Loading and Updating Methods
-•	loading_find_url_by_artist_name: Shows loading indicator and calls find_url_by_artist_name.
-•	find_url_by_artist_name: Searches for a YouTube video by artist and title, updates the URL and video details.
-•	loading_update_url: Shows loading indicator and calls update_url.
-•	update_url: Validates and updates YouTube URL, downloads a temporary audio file if needed, and updates video details.
-•	update_search_result: Extracts and displays the video thumbnail, updates button states.
+•	loading_find_url_by_artist_name: Shows loading indicator and starts find_url_by_artist_name as a background job.
+•	find_url_by_artist_name: Searches for a YouTube video by artist and title (worker thread).
+•	loading_update_url: Shows loading indicator and starts load_url as a background job.
+•	load_url: Validates the URL, fetches the preview audio, thumbnail and video details (worker thread).
+•	update_url: Updates YouTube URL and video details from the load_url result (main thread).
+•	update_search_result: Displays the video thumbnail, updates button states.
 •	update_quality_options: Updates the quality options available for the video.
 
 Format and Quality Options Methods
@@ -30,8 +31,13 @@ Format and Quality Options Methods
 •	update_options_video: Sets the video format selection to "Video:".
 
 Download Methods
-•	loading_download_media: Shows loading indicator and calls download_media.
-•	download_media: Downloads the selected media, shows success or error messages.
+•	loading_download_media: Calls download_media.
+•	download_media: Starts the download of the selected media as a background job, shows success or error messages.
+
+Background Job Methods
+•	run_job: Submits a function to a JobManager worker pool (downloads, or lookup_jobs for URL loads and searches), with success/error callbacks and an optional progress row.
+•	poll_jobs: Drains the job events every 100 ms on the Tk main thread and updates progress bars and widgets.
+•	add_job_row, update_job_row, remove_job_row: Per-job progress bar (stage, speed, ETA) with a cancel button.
 
 Appearance and Scaling Methods
 •	change_appearance_mode_event: Changes the appearance mode (Light, Dark, System).
@@ -40,10 +46,11 @@ Appearance and Scaling Methods
 Utility Methods
 •	browse_folder: Opens a file dialog to select a download folder.
 •	open_url_to_system_browser: Opens the YouTube URL in the default web browser.
-•	delete_mp3_files: Deletes temporary mp3 files in the application directory.
+•	trim_media_cache: Evicts the least recently used media cache entries until the cache fits its byte budget.
 
 Audio Playback Methods
-•	play_audio: Plays the specified audio file.
+•	play_audio: Plays the progressive preview (or the specified audio file).
+•	feed_preview: Queues the next decoded chunks of the preview on the playback channel.
 •	pause_audio: Pauses or unpauses audio playback.
 •	stop_audio: Stops audio playback.
 •	update_current_time: Updates the current playback time.
@@ -58,14 +65,16 @@ from tkinter import messagebox
 from tkinter import filedialog
 from PIL import Image, ImageTk
 # from proglog import ProgressBarLogger
-from pytube import YouTube
 import logging
 from multiprocessing import freeze_support
 import webbrowser
 import pygame
+from pytube import Playlist
 from backend import (find_url_by_name, download_youtube_video, download_youtube_audio, download_playlist,
                      get_video_time, str_time_to_seconds,
-                     get_video_quality_options, extract_thumbnail_from_url, get_value_from_json, get_video_name,)
+                     get_video_quality_options, extract_thumbnail_from_url, get_settings, get_video_name,
+                     resolve_video_metadata, summarize_playlist_results, get_media_cache,
+                     JobManager, AudioPreview, format_progress,)
 
 customtkinter.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
 customtkinter.set_default_color_theme("green")  # Themes: "blue" (standard), "green", "dark-blue"
@@ -78,7 +87,7 @@ class App(customtkinter.CTk):
     def __init__(self):
         super().__init__()
 
-        self.delete_mp3_files()
+        self.trim_media_cache()
         # Static files
         script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory of the current script
         self.logo_path = os.path.join(script_dir, 'static_files', 'logo.jpg')
@@ -88,9 +97,10 @@ class App(customtkinter.CTk):
         # Variables
         self.initial_variables()
 
-        self.audio_format_options_dict = get_value_from_json("supported_audio_file_types")
+        self.audio_format_options_dict = dict(get_settings().supported_audio_file_types)
         self.audio_format_options = list(self.audio_format_options_dict.keys())
-        self.video_format_options = get_value_from_json("supported_video_file_types")
+        self.video_format_options = list(get_settings().supported_video_file_types)
+        self.encoder_profile_options = list(get_settings().encoder_profiles)
 
         # configure window
         self.title("YouTube Downloader")
@@ -102,6 +112,17 @@ class App(customtkinter.CTk):
         self.grid_rowconfigure((0, 1), weight=2)
         self.createwidgets()
 
+        # Network and transcoding run in background jobs, the window only polls for their progress. URL loads and
+        # searches have workers of their own, so they don't wait behind running downloads.
+        self.jobs = JobManager(max_workers=3)
+        self.lookup_jobs = JobManager(max_workers=2)
+        # Keyed by (job manager, job id)
+        self.job_callbacks = {}
+        self.job_rows = {}
+        self.after(100, self.poll_jobs)
+        self.after(100, self.feed_preview)
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
     def createwidgets(self):
 
 # SECTION - Sidebar frame with widgets
@@ -216,6 +237,14 @@ class App(customtkinter.CTk):
             self.start_input.grid(row=6, column=1, padx=20, pady=(0, 20), sticky="nsew")
             self.end_input = customtkinter.CTkEntry(self.options_frame, placeholder_text="End time (00:00)")
             self.end_input.grid(row=6, column=2, padx=20, pady=(0, 20), sticky="nsew")
+            # Encoder profile - speed vs. size of everything that has to be re-encoded
+            self.label_encoder_profile = customtkinter.CTkLabel(self.options_frame, text="Encoder profile:",
+                                                                font=("Helvetica", 16, "bold"))
+            self.label_encoder_profile.grid(row=7, column=0, padx=20, pady=(0, 20), sticky="w")
+            self.select_encoder_profile = customtkinter.CTkOptionMenu(self.options_frame,
+                                                                      values=self.encoder_profile_options)
+            self.select_encoder_profile.set(get_settings().encoder_profile)
+            self.select_encoder_profile.grid(row=7, column=1, padx=20, pady=(0, 20), sticky="nsew")
 
     # SECTION - Visualisation frame
             self.visualisation_frame = customtkinter.CTkFrame(self)
@@ -256,7 +285,7 @@ class App(customtkinter.CTk):
             self.volume_label = customtkinter.CTkLabel(self.visualisation_frame, image=self.volume_icon, text='')
             self.volume_label.grid(row=2, column=3, padx=(10, 10), pady=(10, 10))
             self.play_button = customtkinter.CTkButton(self.visualisation_frame, text="Play", fg_color="transparent",
-                                                       command=lambda: self.play_audio(self.audio_file_path),
+                                                       command=lambda: self.play_audio(),
                                                        border_width=0, text_color=("gray10", "#DCE4EE"))
             self.play_button.grid(row=4, column=0, padx=(20, 20), pady=(20, 20), sticky="nsew")
             self.pause_button = customtkinter.CTkButton(self.visualisation_frame, text="Pause", fg_color="transparent",
@@ -290,6 +319,9 @@ class App(customtkinter.CTk):
                                                   font=("Helvetica", 16, "bold"),
                                                   text_color="#2fa572")
             self.loading.grid(row=4, column=0, columnspan=2, padx=0, pady=10, sticky="nsew")
+            # Background jobs, each with its own progress bar and cancel button
+            self.jobs_frame = customtkinter.CTkScrollableFrame(self.download_frame, height=120)
+            self.jobs_frame.grid(row=5, column=0, columnspan=2, padx=20, pady=(0, 10), sticky="nsew")
             # self.progress_label = customtkinter.CTkLabel(self.download_frame, text="Progress:")
             # self.progress_label.grid(row=5, column=0, columnspan=2, padx=20, pady=10, sticky="w")
             # self.progress_bar = customtkinter.CTkProgressBar(self.download_frame, mode='determinate')
@@ -316,70 +348,126 @@ class App(customtkinter.CTk):
     def initial_variables(self):
         self.default_img_active = True
         self.youtube_url = ''
+        self.url_job_id = None
         self.url_playlist = False
         self.video_url_name = ''
         self.video_url_time = '00:00'
         self.current_time = '00:00'
         self.quality_options = []
         self.radio_buttons = []
-        self.audio_file_path = ''
+        self.audio_preview = None
+        self.preview_channel = None
+        self.play_position = 0.0
+        self.time_updates_running = False
         self.is_paused = True
 
     def loading_find_url_by_artist_name(self):
         self.loading_1.grid()
-        self.loading_1.after(100, lambda: self.find_url_by_artist_name())
-
-    def find_url_by_artist_name(self):
         artist = self.name_input.get()
         title = self.title_input.get()
-        self.youtube_url = find_url_by_name(artist, title)
+        self.run_job(f"Search: {artist} - {title}", self.find_url_by_artist_name, artist, title,
+                     on_success=self.on_url_found, on_error=self.on_search_failed, jobs=self.lookup_jobs)
+
+    # Runs in a worker thread
+    @staticmethod
+    def find_url_by_artist_name(artist, title, progress=None):
+        return find_url_by_name(artist, title)
+
+    def on_url_found(self, url):
+        self.loading_1.grid_remove()
+        if not url:
+            messagebox.showerror("Error", "Could not find video for the given author and title.")
+            return
+        self.youtube_url = url
         self.loading_update_url(self.youtube_url, False)
 
+    def on_search_failed(self, error):
+        self.loading_1.grid_remove()
+        messagebox.showerror("Error", f"Search failed: {error}")
+
     def loading_update_url(self, url, playlist):
         self.loading_2.grid()
-        self.loading_2.after(100, lambda: self.update_url(url, playlist))
-
-    def update_url(self, url, playlist):
         # Unload previous audio
-        pygame.mixer.music.unload()
-        # Check if the URL is a valid YouTube URL
+        self.unload_audio()
+        # The preview is decoded straight into the mixer's sample format
+        sample_rate, _, channels = pygame.mixer.get_init()
+        job = self.run_job(f"Load: {url}", self.load_url, url, playlist, sample_rate, channels,
+                           jobs=self.lookup_jobs)
+        # Only the latest request updates the window - earlier ones still finishing are ignored
+        self.url_job_id = job.id
+        self.job_callbacks[(self.lookup_jobs, job.id)] = (lambda result: self.update_url(result, job.id),
+                                                          lambda error: self.on_load_url_failed(error, job.id))
+
+    # Runs in a worker thread - resolves everything the window shows for a URL, without touching any widget
+    @staticmethod
+    def load_url(url, playlist, sample_rate=44100, channels=2, progress=None):
+        # Check if the URL is a valid YouTube URL (the resolved metadata is cached for the calls below)
         try:
-            yt = YouTube(url)
+            if playlist:
+                # Preview the first video of the playlist, the download itself uses the playlist URL
+                video_urls = list(Playlist(url).video_urls)
+                if not video_urls:
+                    raise ValueError("The playlist is empty.")
+                preview_url = video_urls[0]
+            else:
+                preview_url = url
+            resolve_video_metadata(preview_url)
         except Exception as e:
-            # CTkMessagebox(title="Error", message="Something went wrong!!!", icon="cancel")
-            messagebox.showerror("Error", f"Invalid YouTube URL: {str(e)}")
-            self.loading_2.grid_remove()
-            return
+            raise ValueError(f"Invalid YouTube URL: {str(e)}")
 
-        if playlist:
-            self.url_playlist = True
-        else:
-            self.url_playlist = False
-            # Download Temp mp3 file
-            script_dir = os.path.dirname(os.path.abspath(__file__)) # Script path
-            download_temp_file_path = os.path.join(script_dir, "temp_mp3")
-            if not os.path.exists(download_temp_file_path):
-                os.makedirs(download_temp_file_path)
-            self.audio_file_path = download_youtube_audio(url, download_temp_file_path, "mp3")
+        result = {"url": url, "playlist": playlist, "audio_preview": None, "thumbnail": None,
+                  "thumbnail_error": None, "quality_options": None, "quality_error": None}
+        try:
+            # Progressive preview - decoding starts right away, playback can start after the first chunk
+            result["audio_preview"] = AudioPreview.from_url(preview_url, sample_rate, channels).start()
+        except Exception as e:
+            print(f"Audio preview is not available: {e}")
 
-        self.youtube_url = url
-        self.video_url_name = get_video_name(url)
-        self.video_url_time = get_video_time(url)
+        result["video_url_name"] = get_video_name(preview_url)
+        result["video_url_time"] = get_video_time(preview_url)
+        try:
+            result["thumbnail"] = extract_thumbnail_from_url(preview_url)
+        except Exception as e:
+            result["thumbnail_error"] = str(e)
+        try:
+            result["quality_options"] = get_video_quality_options(preview_url)
+        except Exception as e:
+            result["quality_error"] = str(e)
+        return result
+
+    def update_url(self, result, job_id=None):
+        if job_id is not None and job_id != self.url_job_id:
+            if result["audio_preview"]:
+                result["audio_preview"].close()
+            return
+        self.url_playlist = result["playlist"]
+        self.unload_audio()
+        self.audio_preview = result["audio_preview"]
+
+        self.video_url_name = result["video_url_name"]
+        self.video_url_time = result["video_url_time"]
         self.label_video_name.configure(text=self.video_url_name)
         self.video_time.configure(text=f"00:00 - {self.video_url_time}")
-        self.update_search_result(url)
-        self.update_quality_options(url)
+        self.update_search_result(result["thumbnail"], result["thumbnail_error"])
+        self.update_quality_options(result["quality_options"], result["quality_error"])
+        self.youtube_url = result["url"]
         self.loading_1.grid_remove()
         self.loading_2.grid_remove()
 
-    def update_search_result(self, url):
-        try:
-            image = extract_thumbnail_from_url(url)
+    def on_load_url_failed(self, error, job_id=None):
+        if job_id is not None and job_id != self.url_job_id:
+            return
+        # CTkMessagebox(title="Error", message="Something went wrong!!!", icon="cancel")
+        messagebox.showerror("Error", error)
+        self.loading_1.grid_remove()
+        self.loading_2.grid_remove()
+
+    def update_search_result(self, image, error=None):
+        if image is not None:
             img = ImageTk.PhotoImage(image)
             self.default_img_active = False
-            self.youtube_url = url
-        except Exception as e:
-            messagebox.showerror("Error", f"Extracting thumbnail failed: {str(e)}")
+        else:
+            messagebox.showerror("Error", f"Extracting thumbnail failed: {error}")
             # CTkMessagebox(master=self, title="Error", message="Error URL", icon="cancel")
             default_image = Image.open(self.youtube_frame_path)
             default_image = default_image.resize((500, 300), Image.LANCZOS)
@@ -400,12 +488,11 @@ class App(customtkinter.CTk):
             self.slider_preview.configure(state="normal")
             self.download_button.configure(state="normal")
 
-    def update_quality_options(self, url):
-        try:
-            self.quality_options = get_video_quality_options(url)
-        except Exception as e:
-            messagebox.showerror("Error", f"Extracting quality options failed: {str(e)}")
+    def update_quality_options(self, quality_options, error=None):
+        if quality_options is None:
+            messagebox.showerror("Error", f"Extracting quality options failed: {error}")
             return
+        self.quality_options = quality_options
 
         # Clear existing radio buttons if any
         if hasattr(self, 'radio_buttons'):
@@ -437,9 +524,7 @@ class App(customtkinter.CTk):
         self.select_video_format.set("Video:")
 
     def loading_download_media(self):
-        self.loading.grid()
-        # self.loadingbar.start()
-        self.loading.after(200, lambda: self.download_media())
+        self.download_media()
 
     def download_media(self):
         selected_audio_format = self.select_audio_format.get()
@@ -448,6 +533,7 @@ class App(customtkinter.CTk):
         download_folder = self.download_path.get()
         start_time = self.start_input.get()
         end_time = self.end_input.get()
+        encoder_profile = self.select_encoder_profile.get()
 
         if not download_folder:
             messagebox.showerror("Error", "Please select a download folder.")
@@ -474,28 +560,110 @@ class App(customtkinter.CTk):
             audio_file = True
             file_format = selected_audio_format
 
+        selected_quality = self.quality_options[selected_quality] if self.quality_options else ""
+
+        # The download runs in the background with its own progress bar - more can be started meanwhile
+        name = f"{self.video_url_name or self.youtube_url} ({file_format})"
         if self.url_playlist:
-            download_function = download_playlist
+            self.run_job(name, download_playlist, self.youtube_url, download_folder, file_format,
+                         "" if audio_file else selected_quality, start_time, end_time,
+                         encoder_profile=encoder_profile, on_success=self.on_playlist_downloaded,
+                         on_error=self.on_download_failed, show_progress=True)
+        elif audio_file:
+            self.run_job(name, download_youtube_audio, self.youtube_url, download_folder, file_format, start_time,
+                         end_time, encoder_profile=encoder_profile, on_success=self.on_media_downloaded,
+                         on_error=self.on_download_failed, show_progress=True)
+        else:
+            self.run_job(name, download_youtube_video, self.youtube_url, download_folder, file_format,
+                         selected_quality, start_time, end_time, encoder_profile=encoder_profile,
+                         on_success=self.on_media_downloaded, on_error=self.on_download_failed,
+                         show_progress=True)
+
+    def on_media_downloaded(self, file_path):
+        messagebox.showinfo("Success", "Download completed successfully!")
+
+    def on_playlist_downloaded(self, results):
+        summary = summarize_playlist_results(results)
+        if summary["failed"]:
+            messagebox.showwarning("Warning", f"Downloaded {summary['succeeded']} of {summary['total']} "
+                                              f"files, {summary['failed']} failed.")
         else:
-            if audio_file:
-                download_function = download_youtube_audio
-            else:
-                download_function = download_youtube_video
-
-        selected_quality = self.quality_options[selected_quality]
-
-        try:
-            if audio_file:
-                download_function(self.youtube_url, download_folder, file_format, start_time, end_time)
-            else:
-                download_function(self.youtube_url, download_folder, file_format, selected_quality, start_time,
-                                  end_time)
             messagebox.showinfo("Success", "Download completed successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to download media: {str(e)}")
 
-        # self.loadingbar.stop()
-        self.loading.grid_remove()
+    def on_download_failed(self, error):
+        messagebox.showerror("Error", f"Failed to download media: {error}")
+
+    # Background jobs:
+    def run_job(self, name, function, *args, on_success=None, on_error=None, show_progress=False, jobs=None,
+                **kwargs):
+        jobs = jobs or self.jobs
+        job = jobs.submit(name, function, *args, **kwargs)
+        self.job_callbacks[(jobs, job.id)] = (on_success, on_error)
+        if show_progress:
+            self.add_job_row(job.id, name)
+        return job
+
+    # Runs on the Tk main thread every 100 ms - the only place job results reach the widgets
+    def poll_jobs(self):
+        for jobs in (self.jobs, self.lookup_jobs):
+            for event, job in jobs.poll_events():
+                # Only downloads have a progress row
+                if jobs is self.jobs and job["id"] in self.job_rows:
+                    self.update_job_row(job)
+                if event not in ("done", "failed", "cancelled"):
+                    continue
+                on_success, on_error = self.job_callbacks.pop((jobs, job["id"]), (None, None))
+                if event == "done" and on_success:
+                    on_success(job["result"])
+                elif event == "failed" and on_error:
+                    on_error(job["error"])
+                elif event == "cancelled":
+                    self.loading_1.grid_remove()
+                    self.loading_2.grid_remove()
+        self.update_loading_indicator()
+        self.after(100, self.poll_jobs)
+
+    def add_job_row(self, job_id, name):
+        row_frame = customtkinter.CTkFrame(self.jobs_frame)
+        row_frame.pack(fill="x", padx=5, pady=2)
+        row_frame.grid_columnconfigure(0, weight=1)
+        label = customtkinter.CTkLabel(row_frame, text=name, anchor="w")
+        label.grid(row=0, column=0, padx=5, sticky="ew")
+        cancel_button = customtkinter.CTkButton(row_frame, text="Cancel", width=60, fg_color="transparent",
+                                                border_width=1, text_color=("gray10", "#DCE4EE"),
+                                                command=lambda: self.jobs.cancel(job_id))
+        cancel_button.grid(row=0, column=1, rowspan=2, padx=5)
+        progress_bar = customtkinter.CTkProgressBar(row_frame, mode="determinate")
+        progress_bar.set(0)
+        progress_bar.grid(row=1, column=0, padx=5, pady=(0, 5), sticky="ew")
+        self.job_rows[job_id] = {"frame": row_frame, "label": label, "progress_bar": progress_bar,
+                                 "cancel_button": cancel_button, "name": name}
+
+    def update_job_row(self, job):
+        row = self.job_rows[job["id"]]
+        row["progress_bar"].set(job["progress"])
+        if job["status"] == "running" and job["stage"]:
+            # e.g. "download 45% 12.3 MB/s ETA 00:12"
+            status = format_progress({"stage": job["stage"], "fraction": job["progress"], "rate": job["rate"],
+                                      "unit": job["unit"], "eta": job["eta"]})
+        else:
+            status = job["status"]
+        row["label"].configure(text=f"{row['name']} - {status}")
+        if job["status"] in ("done", "failed", "cancelled"):
+            row["cancel_button"].configure(state="disabled")
+            # Finished rows stay visible for a while, then make room for new ones
+            self.after(10000, lambda: self.remove_job_row(job["id"]))
+
+    def remove_job_row(self, job_id):
+        row = self.job_rows.pop(job_id, None)
+        if row:
+            row["frame"].destroy()
+
+    def update_loading_indicator(self):
+        if any(job.status in ("queued", "running") for job in self.jobs.list_jobs() if job.id in self.job_rows):
+            self.loading.grid()
+        else:
+            self.loading.grid_remove()
 
     def browse_folder(self):
         folder_selected = filedialog.askdirectory()
@@ -507,29 +675,85 @@ class App(customtkinter.CTk):
         webbrowser.open_new_tab(self.youtube_url)
 
     # Players options:
-    def play_audio(self, mp3_file_path):
-        if mp3_file_path:
+    def play_audio(self, mp3_file_path=None):
+        if self.audio_preview:
+            # Progressive preview - feed_preview queues the decoded chunks on a mixer channel as they arrive
+            if self.preview_channel is None:
+                self.preview_channel = pygame.mixer.Channel(0)
+            self.preview_channel.stop()
+            self.play_position = str_time_to_seconds(self.current_time)
+            self.audio_preview.seek(self.play_position)
+            self.is_paused = False
+            self.pause_button.configure(text="Pause")
+            self.start_time_updates()
+        elif mp3_file_path:
             pygame.mixer.music.load(mp3_file_path)
             pygame.mixer.music.play()
-            self.update_current_time()
+            self.start_time_updates()
             self.is_paused = False
 
+    # Runs every 100 ms: keeps one chunk queued behind the playing one, so playback never waits on Tk
+    def feed_preview(self):
+        if self.audio_preview and self.preview_channel and not self.is_paused:
+            while self.preview_channel.get_queue() is None:
+                chunk = self.audio_preview.read(self.play_position)
+                if chunk is None:
+                    # Not decoded yet - try again on the next tick
+                    break
+                if chunk == b"":
+                    # End of the stream
+                    break
+                sound = pygame.mixer.Sound(buffer=chunk)
+                if self.preview_channel.get_busy():
+                    self.preview_channel.queue(sound)
+                else:
+                    self.preview_channel.play(sound)
+                self.play_position += len(chunk) / self.audio_preview.bytes_per_second
+        self.after(100, self.feed_preview)
+
     def pause_audio(self):
         if self.is_paused:
-            pygame.mixer.music.unpause()
+            if self.preview_channel:
+                self.preview_channel.unpause()
+            else:
+                pygame.mixer.music.unpause()
             self.pause_button.configure(text="Pause")
             self.is_paused = False
         else:
-            pygame.mixer.music.pause()
+            if self.preview_channel:
+                self.preview_channel.pause()
+            else:
+                pygame.mixer.music.pause()
             self.pause_button.configure(text="Continue")
             self.is_paused = True
 
     def stop_audio(self):
+        if self.preview_channel:
+            self.preview_channel.stop()
         pygame.mixer.music.stop()
         self.is_paused = True
 
+    def unload_audio(self):
+        self.stop_audio()
+        pygame.mixer.music.unload()
+        if self.audio_preview:
+            self.audio_preview.close()
+            self.audio_preview = None
+        self.play_position = 0.0
+        self.current_time = '00:00'
+
+    def start_time_updates(self):
+        # One update loop for the window's lifetime, not one per Play click
+        if not self.time_updates_running:
+            self.time_updates_running = True
+            self.update_current_time()
+
     def update_current_time(self):
-        if pygame.mixer.music.get_busy():
+        if self.preview_channel:
+            busy = self.preview_channel.get_busy() and not self.is_paused
+        else:
+            busy = pygame.mixer.music.get_busy()
+        if busy:
             # Increment the current_time by 1 second
             current_minutes, current_seconds = map(int, self.current_time.split(':'))
             current_seconds += 1
@@ -546,11 +770,20 @@ class App(customtkinter.CTk):
     def on_slider_move(self, value):
         # Calculate the position in seconds based on the slider value
         position = float(value) / 100 * str_time_to_seconds(self.video_url_time)
-        pygame.mixer.music.set_pos(position)  # set_pos takes seconds
+        if self.audio_preview:
+            # Served from the buffer when it's there, otherwise only the needed part of the stream is fetched
+            self.audio_preview.seek(position)
+            if self.preview_channel:
+                self.preview_channel.stop()
+            self.play_position = position
+        else:
+            pygame.mixer.music.set_pos(position)  # set_pos takes seconds
         minutes, seconds = divmod(int(position), 60)
         self.current_time = f"{minutes:02}:{seconds:02}"
 
     def set_volume(self, value):
+        if self.preview_channel:
+            self.preview_channel.set_volume(value)
         pygame.mixer.music.set_volume(value)
 
     def change_appearance_mode_event(self, new_appearance_mode: str):
@@ -564,33 +797,23 @@ class App(customtkinter.CTk):
         self.loading_2.grid_remove()
 
     @staticmethod
-    def delete_mp3_files():
-        script_dir = os.path.dirname(os.path.abspath(__file__))  # Script path
-        download_temp_file_path = os.path.join(script_dir, "temp_mp3")
-        if not os.path.exists(download_temp_file_path):
-            os.makedirs(download_temp_file_path)
-        # List all files in the directory
-        file_list = os.listdir(download_temp_file_path)
-        # Iterate through all files
-        for file in file_list:
-            # Check if the file is a mp3 file
-            if file.endswith(".mp3"):
-                try:
-                    # Construct the full file path
-                    temp_file_path = os.path.join(download_temp_file_path, file)
-                    # Attempt to delete the file
-                    os.remove(temp_file_path)
-                    # Print success message
-                    print(f"Deleted: {temp_file_path}")
-                except Exception as e:
-                    # Print error message if deletion fails
-                    print(f"Error deleting {temp_file_path}: {e}")
+    def trim_media_cache():
+        # Previews and downloaded streams stay cached between runs, only the least recently used ones are evicted
+        cache = get_media_cache()
+        cache.evict()
+        print(f"Media cache: {cache.stats()}")
 #Todo:
     def wait_time(self):
         time.sleep(0.2)
 
+    def on_closing(self):
+        self.jobs.shutdown()
+        self.lookup_jobs.shutdown()
+        self.unload_audio()
+        self.destroy()
+
     def __del__(self):
-        self.delete_mp3_files()
+        self.trim_media_cache()
 
 
 if __name__ == "__main__":
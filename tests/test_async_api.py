@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+
+# Blocking function for the worker thread: reports progress every `interval` seconds until it is cancelled or
+# `steps` reports went through. log gets "started", then "finished" or "cancelled" (with the time it stopped).
+def report_steps(log, progress, steps=1000, interval=0.01):
+    log["started"] = time.time()
+    try:
+        for step in range(1, steps + 1):
+            time.sleep(interval)
+            progress("download", step, steps)
+    except backend.JobCancelled:
+        log["cancelled"] = time.time()
+        raise
+    log["finished"] = time.time()
+    return steps
+
+
+# Cancels the task after `delay` seconds -> the time CancelledError reached the awaiting code
+async def cancel_after(coroutine, delay):
+    task = asyncio.ensure_future(coroutine)
+    await asyncio.sleep(delay)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        return time.time()
+    raise AssertionError("the task was not cancelled")
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class CancellableProgressTest(unittest.TestCase):
+    def test_reports_until_cancelled(self):
+        reports = []
+        cancel_event = threading.Event()
+        progress = backend.cancellable_progress(lambda *update: reports.append(update), cancel_event)
+        progress("download", 1, 2)
+        cancel_event.set()
+        with self.assertRaises(backend.JobCancelled):
+            progress("download", 2, 2)
+        self.assertEqual(reports, [("download", 1, 2)])
+
+    def test_without_progress(self):
+        cancel_event = threading.Event()
+        progress = backend.cancellable_progress(None, cancel_event)
+        progress("convert", 1, 2)
+        cancel_event.set()
+        with self.assertRaises(backend.JobCancelled):
+            progress("convert", 2, 2)
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class RunCancellableTest(unittest.TestCase):
+    def test_result(self):
+        log = {}
+        progress = backend.cancellable_progress(None, threading.Event())
+        result = asyncio.run(backend.run_cancellable(report_steps, log, progress, 3, cancel_event=threading.Event()))
+        self.assertEqual(result, 3)
+        self.assertIn("finished", log)
+
+    def test_cancel_stops_the_worker_thread(self):
+        log = {}
+        cancel_event = threading.Event()
+        progress = backend.cancellable_progress(None, cancel_event)
+        threads_before = threading.active_count()
+        cancelled_at = asyncio.run(cancel_after(
+            backend.run_cancellable(report_steps, log, progress, cancel_event=cancel_event), 0.1))
+
+        self.assertTrue(cancel_event.is_set())
+        # The thread stopped at its next progress report, before CancelledError reached the caller
+        self.assertIn("cancelled", log)
+        self.assertNotIn("finished", log)
+        self.assertLessEqual(log["cancelled"], cancelled_at)
+        self.assertLess(cancelled_at - log["started"], 5)
+        self.assertLessEqual(threading.active_count(), threads_before)
+
+    def test_shield_waits_for_the_running_work(self):
+        # The function doesn't look at the cancel event for 0.5 s - the cancelled coroutine waits for it instead of
+        # leaving it running in the background
+        log = {}
+        cancel_event = threading.Event()
+        progress = backend.cancellable_progress(None, cancel_event)
+        cancelled_at = asyncio.run(cancel_after(
+            backend.run_cancellable(report_steps, log, progress, 1000, 0.5, cancel_event=cancel_event), 0.1))
+        self.assertIn("cancelled", log)
+        self.assertGreaterEqual(log["cancelled"] - log["started"], 0.5)
+        self.assertLessEqual(log["cancelled"], cancelled_at)
+
+    def test_without_cancel_event_the_work_is_finished(self):
+        log = {}
+        progress = backend.cancellable_progress(None, threading.Event())
+        cancelled_at = asyncio.run(cancel_after(backend.run_cancellable(report_steps, log, progress, 5, 0.05), 0.05))
+        self.assertIn("finished", log)
+        self.assertLessEqual(log["finished"], cancelled_at)
+
+
+if backend is not None:
+    # MediaTask whose fetch reports progress until it is cancelled
+    class BlockingTask(backend.MediaTask):
+        def __init__(self, log, progress):
+            super().__init__("blocking", [], progress=progress)
+            self.log = log
+
+        def fetch(self):
+            report_steps(self.log, self.progress)
+            return self
+
+        def finish(self, convert=None):
+            self.log["converted"] = True
+            return "output.mp3"
+
+        def close(self):
+            self.log["closed"] = True
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class RunMediaTaskAsyncTest(unittest.TestCase):
+    def test_cancel_closes_the_task(self):
+        log = {}
+        cancel_event = threading.Event()
+        task = BlockingTask(log, backend.cancellable_progress(None, cancel_event))
+        asyncio.run(cancel_after(backend.run_media_task_async(task, cancel_event), 0.1))
+        self.assertIn("cancelled", log)
+        self.assertNotIn("converted", log)
+        self.assertTrue(log["closed"])
+
+    def test_error_message(self):
+        # prepare_* gives a message instead of a task for an invalid URL
+        self.assertEqual(asyncio.run(backend.run_media_task_async("Invalid YouTube URL", threading.Event())),
+                         "Invalid YouTube URL")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+range_size = 64 * 1024
+file_size = 10 * range_size + 12345  # the last range is a short one
+
+
+# Serves server.data and honours single byte ranges ("bytes=start-end") unless server.ignore_range is set.
+# server.drop_after makes every response after that many requests stop halfway and close the connection.
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        byte_range = self.headers.get("Range")
+        with server.lock:
+            server.requests.append(byte_range)
+            request_number = len(server.requests)
+        if byte_range is None or server.ignore_range:
+            start, end, status = 0, len(data) - 1, 200
+        else:
+            start, end = (int(value) for value in byte_range.split("=", 1)[1].split("-"))
+            end, status = min(end, len(data) - 1), 206
+        body = data[start:end + 1]
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{server.reported_size or len(data)}")
+        if server.etag:
+            self.send_header("ETag", server.etag)
+        self.end_headers()
+        if server.drop_after is not None and request_number > server.drop_after:
+            # Half of the range, then the connection goes away
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_range_server(data, etag='"v1"'):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    server.daemon_threads = True
+    server.data = data
+    server.etag = etag
+    server.reported_size = None
+    server.drop_after = None
+    server.ignore_range = False
+    server.requests = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Progress callback recording the ("download", done, total) calls
+class ProgressLog:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, stage, done, total):
+        with self.lock:
+            self.calls.append((stage, done, total))
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class RangeServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(file_size)
+        self.server = start_range_server(self.data)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/stream"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.temp_dir.name, "stream.bin")
+        self.part_file = f"{self.output_file}.part"
+        # No retries - a dropped connection has to surface as an error
+        self.previous_transport = backend.set_transport(backend.HttpTransport(retries=0, timeout=(5, 5)))
+
+    def tearDown(self):
+        backend.set_transport(self.previous_transport).close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def download(self, connections, progress=None):
+        return backend.download_ranges(self.url, self.output_file, len(self.data), connections, progress,
+                                       range_size=range_size)
+
+    def read_output(self):
+        with open(self.output_file, 'rb') as output_handle:
+            return output_handle.read()
+
+
+class DownloadRangesTest(RangeServerTestCase):
+    def check_download(self, connections):
+        progress = ProgressLog()
+        self.assertEqual(self.download(connections, progress), self.output_file)
+        self.assertEqual(self.read_output(), self.data)
+        self.assertFalse(os.path.exists(self.part_file))
+        self.assertFalse(os.path.exists(f"{self.part_file}.json"))
+        # One request per range, every range requested once
+        self.assertEqual(len(self.server.requests), len(backend.missing_ranges([], len(self.data), range_size)))
+        self.assertEqual(len(set(self.server.requests)), len(self.server.requests))
+
+        done_values = [done for _, done, _ in progress.calls]
+        self.assertEqual({stage for stage, _, _ in progress.calls}, {"download"})
+        self.assertEqual({total for _, _, total in progress.calls}, {len(self.data)})
+        self.assertEqual(done_values, sorted(done_values))
+        self.assertEqual(done_values[-1], len(self.data))
+
+    def test_one_connection(self):
+        self.check_download(1)
+
+    def test_parallel_connections(self):
+        self.check_download(4)
+
+    def test_more_connections_than_ranges(self):
+        self.check_download(32)
+
+    def test_size_mismatch_is_rejected(self):
+        # The server reports another total size in Content-Range than the stream metadata
+        self.server.reported_size = len(self.data) + 1
+        with self.assertRaises(backend.DownloadChanged):
+            self.download(4)
+        self.assertFalse(os.path.exists(self.output_file))
+
+    def test_server_ignoring_range_is_rejected(self):
+        self.server.ignore_range = True
+        with self.assertRaisesRegex(IOError, "ignored the Range request"):
+            self.download(2)
+        self.assertFalse(os.path.exists(self.output_file))
+
+    def test_download_stream(self):
+        # A pytube stream of known size goes through the ranged download
+        stream = SimpleNamespace(url=self.url, filesize=len(self.data), itag=140, mime_type="audio/mp4",
+                                 video_codec=None, audio_codec="mp4a.40.2")
+        progress = ProgressLog()
+        backend.download_stream(stream, self.output_file, progress, connections=3)
+        self.assertEqual(self.read_output(), self.data)
+        self.assertEqual(progress.calls[-1], ("download", len(self.data), len(self.data)))
+
+
+# Interrupted and resumed downloads: the .part file and its manifest
+class ResumeDownloadTest(RangeServerTestCase):
+    # A first run over one connection whose 4th request loses the connection halfway -> the manifest it left
+    def interrupted_download(self):
+        self.server.drop_after = 3
+        with self.assertRaises(IOError):
+            self.download(1)
+        self.server.drop_after = None
+        self.assertFalse(os.path.exists(self.output_file))
+        with open(f"{self.part_file}.json", 'r') as manifest_handle:
+            return json.load(manifest_handle)
+
+    def assert_complete(self):
+        self.assertEqual(self.read_output(), self.data)
+        self.assertFalse(os.path.exists(self.part_file))
+        self.assertFalse(os.path.exists(f"{self.part_file}.json"))
+
+    def test_resume_after_dropped_connection(self):
+        manifest = self.interrupted_download()
+        self.assertEqual(manifest["size"], len(self.data))
+        self.assertEqual(manifest["etag"], '"v1"')
+        self.assertEqual(len(manifest["ranges"]), 1)
+        self.assertEqual(manifest["ranges"][0][0], 0)
+        self.assertGreaterEqual(manifest["ranges"][0][1], 3 * range_size - 1)
+
+        first_run_requests = len(self.server.requests)
+        progress = ProgressLog()
+        self.download(4, progress)
+        self.assert_complete()
+        # Only the missing ranges are fetched, and the resumed bytes count as done from the start
+        missing = backend.missing_ranges(manifest["ranges"], len(self.data), range_size)
+        resumed_requests = self.server.requests[first_run_requests:]
+        self.assertEqual(sorted(resumed_requests), sorted(f"bytes={start}-{end}" for start, end in missing))
+        self.assertEqual(progress.calls[0][1], manifest["ranges"][0][1] + 1)
+        self.assertEqual(progress.calls[-1][1], len(self.data))
+
+    def test_restart_on_etag_change(self):
+        self.interrupted_download()
+        first_run_requests = len(self.server.requests)
+        self.server.data = self.data = os.urandom(file_size)
+        self.server.etag = '"v2"'
+        self.download(4)
+        self.assert_complete()
+        # Started over from the first byte
+        self.assertIn(f"bytes=0-{range_size - 1}", self.server.requests[first_run_requests:])
+
+    def test_restart_on_size_change(self):
+        # The stream got another Content-Length - the manifest of the old size is stale
+        self.interrupted_download()
+        first_run_requests = len(self.server.requests)
+        self.server.data = self.data = os.urandom(file_size + 1000)
+        self.download(4)
+        self.assert_complete()
+        self.assertIn(f"bytes=0-{range_size - 1}", self.server.requests[first_run_requests:])
+
+    def test_corrupt_manifest_is_discarded(self):
+        self.interrupted_download()
+        with open(f"{self.part_file}.json", 'w') as manifest_handle:
+            manifest_handle.write('{"size": ')
+        first_run_requests = len(self.server.requests)
+        self.download(4)
+        self.assert_complete()
+        self.assertEqual(len(self.server.requests) - first_run_requests,
+                         len(backend.missing_ranges([], len(self.data), range_size)))
+
+    def test_part_file_of_other_size_is_discarded(self):
+        self.interrupted_download()
+        with open(self.part_file, 'r+b') as part_handle:
+            part_handle.truncate(len(self.data) // 2)
+        first_run_requests = len(self.server.requests)
+        self.download(4)
+        self.assert_complete()
+        self.assertEqual(len(self.server.requests) - first_run_requests,
+                         len(backend.missing_ranges([], len(self.data), range_size)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+frame_rate = 25
+duration = 8
+
+
+# The ffmpeg renders report video outputs as the "encode" stage in frames and audio outputs as "convert" in seconds
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class FfmpegProgressTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.video_file = os.path.join(cls.temp_dir.name, "clip.mp4")
+        cls.audio_file = os.path.join(cls.temp_dir.name, "tone.flac")
+        ffmpeg = [backend.get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error"]
+        subprocess.run([*ffmpeg, "-f", "lavfi", "-i", f"testsrc=size=320x240:rate={frame_rate}:duration={duration}",
+                        "-f", "lavfi", "-i", f"sine=duration={duration}", "-c:v", "libx264", "-g", "50",
+                        "-c:a", "aac", "-shortest", cls.video_file], check=True)
+        subprocess.run([*ffmpeg, "-f", "lavfi", "-i", f"sine=duration={duration}", "-c:a", "flac", cls.audio_file],
+                       check=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def render(self, function, *args):
+        reports = []
+        function(*args, progress=lambda *update: reports.append(update))
+        self.assertTrue(reports)
+        done_values = [done for _, done, _ in reports]
+        self.assertEqual(done_values, sorted(done_values))
+        return reports
+
+    def test_probe_frame_rate(self):
+        self.assertEqual(backend.probe_media(self.video_file)["frame_rate"], frame_rate)
+        self.assertIsNone(backend.probe_media(self.audio_file)["frame_rate"])
+
+    def test_remux_reports_frames(self):
+        # Stream copy - ffmpeg has no frame counter, the frames are counted from the output time
+        reports = self.render(backend.render_video, self.video_file, None,
+                              os.path.join(self.temp_dir.name, "remux.mkv"))
+        self.assertEqual({(stage, total) for stage, _, total in reports}, {("encode", duration * frame_rate)})
+        self.assertGreater(reports[-1][1], (duration - 1) * frame_rate)
+
+    def test_reencoded_cut_reports_frames(self):
+        # A cut within one GOP is re-encoded - the frame= counter of the encoder
+        reports = self.render(backend.render_video, self.video_file, None,
+                              os.path.join(self.temp_dir.name, "cut.mkv"), 0.5, 1.5)
+        self.assertEqual({(stage, total) for stage, _, total in reports}, {("encode", frame_rate)})
+        self.assertGreaterEqual(reports[-1][1], frame_rate - 1)
+
+    def test_audio_reports_seconds(self):
+        reports = self.render(backend.render_audio, self.audio_file, os.path.join(self.temp_dir.name, "tone.wav"))
+        self.assertEqual({stage for stage, _, _ in reports}, {"convert"})
+        self.assertAlmostEqual(reports[-1][1], duration, delta=0.5)
+
+    def test_offset_in_frames(self):
+        reports = []
+        progress = backend.offset_progress(lambda *update: reports.append(update), 2.0, frame_rate)
+        progress("encode", 10, 200)
+        self.assertEqual(reports, [("encode", 2 * frame_rate + 10, 200)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+video_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class JobServerTest(unittest.TestCase):
+    def setUp(self):
+        # The jobs don't download anything: a url ending in "block" reports progress until `release` is set, one
+        # ending in "fail" fails, every other one is done at once
+        self.release = threading.Event()
+        self.previous_run_server_job = backend.run_server_job
+        backend.run_server_job = self.fake_job
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.temp_dir.name)
+        self.server = backend.JobServer(("127.0.0.1", 0), self.root, workers=1, max_queued=3)
+        self.server.manager.progress_interval = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        backend.run_server_job = self.previous_run_server_job
+        self.temp_dir.cleanup()
+
+    def fake_job(self, entry, download_path, trim_mode="accurate", progress=None, settings=None):
+        if entry["url"].endswith("fail"):
+            raise RuntimeError("No video")
+        while entry["url"].endswith("block") and not self.release.wait(0.02):
+            progress("download", 1, 10)
+        return [os.path.join(download_path, "song.mp3")]
+
+    def connect(self):
+        return http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=10)
+
+    # -> (status, headers, decoded JSON body)
+    def request(self, method, path, body=None, headers=None):
+        connection = self.connect()
+        try:
+            if body is not None and not isinstance(body, bytes):
+                body = json.dumps(body).encode()
+            connection.request(method, path, body, headers or {})
+            response = connection.getresponse()
+            return response.status, response.headers, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def submit(self, url=video_url, **row):
+        return self.request("POST", "/jobs", dict(row, url=url, format="mp3"))
+
+    def wait_for_status(self, job_id, statuses, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.server.manager.get(job_id)
+            if job.status in statuses:
+                return job
+            time.sleep(0.02)
+        self.fail(f"Job {job_id} is {self.server.manager.get(job_id).status}, expected {statuses}")
+
+    def test_submit_job(self):
+        status, headers, job = self.submit()
+        self.assertEqual(status, 202)
+        self.assertEqual(headers["Location"], f"/jobs/{job['id']}")
+        self.assertEqual(self.wait_for_status(job["id"], ["done"]).result, [os.path.join(self.root, "song.mp3")])
+        status, _, job = self.request("GET", headers["Location"])
+        self.assertEqual((status, job["status"]), (200, "done"))
+
+    def test_submit_list(self):
+        status, _, results = self.request("POST", "/jobs", [{"url": video_url}, {"format": "mp3"}])
+        self.assertEqual(status, 202)
+        self.assertIn("id", results[0])
+        self.assertEqual(results[1], {"error": "A job needs a url or an author and a title"})
+        status, _, results = self.request("POST", "/jobs", [{"format": "mp3"}])
+        self.assertEqual(status, 400)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.request("POST", "/jobs", b"{not json")[0], 400)
+        self.assertEqual(self.request("POST", "/jobs", "just a string")[0], 400)
+        self.assertEqual(self.submit(trim_mode="sloppy")[0], 400)
+        self.assertEqual(self.request("POST", "/other", {})[0], 404)
+        self.assertEqual(self.request("GET", "/jobs/12345")[0], 404)
+        self.assertEqual(self.request("GET", "/jobs/abc")[0], 404)
+        self.assertEqual(self.request("DELETE", "/jobs/12345")[0], 404)
+
+    def test_body_size(self):
+        connection = self.connect()
+        try:
+            # No Content-Length
+            connection.putrequest("POST", "/jobs")
+            connection.endheaders()
+            response = connection.getresponse()
+            self.assertEqual(response.status, 411)
+            response.read()
+        finally:
+            connection.close()
+        status, _, _ = self.request("POST", "/jobs", b"", {"Content-Length": str(backend.server_max_body + 1)})
+        self.assertEqual(status, 413)
+
+    def test_too_many_jobs(self):
+        # One running + two waiting reach max_queued=3
+        job_ids = [self.submit(video_url + "&block")[2]["id"] for _ in range(3)]
+        status, _, result = self.submit()
+        self.assertEqual(status, 429)
+        self.assertIn("Too many jobs", result["error"])
+        self.release.set()
+        for job_id in job_ids:
+            self.wait_for_status(job_id, ["done"])
+        self.assertEqual(self.submit()[0], 202)
+
+    def test_download_path_outside_root_is_rejected(self):
+        for download_path in ["..", "../elsewhere", "a/../../elsewhere", "/tmp"]:
+            status, _, result = self.submit(download_path=download_path)
+            self.assertEqual(status, 400, download_path)
+            self.assertIn("must be inside", result["error"])
+        self.assertEqual(self.submit(download_path=42)[0], 400)
+        self.assertEqual(self.server.manager.list_jobs(), [])
+
+    def test_download_path_is_created(self):
+        status, _, job = self.submit(download_path="new/dir")
+        self.assertEqual(status, 202)
+        self.assertTrue(os.path.isdir(os.path.join(self.root, "new", "dir")))
+        self.assertEqual(self.wait_for_status(job["id"], ["done"]).result,
+                         [os.path.join(self.root, "new", "dir", "song.mp3")])
+        # A file where the directory should be
+        with open(os.path.join(self.root, "taken"), 'w'):
+            pass
+        status, _, result = self.submit(download_path="taken/dir")
+        self.assertEqual(status, 400)
+        self.assertIn("Invalid download_path", result["error"])
+
+    def test_list_jobs_by_status(self):
+        done_id = self.submit()[2]["id"]
+        self.wait_for_status(done_id, ["done"])
+        failed_id = self.submit(video_url + "&fail")[2]["id"]
+        self.assertEqual(self.wait_for_status(failed_id, ["failed"]).error, "No video")
+
+        status, _, jobs = self.request("GET", "/jobs")
+        self.assertEqual((status, [job["id"] for job in jobs]), (200, [done_id, failed_id]))
+        _, _, jobs = self.request("GET", "/jobs?status=failed")
+        self.assertEqual([job["id"] for job in jobs], [failed_id])
+        _, _, jobs = self.request("GET", "/jobs?status=done&status=failed")
+        self.assertEqual(len(jobs), 2)
+
+    def test_cancel(self):
+        running_id = self.submit(video_url + "&block")[2]["id"]
+        self.wait_for_status(running_id, ["running"])
+        queued_id = self.submit(video_url + "&block")[2]["id"]
+
+        # Not started yet - cancelled right away
+        status, _, job = self.request("DELETE", f"/jobs/{queued_id}")
+        self.assertEqual((status, job["status"]), (200, "cancelled"))
+        # Running - stops at its next progress report
+        status, _, job = self.request("DELETE", f"/jobs/{running_id}")
+        self.assertEqual(status, 202)
+        self.wait_for_status(running_id, ["cancelled"])
+
+        # Nothing left to cancel
+        status, _, result = self.request("DELETE", f"/jobs/{running_id}")
+        self.assertEqual((status, result["job"]["status"]), (409, "cancelled"))
+        done_id = self.submit()[2]["id"]
+        self.wait_for_status(done_id, ["done"])
+        status, _, result = self.request("DELETE", f"/jobs/{done_id}")
+        self.assertEqual((status, result["job"]["status"]), (409, "done"))
+
+    def test_events_of_one_job(self):
+        other_id = self.submit(video_url + "&block")[2]["id"]
+        self.wait_for_status(other_id, ["running"])
+        connection = self.connect()
+        try:
+            connection.request("GET", f"/events?job={other_id + 1}")
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+            deadline = time.time() + 5
+            while not self.server.subscribers and time.time() < deadline:
+                time.sleep(0.02)
+
+            job_id = self.submit()[2]["id"]
+            self.assertEqual(job_id, other_id + 1)
+            # The running job keeps reporting progress, none of it shows up in this stream
+            time.sleep(0.2)
+            self.release.set()
+            events = []
+            while not events or events[-1] != "done":
+                event = json.loads(response.fp.readline())
+                self.assertEqual(event["job"]["id"], job_id)
+                events.append(event["event"])
+            self.assertEqual(events[0], "queued")
+            self.assertIn("started", events)
+        finally:
+            connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
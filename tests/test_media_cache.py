@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class MediaCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = backend.MediaCache(self.temp_dir.name, 1024 * 1024)
+        self.created = []
+        self.create_delay = 0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create(self, temp_path):
+        self.created.append(temp_path)
+        time.sleep(self.create_delay)
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(b"x" * 100)
+
+    def read_entry(self, key, paths):
+        with self.cache.entry(key, "m4a", self.create) as path:
+            paths.append(path)
+
+    def test_concurrent_callers_create_once(self):
+        # Slow enough for the other callers to queue up on the key
+        self.create_delay = 0.1
+        paths = []
+        threads = [threading.Thread(target=self.read_entry, args=("key", paths)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(paths, [self.cache.path_for("key", "m4a")] * 5)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+    def test_key_locks_are_dropped(self):
+        # Every key once - the per-key locks must not pile up
+        for index in range(50):
+            self.read_entry(f"key{index}", [])
+        self.read_entry("key0", [])
+        self.assertEqual(self.cache._key_locks, {})
+        self.assertEqual(self.cache._key_lock_users, {})
+        self.assertEqual(self.cache._pins, {})
+
+    def test_failed_create_releases_the_key(self):
+        def fail(temp_path):
+            raise RuntimeError("download failed")
+
+        with self.assertRaises(RuntimeError):
+            with self.cache.entry("key", "m4a", fail):
+                pass
+        self.assertEqual(self.cache._key_locks, {})
+        self.assertEqual(self.cache._pins, {})
+        # The next caller creates it
+        self.read_entry("key", [])
+        self.assertEqual(len(self.created), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
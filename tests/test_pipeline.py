@@ -0,0 +1,168 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+
+# Render function for the conversion processes: `steps` progress reports, `delay` seconds apart -> its process id
+def count_steps(steps, delay, progress=None):
+    for step in range(1, steps + 1):
+        time.sleep(delay)
+        progress("convert", step, steps)
+    return os.getpid()
+
+
+def settings_value(name, settings=None):
+    return getattr(settings, name)
+
+
+if backend is not None:
+    # MediaTask whose fetch only records itself and whose conversion waits for `release`
+    class FakeTask(backend.MediaTask):
+        def __init__(self, name, log, release):
+            super().__init__(name, [])
+            self.name = name
+            self.log = log
+            self.release = release
+
+        def fetch(self):
+            with self.log["lock"]:
+                self.log["fetched"].append(self.name)
+            return self
+
+        def finish(self, convert=None):
+            self.release.wait(10)
+            return self.name
+
+        def close(self):
+            with self.log["lock"]:
+                self.log["closed"].append(self.name)
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class PlaylistProgressTest(unittest.TestCase):
+    def test_item_fraction_never_goes_backwards(self):
+        reports = []
+        playlist_progress = backend.PlaylistProgress(lambda stage, done, total: reports.append((done, total)), 2)
+        item = playlist_progress.item(0)
+        # Download, then the conversion starting again at 0 (and a second ffmpeg run starting over once more)
+        for stage, done, total in [("download", 50, 100), ("download", 100, 100), ("convert", 0, 10),
+                                   ("convert", 5, 10), ("convert", 1, 10), ("convert", 10, 10), ("playlist", 1, 1)]:
+            item(stage, done, total)
+        done_values = [done for done, _ in reports]
+        self.assertEqual(done_values, sorted(done_values))
+        self.assertEqual(reports[-1], (1.0, 2))
+        self.assertAlmostEqual(done_values[1], backend.item_stage_shares["download"][1])
+
+    def test_items_add_up(self):
+        reports = []
+        playlist_progress = backend.PlaylistProgress(lambda stage, done, total: reports.append(done), 3)
+        playlist_progress.item(0)("playlist", 1, 1)
+        playlist_progress.item(2)("download", 1, 2)
+        self.assertAlmostEqual(reports[-1], 1 + backend.item_stage_shares["download"][1] / 2)
+
+    def test_no_callback_without_progress(self):
+        self.assertIsNone(backend.PlaylistProgress(None, 1).item(0))
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class MediaPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.log = {"fetched": [], "closed": [], "lock": threading.Lock()}
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def test_back_pressure(self):
+        # One converter, one pending slot, 3 fetchers: with the converter stuck, at most 1 converting + 1 pending
+        # + 3 fetched and waiting to be queued - the other items are not fetched
+        with backend.MediaPipeline(3, 1, 1) as pipeline:
+            futures = [pipeline.submit(FakeTask, index, self.log, self.release) for index in range(10)]
+            self.assertTrue(self.wait_for(lambda: len(self.log["fetched"]) == 5))
+            time.sleep(0.3)
+            self.assertEqual(len(self.log["fetched"]), 5)
+            self.release.set()
+            self.assertEqual([future.result(10) for future in futures], list(range(10)))
+        self.assertEqual(sorted(self.log["fetched"]), list(range(10)))
+        self.assertTrue(all(future.finished_at >= future.started_at >= future.created_at for future in futures))
+
+    def test_result_that_is_no_task(self):
+        with backend.MediaPipeline(2, 1) as pipeline:
+            self.assertEqual(pipeline.submit(lambda: "Invalid YouTube URL").result(10), "Invalid YouTube URL")
+
+    def test_cancel(self):
+        pipeline = backend.MediaPipeline(2, 1, 1)
+        futures = [pipeline.submit(FakeTask, index, self.log, self.release) for index in range(6)]
+        self.assertTrue(self.wait_for(lambda: len(self.log["fetched"]) == 4))
+        stopper = threading.Thread(target=pipeline.shutdown, kwargs={"cancel": True})
+        stopper.start()
+        # The fetched items that never reached the converter are closed (unpinned)
+        self.assertTrue(self.wait_for(lambda: len(self.log["closed"]) == 3))
+        self.release.set()
+        stopper.join(10)
+        self.assertFalse(stopper.is_alive())
+
+        # The running conversion finishes, everything else is cancelled
+        self.assertEqual(futures[0].result(10), 0)
+        for future in futures[1:]:
+            self.assertTrue(future.cancelled() or isinstance(future.exception(10), backend.JobCancelled))
+        self.assertEqual(sorted(self.log["fetched"]), [0, 1, 2, 3])
+        self.assertEqual(sorted(self.log["closed"]), [1, 2, 3])
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class ConvertInProcessTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = backend.get_convert_executor()
+
+    def test_progress_crosses_the_process_boundary(self):
+        reports = []
+        pid = backend.convert_in_process(self.executor, count_steps, 5, 0.01,
+                                         progress=lambda *update: reports.append(update))
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(reports, [("convert", step, 5) for step in range(1, 6)])
+
+    def test_cancel_stops_the_worker(self):
+        def cancel_at_second_step(stage, done, total):
+            if done >= 2:
+                raise backend.JobCancelled()
+
+        start = time.time()
+        with self.assertRaises(backend.JobCancelled):
+            backend.convert_in_process(self.executor, count_steps, 1000, 0.01, progress=cancel_at_second_step)
+        # 1000 steps would take 10 s - the worker stopped at its next report
+        self.assertLess(time.time() - start, 5)
+        # The pool is still usable afterwards
+        self.assertNotEqual(backend.convert_in_process(self.executor, os.getpid), os.getpid())
+
+    def test_settings_snapshot_is_passed(self):
+        settings = backend.load_settings(overrides={"download_connections": "13"})
+        self.assertEqual(backend.convert_in_process(self.executor, settings_value, "download_connections",
+                                                    settings=settings), 13)
+
+    def test_pool_is_shared(self):
+        self.assertIs(backend.get_convert_executor(), self.executor)
+        pipeline = backend.MediaPipeline(1, 1)
+        pipeline.shutdown()
+        self.assertIs(backend.get_convert_executor(), self.executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+sample_rate = 22050
+short_duration = 60
+long_duration = 3600  # decoded to PCM that is ~160 MB - far more than ffmpeg needs when streaming
+rss_tolerance = 16 * 1024 * 1024
+
+# Renders one file in a fresh interpreter and prints the peak RSS (bytes) of that process before and after the
+# render, and the peak RSS of ffmpeg (RUSAGE_CHILDREN of the small process the benchmark's ffmpeg wrapper starts it
+# from - forked straight from this interpreter it would report the RSS of the interpreter)
+measure_script = """
+import os, resource, sys, tempfile
+import backend, benchmark
+
+start_time = float(sys.argv[3]) if sys.argv[3] else None
+end_time = float(sys.argv[4]) if sys.argv[4] else None
+with tempfile.TemporaryDirectory() as work_dir:
+    rss_file = os.path.join(work_dir, "ffmpeg_rss.txt")
+    benchmark.install_ffmpeg_wrapper(work_dir, rss_file)
+    before = benchmark.peak_rss_bytes(resource.RUSAGE_SELF)
+    backend.render_audio(sys.argv[1], sys.argv[2], start_time, end_time)
+    children = max(int(line) for line in benchmark.load_lines(rss_file))
+print(before, benchmark.peak_rss_bytes(resource.RUSAGE_SELF), children)
+"""
+
+
+def generate_tone(file_path, duration):
+    subprocess.run([backend.get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                    "-i", f"sine=frequency=440:sample_rate={sample_rate}:duration={duration}", "-ac", "1",
+                    "-c:a", "flac", file_path], check=True)
+
+
+def measure_render(input_file, output_file, start_time=None, end_time=None):
+    result = subprocess.run([sys.executable, "-c", measure_script, input_file, output_file,
+                             "" if start_time is None else str(start_time), "" if end_time is None else str(end_time)],
+                            cwd=repo_dir, stdout=subprocess.PIPE, check=True)
+    self_before, self_after, children = (int(value) for value in result.stdout.split()[-3:])
+    return self_after - self_before, children
+
+
+# The audio renders stream through ffmpeg (seek, then decode/encode in chunks), so the peak memory must not grow with
+# the length of the track
+@unittest.skipIf(backend is None or resource is None, "needs the backend dependencies and the resource module")
+class RenderAudioMemoryTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.short_file = os.path.join(cls.temp_dir.name, "short.flac")
+        cls.long_file = os.path.join(cls.temp_dir.name, "long.flac")
+        generate_tone(cls.short_file, short_duration)
+        generate_tone(cls.long_file, long_duration)
+        cls.short_growth, cls.short_peak = measure_render(cls.short_file,
+                                                          os.path.join(cls.temp_dir.name, "short.wav"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def assert_flat(self, growth, peak):
+        decoded_bytes = long_duration * sample_rate * 2
+        self.assertLess(growth, rss_tolerance)
+        self.assertLess(peak, self.short_peak + rss_tolerance)
+        self.assertLess(peak, decoded_bytes)
+
+    def test_convert_long_track(self):
+        self.assert_flat(*measure_render(self.long_file, os.path.join(self.temp_dir.name, "long.wav")))
+
+    def test_trim_long_track(self):
+        self.assert_flat(*measure_render(self.long_file, os.path.join(self.temp_dir.name, "trimmed.wav"),
+                                         long_duration / 2, long_duration - 60))
+
+    def test_m4r_from_long_track(self):
+        self.assert_flat(*measure_render(self.long_file, os.path.join(self.temp_dir.name, "ringtone.m4r"),
+                                         long_duration - 40, long_duration - 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+try:
+    import backend
+except ImportError:
+    backend = None
+
+
+# Local stand-in for the search.list method of the YouTube Data API: the video id is derived from the query,
+# a query containing "nothing" finds no video and one containing "broken" gets a 500.
+# Every request is recorded in server.queries.
+class SearchApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        q = query.get("q", [""])[0]
+        with self.server.lock:
+            self.server.queries.append(q)
+        if not url.path.endswith("/search") or query.get("key") != ["test-key"]:
+            self.send_json(404, {"error": {"code": 404, "message": f"Unexpected request {self.path}"}})
+        elif "broken" in q:
+            self.send_json(500, {"error": {"code": 500, "message": "Backend error"}})
+        elif "nothing" in q:
+            self.send_json(200, {"kind": "youtube#searchListResponse", "items": []})
+        else:
+            self.send_json(200, {"kind": "youtube#searchListResponse",
+                                 "items": [{"id": {"kind": "youtube#video", "videoId": self.video_id(q)}}]})
+
+    @staticmethod
+    def video_id(q):
+        return "v-" + "-".join(q.casefold().split())
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@unittest.skipIf(backend is None, "needs the backend dependencies")
+class SearchClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SearchApiHandler)
+        self.server.daemon_threads = True
+        self.server.queries = []
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_endpoint = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # No retries - the failing search must reach the stand-in once
+        self.previous_transport = backend.set_transport(backend.HttpTransport(retries=0, timeout=(5, 5)))
+        self.previous_client = backend.search_client
+
+    def tearDown(self):
+        backend.search_client = self.previous_client
+        backend.set_transport(self.previous_transport).close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def client(self, **kwargs):
+        return backend.SearchClient("test-key", api_endpoint=self.api_endpoint, **kwargs)
+
+    def test_search(self):
+        client = self.client()
+        self.assertEqual(client.search("Queen", "Bohemian Rhapsody"), "v-bohemian-rhapsody-queen")
+        self.assertEqual(self.server.queries, ["Bohemian Rhapsody Queen"])
+        self.assertEqual(client.stats(), {"hits": 0, "misses": 1, "entries": 1, "quota_used": 100})
+
+    def test_cache_hit_within_ttl(self):
+        client = self.client(ttl=0.5)
+        video_id = client.search("Queen", "Bohemian Rhapsody")
+        # Another spelling of the same query
+        self.assertEqual(client.search(" queen ", "BOHEMIAN  rhapsody"), video_id)
+        self.assertEqual(len(self.server.queries), 1)
+        self.assertEqual(client.stats()["hits"], 1)
+        self.assertEqual(client.quota_used, 100)
+        # Expired - searched again
+        time.sleep(0.6)
+        self.assertEqual(client.search("Queen", "Bohemian Rhapsody"), video_id)
+        self.assertEqual(len(self.server.queries), 2)
+        self.assertEqual(client.quota_used, 200)
+
+    def test_not_found_is_cached(self):
+        client = self.client()
+        self.assertIsNone(client.search("Nobody", "nothing at all"))
+        self.assertIsNone(client.search("Nobody", "nothing at all"))
+        self.assertEqual(len(self.server.queries), 1)
+        self.assertEqual(client.stats(), {"hits": 1, "misses": 1, "entries": 1, "quota_used": 100})
+
+    def test_failed_search_is_charged_and_not_cached(self):
+        client = self.client()
+        with self.assertRaises(Exception):
+            client.search("Someone", "broken song")
+        self.assertEqual(client.quota_used, 100)
+        self.assertEqual(client.stats()["entries"], 0)
+
+    def test_search_many(self):
+        client = self.client()
+        pairs = [("Queen", "Bohemian Rhapsody"), ("ABBA", "Waterloo"), ("queen", "bohemian rhapsody"),
+                 ("Nobody", "nothing at all"), ("Someone", "broken song"), ("ABBA", "Waterloo")]
+        video_ids = client.search_many(pairs, workers=3)
+        self.assertEqual(video_ids, ["v-bohemian-rhapsody-queen", "v-waterloo-abba", "v-bohemian-rhapsody-queen",
+                                     None, None, "v-waterloo-abba"])
+        # Repeated names are searched once, 100 units per search.list request sent
+        self.assertEqual(sorted(query.casefold() for query in self.server.queries),
+                         ["bohemian rhapsody queen", "broken song someone", "nothing at all nobody",
+                          "waterloo abba"])
+        self.assertEqual(client.quota_used, 4 * backend.search_quota_costs["search.list"])
+
+        client.search_many(pairs[:4])
+        self.assertEqual(len(self.server.queries), 4)
+        self.assertEqual(client.quota_used, 400)
+
+    def test_find_urls_by_names(self):
+        backend.search_client = self.client()
+        urls = backend.find_urls_by_names([("ABBA", "Waterloo"), ("Nobody", "nothing at all"),
+                                           ("abba", "waterloo")], workers=2)
+        self.assertEqual(urls, ["https://www.youtube.com/watch?v=v-waterloo-abba", None,
+                                "https://www.youtube.com/watch?v=v-waterloo-abba"])
+        self.assertEqual(backend.find_url_by_name("ABBA", "Waterloo"),
+                         "https://www.youtube.com/watch?v=v-waterloo-abba")
+        self.assertEqual(len(self.server.queries), 2)
+        self.assertEqual(backend.search_client.quota_used, 200)
+
+    def test_persisted_cache(self):
+        persist_path = os.path.join(self.temp_dir.name, "cache", "search.json")
+        client = self.client(persist_path=persist_path)
+        client.search("ABBA", "Waterloo")
+        client.search("Nobody", "nothing at all")
+
+        # A new client (next run) answers both from the file
+        client = self.client(persist_path=persist_path)
+        self.assertEqual(client.search("ABBA", "Waterloo"), "v-waterloo-abba")
+        self.assertIsNone(client.search("Nobody", "nothing at all"))
+        self.assertEqual(len(self.server.queries), 2)
+        self.assertEqual(client.quota_used, 0)
+
+        # Entries older than the TTL are not loaded
+        self.assertEqual(self.client(persist_path=persist_path, ttl=0).stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()